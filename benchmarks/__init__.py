@@ -0,0 +1,5 @@
+"""
+Standalone benchmarks for the library application.
+
+Each module can be run directly, e.g. ``python -m benchmarks.library_storage``.
+"""
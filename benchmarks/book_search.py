@@ -0,0 +1,111 @@
+"""
+Search latency benchmark: substring (``ilike``) versus full-text search.
+
+Fills a SQLite database with generated books, then times
+``BookService.get_all_books`` for the same searches in both modes. Titles
+and authors are drawn from fixed word lists, so common and rare words both
+occur.
+
+Usage:
+
+    python -m benchmarks.book_search --books 1000000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from src import create_app
+from src.config import DevelopmentConfig, config
+from src.extensions import db
+from src.models import Book
+from src.services.book_service import BookService
+
+WORDS = (
+    "shadow river night garden empire winter stone silver dragon city ocean "
+    "letters secret house glass iron storm forest crown journey memory fire "
+    "kingdom island mountain voice queen road dream light harbor thunder"
+).split()
+FIRST_NAMES = "Anna Boris Clara David Elena Frank Grace Hugo Irene Jonas".split()
+LAST_NAMES = "Adler Brandt Castillo Dubois Eriksen Fischer Garcia Horvath".split()
+
+SEARCHES = ["dragon", "winter crown", "garcia", "silver harbor night", "zzz"]
+
+
+class BenchmarkConfig(DevelopmentConfig):
+    """Development settings with the database in a temporary directory."""
+
+    DEBUG = False
+
+
+def fill(books: int, seed: int = 1) -> None:
+    """Inserts generated books in batches."""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    batch: List[Dict[str, object]] = []
+    for i in range(books):
+        batch.append(
+            {
+                "title": " ".join(rng.sample(WORDS, 3)).title(),
+                "author": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                "isbn": f"{i:013d}",
+                "year": rng.randint(1800, 2024),
+                "is_available": True,
+                "total_copies": 1,
+                "available_copies": 1,
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+        if len(batch) == 50_000:
+            db.session.execute(Book.__table__.insert(), batch)
+            batch.clear()
+    if batch:
+        db.session.execute(Book.__table__.insert(), batch)
+    db.session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "books.db")
+        BenchmarkConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        config["benchmark"] = BenchmarkConfig
+        app = create_app("benchmark")
+
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            fill(args.books)
+            print(
+                f"{args.books:,} books indexed in {time.perf_counter() - start:.1f} s"
+            )
+
+            print(
+                f"{'search':22}{'matches':>10}{'substring ms':>15}{'fulltext ms':>14}"
+            )
+            for search in SEARCHES:
+                timings = {}
+                for mode in ("substring", "fulltext"):
+                    start = time.perf_counter()
+                    for _ in range(args.repeat):
+                        result = BookService.get_all_books(
+                            per_page=20, search=search, mode=mode
+                        )
+                    timings[mode] = (time.perf_counter() - start) / args.repeat * 1000
+                print(
+                    f"{search:22}{result['total']:>10,}"
+                    f"{timings['substring']:>15.1f}{timings['fulltext']:>14.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Typeahead benchmark for the in-process book suggestion index.
+
+Builds ``BookSuggestions`` over generated titles and authors, then times
+top-10 suggestions for prefixes of increasing length, and incremental adds.
+
+Usage:
+
+    python -m benchmarks.book_suggestions --books 1000000
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.book_search import FIRST_NAMES, LAST_NAMES, WORDS
+from src.storage.suggestions import BookSuggestions
+
+PREFIXES = ["d", "dr", "dra", "dragon s", "garc", "anna d", "zz"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    books = [
+        (
+            i,
+            " ".join(rng.sample(WORDS, 3)).title(),
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        )
+        for i in range(args.books)
+    ]
+
+    suggestions = BookSuggestions()
+    start = time.perf_counter()
+    suggestions.build(books)
+    print(f"{args.books:,} books indexed in {time.perf_counter() - start:.1f} s")
+
+    print(f"{'prefix':12}{'results':>8}{'µs/query':>10}")
+    for prefix in PREFIXES:
+        start = time.perf_counter()
+        for _ in range(args.queries):
+            result = suggestions.suggest(prefix, 10)
+        micros = (time.perf_counter() - start) / args.queries * 1e6
+        print(f"{prefix:12}{len(result):>8}{micros:>10.1f}")
+
+    start = time.perf_counter()
+    for i in range(args.queries):
+        suggestions.add(args.books + i, "New Arrival", "Anna Adler")
+    micros = (time.perf_counter() - start) / args.queries * 1e6
+    print(f"{'add':12}{'':>8}{micros:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
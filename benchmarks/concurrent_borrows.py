@@ -0,0 +1,143 @@
+"""
+Concurrent borrow benchmark: threads borrowing and returning copies of one
+popular book.
+
+Each thread is a reader who borrows the book, keeps it for a moment and
+returns it, again and again, while every other thread does the same, so
+most borrows race for the last copies. Borrows and returns are the conditional updates of
+``StorageBackend.open_loan`` and ``close_loan``. Prints the throughput of
+borrows and returns, how many borrows found no copy left, and checks that
+the book never had more copies out than it has: the most loans seen open at
+once, and the copies available at the end.
+
+The database is a SQLite file in a temporary directory unless
+``--database-url`` names another (it must be empty; its tables are created
+and dropped).
+
+Usage:
+
+    python -m benchmarks.concurrent_borrows --threads 16 --copies 4 --seconds 5 --hold 0.005
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+from typing import Dict
+
+from flask import Flask
+
+from src import create_app
+from src.config import TestingConfig
+from src.exceptions import ConflictError
+from src.extensions import db
+from src.services.book_service import BookService
+from src.services.user_service import UserService
+from src.storage.backend import get_backend
+
+
+class Tally:
+    """Counts the outcomes of the threads, and the most loans open at once."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {"borrowed": 0, "unavailable": 0, "returned": 0}
+        self.open = 0
+        self.most_open = 0
+
+    def count(self, outcome: str, open_change: int = 0) -> None:
+        """Counts an outcome, which opens (1) or closes (-1) a loan."""
+        with self._lock:
+            self.counts[outcome] += 1
+            self.open += open_change
+            self.most_open = max(self.most_open, self.open)
+
+
+def reader(
+    app: Flask, book_id: int, user_id: int, hold: float, deadline: float, tally: Tally
+) -> None:
+    """Borrows the book, keeping it ``hold`` seconds, until the deadline."""
+    with app.app_context():
+        while time.perf_counter() < deadline:
+            try:
+                loan_id = BookService.borrow_book(book_id, user_id).id
+            except ConflictError:
+                tally.count("unavailable")
+                continue
+            finally:
+                db.session.remove()
+            # A loan counts as open from its commit until its return starts,
+            # a part of the time its copy is really out
+            tally.count("borrowed", 1)
+            time.sleep(hold)
+            tally.count("returned", -1)
+            BookService.return_book(loan_id)
+            db.session.remove()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--copies", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--hold", type=float, default=0.005)
+    parser.add_argument("--backend", choices=["sqlalchemy", "memory"])
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        TestingConfig.SQLALCHEMY_DATABASE_URI = (
+            args.database_url or f"sqlite:///{directory}/library.db"
+        )
+        if args.backend:
+            TestingConfig.STORAGE_BACKEND = args.backend
+        app = create_app("testing")
+        with app.app_context():
+            db.create_all()
+            book_id = BookService.create_book(
+                {"title": "Dune", "author": "F. Herbert", "total_copies": args.copies}
+            ).id
+            user_ids = [
+                UserService.create_user(
+                    {
+                        "name": f"Reader {i}",
+                        "email": f"r{i}@example.com",
+                        "password": "x",
+                    }
+                ).id
+                for i in range(args.threads)
+            ]
+            db.session.remove()
+
+        tally = Tally()
+        start = time.perf_counter()
+        deadline = start + args.seconds
+        threads = [
+            threading.Thread(
+                target=reader, args=(app, book_id, user_id, args.hold, deadline, tally)
+            )
+            for user_id in user_ids
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        with app.app_context():
+            available = get_backend().get_book(book_id).available_copies
+            db.session.remove()
+            db.drop_all()
+
+    counts = tally.counts
+    print(f"{args.threads} threads, {args.copies} copies, {elapsed:.1f} s")
+    for outcome, count in counts.items():
+        print(f"{outcome:>12}: {count:8,} ({count / elapsed:,.0f}/s)")
+    print(f"{'most open':>12}: {tally.most_open:8,} (at most {args.copies})")
+    print(f"{'available':>12}: {available:8,} (expected {args.copies})")
+    if tally.most_open > args.copies or available != args.copies:
+        raise SystemExit("Copies were oversold")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Deep page latency benchmark: offset versus cursor pagination.
+
+Fills a SQLite database with generated books (see ``book_search``), then
+times fetching pages at increasing depths through ``get_all_books``
+(``OFFSET`` plus ``COUNT(*)``) and through ``get_books_by_cursor`` (a range
+scan on the primary key).
+
+Usage:
+
+    python -m benchmarks.deep_pages --books 1000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.book_search import BenchmarkConfig, fill
+from src import create_app
+from src.config import config
+from src.extensions import db
+from src.services.book_service import BookService
+from src.services.pagination import encode_cursor
+
+PER_PAGE = 20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "books.db")
+        BenchmarkConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        config["benchmark"] = BenchmarkConfig
+        app = create_app("benchmark")
+
+        with app.app_context():
+            db.create_all()
+            fill(args.books)
+
+            print(f"{'page':>10}{'offset ms':>12}{'cursor ms':>12}")
+            page = 1
+            while (page - 1) * PER_PAGE < args.books:
+                # Generated IDs are contiguous, so the cursor of a page is known
+                cursor = (
+                    encode_cursor("books", (page - 1) * PER_PAGE) if page > 1 else ""
+                )
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    BookService.get_all_books(page=page, per_page=PER_PAGE)
+                offset_ms = (time.perf_counter() - start) / args.repeat * 1000
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    BookService.get_books_by_cursor(cursor, limit=PER_PAGE)
+                cursor_ms = (time.perf_counter() - start) / args.repeat * 1000
+                print(f"{page:>10,}{offset_ms:>12.2f}{cursor_ms:>12.2f}")
+                page *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Fuzzy search benchmark for the in-process trigram index.
+
+Generates a catalog whose titles and authors are drawn from a large
+vocabulary of pseudo-words, builds a ``TrigramIndex`` over it, then times
+searches for misspelled (one letter dropped or swapped) vocabulary words.
+
+Usage:
+
+    python -m benchmarks.fuzzy_search --books 1000000
+"""
+
+import argparse
+import random
+import time
+from typing import List
+
+from src.storage.fuzzy import TrigramIndex
+
+SYLLABLES = (
+    "ka ri to ben sel mor an dru vel tha qui lo ne ser gal fin or ast wen "
+    "bar ith cor del ram ul mis har po ten"
+).split()
+
+
+def vocabulary(size: int, rng: random.Random) -> List[str]:
+    """Returns distinct pseudo-words of two to four syllables."""
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    """Drops one letter or swaps two adjacent ones."""
+    position = rng.randrange(len(word) - 1)
+    following, rest = position + 1, position + 2
+    if rng.random() < 0.5:
+        return word[:position] + word[following:]
+    return word[:position] + word[following] + word[position] + word[rest:]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--words", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    words = vocabulary(args.words, rng)
+    index = TrigramIndex()
+
+    start = time.perf_counter()
+    for book_id in range(args.books):
+        title = " ".join(rng.choices(words, k=3))
+        author = " ".join(rng.choices(words, k=2))
+        index.add(book_id, title, author)
+    print(f"{args.books:,} books indexed in {time.perf_counter() - start:.1f} s")
+
+    queries = [misspell(rng.choice(words), rng) for _ in range(args.queries)]
+    queries += [f"{misspell(rng.choice(words), rng)} {rng.choice(words)}"]
+    matches = 0
+    start = time.perf_counter()
+    for query in queries:
+        matches += len(index.search(query))
+    millis = (time.perf_counter() - start) / len(queries) * 1000
+    print(f"{len(queries)} misspelled searches: {millis:.2f} ms each")
+    print(f"{matches / len(queries):,.0f} matching books per search on average")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Memory and throughput comparison for the legacy in-memory book storage.
+
+Compares a list of plain ``@dataclass`` records exported with
+``dataclasses.asdict`` (the original representation) against the slotted
+``Book`` records held by ``Library`` and its bulk export methods.
+
+Usage:
+
+    python -m benchmarks.library_storage --books 1000000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, List, Tuple
+
+from src.models.book import Book
+from src.models.library import Library
+
+
+@dataclass
+class LegacyBook:
+    """The original, ``__dict__``-backed book record."""
+
+    id: int
+    title: str
+    author: str
+    year: int
+
+
+def book_dict(i: int) -> dict:
+    """
+    Builds the raw input for the i-th synthetic book. As with parsed JSON,
+    every record gets its own copy of the author string.
+    """
+    return {
+        "id": i,
+        "title": f"Title {i}",
+        "author": f"Author {i % 1000}",
+        "year": 1900 + i % 120,
+    }
+
+
+def build_legacy(count: int) -> List[LegacyBook]:
+    """Builds the legacy list-of-dataclasses storage."""
+    books = []
+    for i in range(count):
+        data = book_dict(i)
+        books.append(
+            LegacyBook(
+                id=int(data["id"]),
+                title=str(data["title"]),
+                author=str(data["author"]),
+                year=int(data["year"]),
+            )
+        )
+    return books
+
+
+def build_library(count: int) -> Library:
+    """Builds the current indexed, slotted storage."""
+    library = Library()
+    for i in range(count):
+        library.create_book(Book.from_dict(book_dict(i)))
+    return library
+
+
+def measure(build: Callable[[int], Any], count: int) -> Tuple[Any, float, float]:
+    """Returns the built storage, its build time and its traced size in MiB."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    storage = build(count)
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return storage, elapsed, size / (1024 * 1024)
+
+
+def timed(func: Callable[[], Any]) -> float:
+    """Returns how long a single call of ``func`` takes, in seconds."""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--books", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    legacy, legacy_build, legacy_mib = measure(build_legacy, args.books)
+    legacy_export = timed(lambda: [asdict(book) for book in legacy])
+    legacy.clear()
+
+    library, build, mib = measure(build_library, args.books)
+    export = timed(library.book_dicts)
+    rows = timed(library.book_rows)
+
+    print(f"{args.books:,} books")
+    print(f"{'':28}{'memory MiB':>12}{'build s':>10}{'export s':>10}")
+    print(
+        f"{'dataclass list + asdict':28}"
+        f"{legacy_mib:12.1f}{legacy_build:10.2f}{legacy_export:10.2f}"
+    )
+    print(f"{'Library + book_dicts':28}{mib:12.1f}{build:10.2f}{export:10.2f}")
+    print(f"{'Library + book_rows':28}{'':12}{'':10}{rows:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
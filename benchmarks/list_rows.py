@@ -0,0 +1,157 @@
+"""
+Listing read path benchmark: ORM entities and serializers versus the row
+selects of ``SqlAlchemyBackend``.
+
+Fills an in-memory SQLite database with books, users and a loan of each
+book, then reads a page of each, and an export of every row, into the rows
+of the API responses both ways: hydrating entities and serializing them,
+as the listings did, and selecting the row columns as the backend now
+does. Prints the mean time and the peak memory allocated by each read.
+
+Usage:
+
+    python -m benchmarks.list_rows --per-page 100 --export 100000
+"""
+
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+from sqlalchemy.orm import joinedload
+
+from src import create_app
+from src.extensions import db
+from src.models import Book, BookLoan, User
+from src.serializers import serialize_book, serialize_loan, serialize_user
+from src.storage.backend import LoanFilter
+from src.storage.sqlalchemy_backend import SqlAlchemyBackend
+
+
+def fill(count: int) -> None:
+    """Bulk inserts ``count`` books and users, and a loan of each book."""
+    now = datetime.utcnow()
+    db.session.execute(
+        db.insert(Book),
+        [
+            {
+                "title": f"Title {i}",
+                "author": f"Author {i % 10}",
+                "isbn": f"{i:013d}",
+                "year": 1900 + i % 100,
+                "description": "A generated book. " * 10,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(1, count + 1)
+        ],
+    )
+    db.session.execute(
+        db.insert(User),
+        [
+            {
+                "name": f"Reader {i}",
+                "email": f"reader{i}@example.com",
+                "password_hash": "x",
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(1, count + 1)
+        ],
+    )
+    db.session.execute(
+        db.insert(BookLoan),
+        [
+            {
+                "book_id": i,
+                "user_id": i,
+                "borrowed_at": now,
+                "due_date": now + timedelta(days=i % 30 - 15),
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(1, count + 1)
+        ],
+    )
+    db.session.commit()
+
+
+def measure(repeat: int, read: Callable[[], List[Any]]) -> Tuple[float, float]:
+    """
+    Returns the mean milliseconds of ``read()`` with an empty session, and
+    the peak MiB it allocates.
+    """
+    elapsed = 0.0
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        read()
+        elapsed += time.perf_counter() - start
+
+    db.session.expunge_all()
+    tracemalloc.start()
+    rows = read()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del rows
+    return elapsed / repeat * 1_000, peak / 2**20
+
+
+def readers(limit: int) -> Dict[str, Tuple[Callable[[], Any], Callable[[], Any]]]:
+    """Returns the ORM and row reads of every listing, ``limit`` rows each."""
+    backend = SqlAlchemyBackend()
+    now = datetime.utcnow()
+    loans = BookLoan.query.options(joinedload(BookLoan.book), joinedload(BookLoan.user))
+    return {
+        "books": (
+            lambda: list(
+                map(serialize_book, Book.query.order_by(Book.id).limit(limit))
+            ),
+            lambda: backend.list_books_after(None, limit),
+        ),
+        "users": (
+            lambda: list(
+                map(serialize_user, User.query.order_by(User.id).limit(limit))
+            ),
+            lambda: backend.list_users_after(None, limit),
+        ),
+        "loans": (
+            lambda: list(
+                map(serialize_loan, loans.order_by(BookLoan.id).limit(limit).all())
+            ),
+            lambda: backend.list_loans_after(LoanFilter(), now, None, limit),
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--per-page", type=int, default=100)
+    parser.add_argument("--export", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app("testing")
+    runs = [
+        (f"page of {args.per_page}", args.per_page, args.repeat),
+        (f"export of {args.export}", args.export, 3),
+    ]
+    with app.app_context():
+        db.create_all()
+        fill(args.export)
+        print(f"{'':24}{'ORM ms':>10}{'rows ms':>10}{'ORM MiB':>10}{'rows MiB':>10}")
+        for label, limit, repeat in runs:
+            for name, (orm, rows) in readers(limit).items():
+                orm_ms, orm_mib = measure(repeat, orm)
+                rows_ms, rows_mib = measure(repeat, rows)
+                print(
+                    f"{name + ', ' + label:24}"
+                    f"{orm_ms:10,.2f}{rows_ms:10,.2f}{orm_mib:10,.2f}{rows_mib:10,.2f}"
+                )
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Listing latency benchmark for the ``count`` strategies of ``get_all_books``.
+
+Fills a SQLite database with generated books (see ``book_search``), then
+times the first page of an unfiltered and a filtered listing with exact
+(uncached and cached), estimated and no counts.
+
+Usage:
+
+    python -m benchmarks.listing_counts --books 1000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Optional
+
+from benchmarks.book_search import BenchmarkConfig, fill
+from src import create_app
+from src.config import config
+from src.extensions import db
+from src.services.book_service import BookService
+from src.storage.counts import get_counts
+
+
+def timed(repeat: int, search: Optional[str], count: str, cached: bool) -> float:
+    """Returns the mean milliseconds of a listing request."""
+    total = 0.0
+    for _ in range(repeat):
+        if not cached:
+            get_counts().invalidate("books")
+        start = time.perf_counter()
+        BookService.get_all_books(per_page=20, search=search, count=count)
+        total += time.perf_counter() - start
+    return total / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "books.db")
+        BenchmarkConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        config["benchmark"] = BenchmarkConfig
+        app = create_app("benchmark")
+
+        with app.app_context():
+            db.create_all()
+            fill(args.books)
+
+            print(f"{'count':18}{'unfiltered ms':>15}{'search ms':>12}")
+            for label, count, cached in (
+                ("exact", "exact", False),
+                ("exact (cached)", "exact", True),
+                ("estimate", "estimate", True),
+                ("none", "none", True),
+            ):
+                unfiltered = timed(args.repeat, None, count, cached)
+                search = timed(args.repeat, "dragon", count, cached)
+                print(f"{label:18}{unfiltered:>15.2f}{search:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
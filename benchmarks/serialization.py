@@ -0,0 +1,126 @@
+"""
+Serialization benchmark: ``to_dict`` with Flask's default JSON provider
+versus the prebuilt serializers with the stdlib and orjson providers.
+
+Loads one page of books, users and loans (with their books and users) from
+an in-memory SQLite database, then times turning the page into a JSON
+response body, the way the list endpoints do, without the query.
+
+Usage:
+
+    python -m benchmarks.serialization --per-page 100 --repeat 2000
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+from sqlalchemy.orm import joinedload
+
+from src import create_app
+from src.extensions import db
+from src.json_provider import OrjsonProvider, StdlibJSONProvider, orjson
+from src.models import Book, BookLoan, User
+from src.serializers import serialize_book, serialize_loan, serialize_user
+
+
+def fill(per_page: int) -> None:
+    """Inserts a page worth of books and users, and a loan of each book."""
+    now = datetime.utcnow()
+    books = [
+        Book(
+            title=f"Title {i}",
+            author=f"Author {i % 10}",
+            isbn=f"{i:013d}",
+            year=1900 + i % 100,
+            description="A generated book. " * 10,
+        )
+        for i in range(per_page)
+    ]
+    users = [
+        User(name=f"Reader {i}", email=f"reader{i}@example.com", password_hash="x")
+        for i in range(per_page)
+    ]
+    db.session.add_all(books + users)
+    db.session.flush()
+    db.session.add_all(
+        BookLoan(book=book, user=user, due_date=now + timedelta(days=i % 30 - 15))
+        for i, (book, user) in enumerate(zip(books, users))
+    )
+    db.session.commit()
+
+
+def timed(repeat: int, render: Callable[[], Any]) -> float:
+    """Returns the mean microseconds of ``render()``."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        render()
+    return (time.perf_counter() - start) / repeat * 1_000_000
+
+
+def run(app: Flask, per_page: int, repeat: int) -> Dict[str, List[float]]:
+    """Times every page with every way of rendering it."""
+    fill(per_page)
+    pages: Dict[str, List[Any]] = {
+        "books": Book.query.all(),
+        "users": User.query.all(),
+        "loans": BookLoan.query.options(
+            joinedload(BookLoan.book), joinedload(BookLoan.user)
+        ).all(),
+    }
+    serializers = {
+        "books": serialize_book,
+        "users": serialize_user,
+        "loans": serialize_loan,
+    }
+
+    providers: Dict[str, JSONProvider] = {
+        "stdlib": StdlibJSONProvider(app),
+    }
+    if orjson is not None:
+        providers["orjson"] = OrjsonProvider(app)
+
+    results: Dict[str, List[float]] = {}
+    for name, page in pages.items():
+        before = DefaultJSONProvider(app)
+        results[name] = [
+            timed(
+                repeat,
+                lambda: before.response({name: [item.to_dict() for item in page]}),
+            )
+        ]
+        serializer = serializers[name]
+        for provider in providers.values():
+            results[name].append(
+                timed(
+                    repeat,
+                    lambda: provider.response({name: list(map(serializer, page))}),
+                )
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--per-page", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=2_000)
+    args = parser.parse_args()
+
+    app = create_app("testing")
+    columns = ["to_dict", "stdlib"] + (["orjson"] if orjson is not None else [])
+    with app.app_context():
+        db.create_all()
+        results = run(app, args.per_page, args.repeat)
+        db.session.remove()
+        db.drop_all()
+
+    print(f"{'us per page':14}" + "".join(f"{column:>10}" for column in columns))
+    for name, timings in results.items():
+        print(f"{name:14}" + "".join(f"{timing:10,.0f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Service-layer benchmark for the storage backends.
+
+Runs the same workload through ``BookService``/``UserService`` once per
+backend: creating books and users, looking books up by ID, listing pages,
+searching, and a borrow/return cycle. The SQLAlchemy backend uses an
+in-memory SQLite database, so the numbers exclude network round trips.
+
+Usage:
+
+    python -m benchmarks.storage_backends --books 5000 --lookups 20000
+"""
+
+import argparse
+import time
+from typing import Callable, Dict
+
+from flask import Flask
+
+from src import create_app
+from src.extensions import db
+from src.services.book_service import BookService
+from src.services.user_service import UserService
+from src.storage.backend import init_backend
+
+
+def run(app: Flask, books: int, lookups: int) -> Dict[str, float]:
+    """Runs the workload and returns the operations per second of each step."""
+    results: Dict[str, float] = {}
+
+    def measure(name: str, count: int, step: Callable[[int], object]) -> None:
+        start = time.perf_counter()
+        for i in range(count):
+            step(i)
+        results[name] = count / (time.perf_counter() - start)
+
+    with app.app_context():
+        db.create_all()
+        measure(
+            "create book",
+            books,
+            lambda i: BookService.create_book(
+                {
+                    "title": f"Title {i}",
+                    "author": f"Author {i % 100}",
+                    "isbn": f"978{i:010d}",
+                    "total_copies": 2,
+                }
+            ),
+        )
+        user = UserService.create_user(
+            {"name": "Reader", "email": "reader@example.com", "password": "secret"}
+        )
+        measure(
+            "get book by id",
+            lookups,
+            lambda i: BookService.get_book_by_id(i % books + 1),
+        )
+        measure(
+            "list page",
+            lookups // 10,
+            lambda i: BookService.get_all_books(page=i % 50 + 1, per_page=20),
+        )
+        measure(
+            "search",
+            lookups // 100,
+            lambda i: BookService.get_all_books(search=f"Author {i % 100}"),
+        )
+        measure(
+            "borrow + return",
+            lookups // 10,
+            lambda i: BookService.return_book(
+                BookService.borrow_book(i % books + 1, user.id).id
+            ),
+        )
+        db.session.remove()
+        db.drop_all()
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--books", type=int, default=5_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    args = parser.parse_args()
+
+    app = create_app("testing")
+    backends = ["sqlalchemy", "memory"]
+    results = {}
+    for name in backends:
+        app.config["STORAGE_BACKEND"] = name
+        init_backend(app)
+        results[name] = run(app, args.books, args.lookups)
+
+    print(f"{'operations/s':20}" + "".join(f"{name:>14}" for name in backends))
+    for step in results[backends[0]]:
+        print(
+            f"{step:20}" + "".join(f"{results[name][step]:14,.0f}" for name in backends)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Cold-start benchmark for the persisted legacy storage.
+
+Builds a library with the given number of books and users, writes a
+snapshot, then measures how long a fresh ``StoragePersistence.open()`` takes
+to restore it. Also reports the WAL append throughput with group commit.
+
+Usage:
+
+    python -m benchmarks.storage_persistence --books 1000000 --users 10000
+"""
+
+import argparse
+import gc
+import tempfile
+import threading
+import time
+
+from src.models.book import Book
+from src.models.user import LibraryUser
+from src.storage.persistence import StoragePersistence
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=2_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        persistence = StoragePersistence(directory, snapshot_every=0)
+        library = persistence.open()
+        library.load(
+            Book.from_columns(
+                range(args.books),
+                (f"Title {i}" for i in range(args.books)),
+                (f"Author {i % 1000}" for i in range(args.books)),
+                (1900 + i % 120 for i in range(args.books)),
+            ),
+            (
+                LibraryUser(i, f"User {i}", f"user{i}@example.com", "secret")
+                for i in range(args.users)
+            ),
+        )
+
+        start = time.perf_counter()
+        persistence.snapshot()
+        snapshot_seconds = time.perf_counter() - start
+
+        def writer() -> None:
+            for _ in range(args.writes // args.writers):
+                book_id = library.allocate_book_id()
+                library.create_book(Book(book_id, "Title", "Author", 2000))
+
+        threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wal_seconds = time.perf_counter() - start
+        persistence.close()
+
+        start = time.perf_counter()
+        reopened = StoragePersistence(directory)
+        restored = reopened.open()
+        open_seconds = time.perf_counter() - start
+        # The app collects once and freezes everything alive after start-up
+        start = time.perf_counter()
+        gc.collect()
+        gc.freeze()
+        freeze_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        gc.collect()
+        collect_seconds = time.perf_counter() - start
+        reopened.close()
+
+    print(f"{restored.book_count:,} books, {restored.user_count:,} users")
+    print(f"snapshot write      {snapshot_seconds:8.2f} s")
+    print(
+        f"WAL appends         {args.writes / wal_seconds:8.0f} /s "
+        f"({args.writers} threads, fsync per group)"
+    )
+    print(f"cold start (open)   {open_seconds:8.2f} s")
+    print(f"gc + freeze at start {freeze_seconds:7.2f} s")
+    print(f"later full gc       {collect_seconds:8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
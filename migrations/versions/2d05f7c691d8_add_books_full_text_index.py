@@ -0,0 +1,29 @@
+"""Add books full-text index
+
+FTS5 table and sync triggers on SQLite, a generated tsvector column with a
+GIN index on PostgreSQL. Existing rows are indexed as part of the upgrade.
+
+Revision ID: 2d05f7c691d8
+Revises: 7c0c9e1172fa
+Create Date: 2026-10-18 00:12:00.482374
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from src.storage import fulltext
+
+
+# revision identifiers, used by Alembic.
+revision = '2d05f7c691d8'
+down_revision = '7c0c9e1172fa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    fulltext.install(op.get_bind())
+
+
+def downgrade():
+    fulltext.uninstall(op.get_bind())
@@ -0,0 +1,30 @@
+"""Add books trigram indexes
+
+PostgreSQL only: enables pg_trgm (skipped if it cannot be created) and adds
+GIN trigram indexes on title and author for fuzzy search. Other databases
+search an in-process trigram index instead.
+
+Revision ID: dec7f998a00f
+Revises: 2d05f7c691d8
+Create Date: 2026-10-18 00:28:14.843958
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from src.storage import fuzzy
+
+
+# revision identifiers, used by Alembic.
+revision = 'dec7f998a00f'
+down_revision = '2d05f7c691d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    fuzzy.install(op.get_bind())
+
+
+def downgrade():
+    fuzzy.uninstall(op.get_bind())
@@ -2,12 +2,14 @@
 Application factory for Flask app creation.
 """
 
+import gc
 from typing import Optional
 
 from flask import Flask
 
 from src.config import get_config
 from src.extensions import init_extensions
+from src.json_provider import init_json_provider
 
 
 def create_app(config_name: Optional[str] = None) -> Flask:
@@ -29,6 +31,12 @@ def create_app(config_name: Optional[str] = None) -> Flask:
     # Initialize extensions
     init_extensions(app)
 
+    # Encode responses with the configured JSON provider
+    init_json_provider(app)
+
+    # Set up the service storage backend and the legacy in-memory storage
+    init_storage(app)
+
     # Register blueprints
     register_blueprints(app)
 
@@ -41,6 +49,41 @@ def create_app(config_name: Optional[str] = None) -> Flask:
     return app
 
 
+def init_storage(app: Flask) -> None:
+    """
+    Create the storage backend used by the services, the typeahead index and
+    the count, response and entity caches, and enable persistence of the
+    legacy in-memory storage, if configured.
+    """
+    from src.storage import global_storage
+    from src.storage.backend import init_backend
+    from src.storage.counts import init_counts
+    from src.storage.entity_cache import init_entity_cache
+    from src.storage.generations import init_generations
+    from src.storage.response_cache import init_response_cache
+    from src.storage.suggestions import init_suggestions
+
+    init_backend(app)
+    init_generations(app)
+    init_suggestions(app)
+    init_counts(app)
+    init_response_cache(app)
+    init_entity_cache(app)
+
+    directory = app.config.get("LIBRARY_STORAGE_DIR")
+    if directory:
+        global_storage.enable_persistence(
+            directory, snapshot_every=app.config["LIBRARY_SNAPSHOT_EVERY"]
+        )
+        # Spare every later full collection from traversing the restored
+        # records. gc.freeze() moves every object alive in the process, not
+        # only the records, to the permanent generation: the app, its
+        # models and modules too, which are never collected afterwards even
+        # if they become garbage. Collecting first leaves only live objects.
+        gc.collect()
+        gc.freeze()
+
+
 def register_blueprints(app: Flask) -> None:
     """Register application blueprints."""
     from src.api.auth_controllers import handle_login
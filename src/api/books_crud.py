@@ -9,6 +9,7 @@ storage module, which manages the library of books.
 Endpoints:
     - GET /books: Render the books page.
     - GET /books/<int:book_id>: Get a book by ID.
+    - GET /books/search: Find books by author, title prefix or year range.
     - POST /books: Create a new book.
     - DELETE /books/<int:book_id>: Delete a book by ID.
 
@@ -24,11 +25,10 @@ Example Usage:
     API.
 
 Dependencies:
-    This script depends on the Flask and dataclasses modules, as well as the
+    This script depends on the Flask module, as well as the
     `src.storage.global_storage` module for managing the library of books.
 """
 
-from dataclasses import asdict
 from typing import Any, Dict, Tuple
 
 from flask import Blueprint, jsonify, render_template, request
@@ -64,7 +64,50 @@ def get_book(book_id: int) -> Tuple[Any, int]:
     book = global_storage.read_book(book_id)
     if book is None:
         return jsonify({"error": "Book not found."}), 404
-    return jsonify(asdict(book)), 200
+    return jsonify(book.to_dict()), 200
+
+
+@books_api.route("/books/search", methods=["GET"])
+def search_books() -> Tuple[Any, int]:
+    """
+    Find books through the sorted author, title and year indexes.
+
+    Query parameters (exactly one kind of filter is required):
+        - author: The exact author name.
+        - title: A case-sensitive title prefix.
+        - year_from, year_to: An inclusive year range; either end may be
+          omitted.
+        - limit: The maximum number of books to return (default 100, at most
+          1000).
+        - offset: The number of matching books to skip (default 0).
+
+    Returns: A tuple containing the JSON list of matching books and the HTTP
+        status code (200, or 400 if the filters are missing or ambiguous).
+    """
+    author = request.args.get("author")
+    title = request.args.get("title")
+    year_from = request.args.get("year_from", type=int)
+    year_to = request.args.get("year_to", type=int)
+    limit = min(max(request.args.get("limit", 100, type=int), 0), 1000)
+    offset = max(request.args.get("offset", 0, type=int), 0)
+
+    has_years = year_from is not None or year_to is not None
+    filters = [author is not None, title is not None, has_years]
+    if sum(filters) != 1:
+        return (
+            jsonify({"error": "Specify one of author, title or year_from/year_to."}),
+            400,
+        )
+
+    if author is not None:
+        books = global_storage.read_books_by_author(author, limit, offset)
+    elif title is not None:
+        books = global_storage.read_books_by_title_prefix(title, limit, offset)
+    else:
+        books = global_storage.read_books_by_year_range(
+            year_from, year_to, limit, offset
+        )
+    return jsonify({"books": books, "limit": limit, "offset": offset}), 200
 
 
 @books_api.route("/books", methods=["POST"])
@@ -2,14 +2,20 @@
 API decorators for validation and authentication.
 """
 
+from datetime import datetime
 from functools import wraps
-from typing import Any, Callable, Type
+from typing import Any, Callable, Optional, Tuple, Type
 
-from flask import jsonify, request
+from flask import Response, jsonify, make_response, request
 from flask_jwt_extended import get_jwt, get_jwt_identity
 from marshmallow import ValidationError
+from werkzeug.http import is_resource_modified
 
-from src.exceptions import ForbiddenError
+from src.exceptions import ForbiddenError, PreconditionFailedError
+from src.storage.response_cache import get_response_cache
+
+# The entity tag and Last-Modified date (if any) of a representation
+Validators = Tuple[str, Optional[datetime]]
 
 
 def validate_json(schema_class: Type) -> Callable:
@@ -28,8 +34,9 @@ def validate_json(schema_class: Type) -> Callable:
                 # Validate data
                 validated_data = schema.load(data)
 
-                # Replace request data with validated data
-                request._cached_json = validated_data
+                # Replace request data with validated data, for both the
+                # silent and the non-silent get_json()
+                request._cached_json = (validated_data, validated_data)
 
                 return f(*args, **kwargs)
 
@@ -89,3 +96,87 @@ def owner_or_admin_required(f: Callable) -> Callable:
             return jsonify({"error": "Access denied"}), 403
 
     return decorated_function
+
+
+def cached_response(tag: str) -> Callable:
+    """
+    Decorator to serve a public view from the response cache. Writes
+    invalidate the cached responses through ``tag``.
+    """
+
+    def decorator(f: Callable) -> Callable:
+        @wraps(f)
+        def decorated_function(*args: Any, **kwargs: Any) -> Any:
+            cache = get_response_cache()
+            if cache is None:
+                return f(*args, **kwargs)
+            return cache.respond(tag, lambda: f(*args, **kwargs))
+
+        return decorated_function
+
+    return decorator
+
+
+def conditional_response(validators: Callable[..., Optional[Validators]]) -> Callable:
+    """
+    Decorator to answer conditional GETs with 304 Not Modified, without
+    running the view. ``validators`` gets the view's arguments and returns
+    the current validators of the resource, or None to always run the view.
+    Successful responses carry them as a weak ETag and Last-Modified.
+    """
+
+    def decorator(f: Callable) -> Callable:
+        @wraps(f)
+        def decorated_function(*args: Any, **kwargs: Any) -> Any:
+            current = validators(*args, **kwargs)
+            if current is None:
+                return f(*args, **kwargs)
+
+            etag, last_modified = current
+            if is_resource_modified(
+                request.environ, etag=etag, last_modified=last_modified
+            ):
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            else:
+                response = Response(status=304)
+
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return response
+
+        return decorated_function
+
+    return decorator
+
+
+def entity_tag(*parts: Any) -> str:
+    """Returns an entity tag made of the values a representation derives from."""
+    return "-".join(
+        part.isoformat() if isinstance(part, datetime) else str(part) for part in parts
+    )
+
+
+def if_match_version(kind: str, entity_id: int) -> Optional[int]:
+    """
+    Returns the version of an entity named by the request's If-Match, whose
+    tags are the ``entity_tag(kind, entity_id, version)`` of its responses,
+    or None if any version will do. Tags are compared weakly, so the weak
+    ETags of those responses can be sent back as they are.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return None
+
+    entity = entity_tag(kind, entity_id)
+    for tag in request.if_match.as_set(include_weak=True):
+        tagged, _, version = tag.rpartition("-")
+        if tagged == entity and version.isdigit():
+            return int(version)
+    raise PreconditionFailedError("If-Match does not name a version of this resource")
+
+
+def cursor_limit() -> int:
+    """Page size for cursor pagination, from the ``limit`` query argument."""
+    return max(1, min(request.args.get("limit", 20, type=int), 100))
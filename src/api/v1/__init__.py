@@ -4,6 +4,7 @@ API v1 blueprint initialization.
 
 from flask import Blueprint
 
+from src.api.v1.admin import admin_bp
 from src.api.v1.auth import auth_bp
 from src.api.v1.books import books_bp
 from src.api.v1.users import users_bp
@@ -15,3 +16,4 @@ api_v1 = Blueprint("api_v1", __name__)
 api_v1.register_blueprint(auth_bp, url_prefix="/auth")
 api_v1.register_blueprint(users_bp, url_prefix="/users")
 api_v1.register_blueprint(books_bp, url_prefix="/books")
+api_v1.register_blueprint(admin_bp, url_prefix="/admin")
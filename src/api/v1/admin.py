@@ -0,0 +1,22 @@
+"""
+Admin API endpoints.
+"""
+
+from typing import Tuple
+
+from flask import Blueprint, Response, jsonify
+from flask_jwt_extended import jwt_required
+
+from src.api.decorators import admin_required
+from src.storage.entity_cache import get_entity_cache
+
+admin_bp = Blueprint("admin", __name__)
+
+
+@admin_bp.route("/cache-stats", methods=["GET"])
+@jwt_required()
+@admin_required
+def get_cache_stats() -> Tuple[Response, int]:
+    """Get this worker's entity cache counters (admin only)."""
+    cache = get_entity_cache()
+    return jsonify({"entities": cache.stats() if cache is not None else None}), 200
@@ -9,6 +9,7 @@ from marshmallow import Schema, fields
 from src.api.decorators import validate_json
 from src.exceptions import UnauthorizedError
 from src.exceptions import ValidationError as ServiceValidationError
+from src.serializers import serialize_user
 from src.services.user_service import UserService
 
 auth_bp = Blueprint("auth", __name__)
@@ -45,7 +46,10 @@ def login() -> tuple:
 
         return (
             jsonify(
-                {"access_token": access_token, "user": user.to_dict(include_email=True)}
+                {
+                    "access_token": access_token,
+                    "user": serialize_user(user, include_email=True),
+                }
             ),
             200,
         )
@@ -70,7 +74,7 @@ def register() -> tuple:
                 {
                     "message": "User created successfully",
                     "access_token": access_token,
-                    "user": user.to_dict(include_email=True),
+                    "user": serialize_user(user, include_email=True),
                 }
             ),
             201,
@@ -93,7 +97,7 @@ def get_current_user() -> tuple:
         if not user:
             raise UnauthorizedError("User not found")
 
-        return jsonify({"user": user.to_dict(include_email=True)}), 200
+        return jsonify({"user": serialize_user(user, include_email=True)}), 200
 
     except ServiceValidationError as err:
         return jsonify({"error": str(err)}), err.status_code
@@ -2,13 +2,26 @@
 Books API endpoints.
 """
 
+from typing import Optional
+
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
 from marshmallow import Schema, fields
 
-from src.api.decorators import admin_required, validate_json
+from src.api.decorators import (
+    Validators,
+    admin_required,
+    cached_response,
+    conditional_response,
+    cursor_limit,
+    entity_tag,
+    if_match_version,
+    validate_json,
+)
+from src.exceptions import PreconditionFailedError
 from src.exceptions import ValidationError as ServiceValidationError
-from src.services.book_service import BookService
+from src.serializers import serialize_book, serialize_loan
+from src.services.book_service import LOAN_DATE_FILTERS, BookService
 
 books_bp = Blueprint("books", __name__)
 
@@ -41,16 +54,57 @@ class BorrowBookSchema(Schema):
     days = fields.Int(validate=lambda x: 1 <= x <= 90, load_default=14)
 
 
+def _books_validators() -> Optional[Validators]:
+    """
+    Validators of a book listing: the number of books it pages through and
+    their latest change.
+    """
+    search = request.args.get("search", "")
+    mode = request.args.get("mode", "substring")
+    try:
+        count, last_modified = BookService.get_books_version(search or None, mode)
+    except ServiceValidationError:
+        return None
+    # Deletions do not move the latest change, so only the ETag validates
+    return entity_tag("books", count, last_modified), None
+
+
+def _book_validators(book_id: int) -> Optional[Validators]:
+    """Validators of a book: its ID and version, and its latest change."""
+    book = BookService.get_book_by_id(book_id)
+    if book is None:
+        return None
+    return entity_tag("book", book.id, book.version), book.updated_at
+
+
 @books_bp.route("", methods=["GET"])
+@conditional_response(_books_validators)
+@cached_response("books")
 def get_books() -> tuple:
     """Get paginated list of all books with optional search."""
     try:
         page = request.args.get("page", 1, type=int)
-        per_page = min(request.args.get("per_page", 20, type=int), 100)
+        per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
         search = request.args.get("search", "")
+        mode = request.args.get("mode", "substring")
+
+        if "cursor" in request.args:
+            result = BookService.get_books_by_cursor(
+                cursor=request.args["cursor"],
+                limit=cursor_limit(),
+                search=search if search else None,
+                mode=mode,
+                fields=request.args.get("fields"),
+            )
+            return jsonify(result), 200
 
         result = BookService.get_all_books(
-            page=page, per_page=per_page, search=search if search else None
+            page=page,
+            per_page=per_page,
+            search=search if search else None,
+            mode=mode,
+            count=request.args.get("count", "exact"),
+            fields=request.args.get("fields"),
         )
         return jsonify(result), 200
 
@@ -60,7 +114,23 @@ def get_books() -> tuple:
         return jsonify({"error": "Failed to retrieve books"}), 500
 
 
+@books_bp.route("/suggest", methods=["GET"])
+def suggest_books() -> tuple:
+    """Get title/author typeahead suggestions for a prefix."""
+    try:
+        prefix = request.args.get("q", "")
+        limit = max(1, min(request.args.get("limit", 10, type=int), 50))
+
+        suggestions = BookService.suggest_books(prefix, limit)
+        return jsonify({"q": prefix, "suggestions": suggestions}), 200
+
+    except Exception:
+        return jsonify({"error": "Failed to retrieve suggestions"}), 500
+
+
 @books_bp.route("/<int:book_id>", methods=["GET"])
+@conditional_response(_book_validators)
+@cached_response("books")
 def get_book(book_id: int) -> tuple:
     """Get book by ID."""
     try:
@@ -68,7 +138,7 @@ def get_book(book_id: int) -> tuple:
         if not book:
             return jsonify({"error": "Book not found"}), 404
 
-        return jsonify({"book": book.to_dict()}), 200
+        return jsonify({"book": serialize_book(book)}), 200
 
     except ServiceValidationError as err:
         return jsonify({"error": str(err)}), err.status_code
@@ -87,7 +157,9 @@ def create_book() -> tuple:
         book = BookService.create_book(data)
 
         return (
-            jsonify({"message": "Book created successfully", "book": book.to_dict()}),
+            jsonify(
+                {"message": "Book created successfully", "book": serialize_book(book)}
+            ),
             201,
         )
 
@@ -102,17 +174,22 @@ def create_book() -> tuple:
 @admin_required
 @validate_json(BookUpdateSchema)
 def update_book(book_id: int) -> tuple:
-    """Update book information (admin only)."""
+    """
+    Update book information (admin only). With If-Match, only the version
+    of the book it names is updated.
+    """
     try:
         data = request.get_json()
-        book = BookService.update_book(book_id, data)
+        version = if_match_version("book", book_id)
+        book = BookService.update_book(book_id, data, version)
 
-        return (
-            jsonify({"message": "Book updated successfully", "book": book.to_dict()}),
-            200,
+        response = jsonify(
+            {"message": "Book updated successfully", "book": serialize_book(book)}
         )
+        response.set_etag(entity_tag("book", book.id, book.version), weak=True)
+        return response, 200
 
-    except ServiceValidationError as err:
+    except (ServiceValidationError, PreconditionFailedError) as err:
         return jsonify({"error": str(err)}), err.status_code
     except Exception:
         return jsonify({"error": "Failed to update book"}), 500
@@ -146,7 +223,9 @@ def borrow_book(book_id: int) -> tuple:
         loan = BookService.borrow_book(book_id, user_id, days)
 
         return (
-            jsonify({"message": "Book borrowed successfully", "loan": loan.to_dict()}),
+            jsonify(
+                {"message": "Book borrowed successfully", "loan": serialize_loan(loan)}
+            ),
             201,
         )
 
@@ -165,9 +244,7 @@ def return_book(loan_id: int) -> tuple:
         user_role = get_jwt().get("role", "user")
 
         # Get loan to check ownership
-        from src.models import BookLoan
-
-        loan = BookLoan.query.get(loan_id)
+        loan = BookService.get_loan_by_id(loan_id)
         if not loan:
             return jsonify({"error": "Loan not found"}), 404
 
@@ -178,7 +255,9 @@ def return_book(loan_id: int) -> tuple:
         loan = BookService.return_book(loan_id)
 
         return (
-            jsonify({"message": "Book returned successfully", "loan": loan.to_dict()}),
+            jsonify(
+                {"message": "Book returned successfully", "loan": serialize_loan(loan)}
+            ),
             200,
         )
 
@@ -192,19 +271,30 @@ def return_book(loan_id: int) -> tuple:
 @jwt_required()
 @admin_required
 def get_overdue_loans() -> tuple:
-    """Get all overdue loans (admin only)."""
+    """Get paginated, date-filterable list of overdue loans (admin only)."""
     try:
-        loans = BookService.get_overdue_loans()
-
-        return (
-            jsonify(
-                {
-                    "overdue_loans": [loan.to_dict() for loan in loans],
-                    "total": len(loans),
-                }
-            ),
-            200,
+        dates = {name: request.args.get(name) for name in LOAN_DATE_FILTERS}
+        filters = BookService.loan_filter(None, "overdue", **dates)
+
+        if "cursor" in request.args:
+            result = BookService.get_loans_by_cursor(
+                filters,
+                cursor=request.args["cursor"],
+                limit=cursor_limit(),
+                fields=request.args.get("fields"),
+                listing="overdue_loans",
+            )
+            return jsonify(result), 200
+
+        result = BookService.get_loans(
+            filters,
+            page=request.args.get("page", 1, type=int),
+            per_page=max(1, min(request.args.get("per_page", 20, type=int), 100)),
+            count=request.args.get("count", "exact"),
+            fields=request.args.get("fields"),
+            listing="overdue_loans",
         )
+        return jsonify(result), 200
 
     except ServiceValidationError as err:
         return jsonify({"error": str(err)}), err.status_code
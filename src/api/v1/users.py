@@ -2,15 +2,28 @@
 Users API endpoints.
 """
 
-from typing import Tuple
+from typing import Optional, Tuple
 
 from flask import Blueprint, Response, jsonify, request
 from flask_jwt_extended import jwt_required
 from marshmallow import Schema, fields
 
-from src.api.decorators import admin_required, owner_or_admin_required, validate_json
+from src.api.decorators import (
+    Validators,
+    admin_required,
+    conditional_response,
+    cursor_limit,
+    entity_tag,
+    if_match_version,
+    owner_or_admin_required,
+    validate_json,
+)
+from src.exceptions import PreconditionFailedError
 from src.exceptions import ValidationError as ServiceValidationError
+from src.serializers import serialize_user
+from src.services.book_service import LOAN_DATE_FILTERS, BookService
 from src.services.user_service import UserService
+from src.storage.backend import LoanFilter
 
 users_bp = Blueprint("users", __name__)
 
@@ -25,6 +38,38 @@ class UserUpdateSchema(Schema):
     password = fields.Str(validate=lambda x: len(x) >= 6)
 
 
+def _user_validators(user_id: int) -> Optional[Validators]:
+    """Validators of a user: their ID and version, and their latest change."""
+    user = UserService.get_user_by_id(user_id)
+    if user is None:
+        return None
+    return entity_tag("user", user.id, user.version), user.updated_at
+
+
+def _loans_filter(user_id: int) -> LoanFilter:
+    """The filter of a user's loan listing, from the query arguments."""
+    status = request.args.get("status", "all")
+    # The older spelling of ``status=active``
+    if request.args.get("active_only", "false").lower() == "true":
+        status = "active"
+    dates = {name: request.args.get(name) for name in LOAN_DATE_FILTERS}
+    return BookService.loan_filter(user_id, status, **dates)
+
+
+def _loans_validators(user_id: int) -> Optional[Validators]:
+    """
+    Validators of a user's loans: their number, latest change (of the loans
+    or the books and user they show), and how many are overdue by now and
+    by how many days.
+    """
+    try:
+        version = BookService.get_loans_version(_loans_filter(user_id))
+    except ServiceValidationError:
+        return None
+    # Loans become overdue without changing, so only the ETag validates
+    return entity_tag("loans", *version), None
+
+
 @users_bp.route("", methods=["GET"])
 @jwt_required()
 @admin_required
@@ -32,9 +77,22 @@ def get_users() -> Tuple[Response, int]:
     """Get paginated list of all users (admin only)."""
     try:
         page = request.args.get("page", 1, type=int)
-        per_page = min(request.args.get("per_page", 20, type=int), 100)
-
-        result = UserService.get_all_users(page=page, per_page=per_page)
+        per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+
+        if "cursor" in request.args:
+            result = UserService.get_users_by_cursor(
+                cursor=request.args["cursor"],
+                limit=cursor_limit(),
+                fields=request.args.get("fields"),
+            )
+            return jsonify(result), 200
+
+        result = UserService.get_all_users(
+            page=page,
+            per_page=per_page,
+            count=request.args.get("count", "exact"),
+            fields=request.args.get("fields"),
+        )
         return jsonify(result), 200
 
     except ServiceValidationError as err:
@@ -46,6 +104,7 @@ def get_users() -> Tuple[Response, int]:
 @users_bp.route("/<int:user_id>", methods=["GET"])
 @jwt_required()
 @owner_or_admin_required
+@conditional_response(_user_validators)
 def get_user(user_id: int) -> Tuple[Response, int]:
     """Get user by ID (owner or admin only)."""
     try:
@@ -53,7 +112,7 @@ def get_user(user_id: int) -> Tuple[Response, int]:
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        return jsonify({"user": user.to_dict(include_email=True)}), 200
+        return jsonify({"user": serialize_user(user, include_email=True)}), 200
 
     except ServiceValidationError as err:
         return jsonify({"error": str(err)}), err.status_code
@@ -66,22 +125,25 @@ def get_user(user_id: int) -> Tuple[Response, int]:
 @owner_or_admin_required
 @validate_json(UserUpdateSchema)
 def update_user(user_id: int) -> Tuple[Response, int]:
-    """Update user information (owner or admin only)."""
+    """
+    Update user information (owner or admin only). With If-Match, only the
+    version of the user it names is updated.
+    """
     try:
         data = request.get_json()
-        user = UserService.update_user(user_id, data)
-
-        return (
-            jsonify(
-                {
-                    "message": "User updated successfully",
-                    "user": user.to_dict(include_email=True),
-                }
-            ),
-            200,
+        version = if_match_version("user", user_id)
+        user = UserService.update_user(user_id, data, version)
+
+        response = jsonify(
+            {
+                "message": "User updated successfully",
+                "user": serialize_user(user, include_email=True),
+            }
         )
+        response.set_etag(entity_tag("user", user.id, user.version), weak=True)
+        return response, 200
 
-    except ServiceValidationError as err:
+    except (ServiceValidationError, PreconditionFailedError) as err:
         return jsonify({"error": str(err)}), err.status_code
     except Exception:
         return jsonify({"error": "Failed to update user"}), 500
@@ -105,18 +167,29 @@ def delete_user(user_id: int) -> Tuple[Response, int]:
 @users_bp.route("/<int:user_id>/loans", methods=["GET"])
 @jwt_required()
 @owner_or_admin_required
+@conditional_response(_loans_validators)
 def get_user_loans(user_id: int) -> Tuple[Response, int]:
-    """Get user's loan history (owner or admin only)."""
+    """Get paginated, filterable list of a user's loans (owner or admin only)."""
     try:
-        from src.services.book_service import BookService
-
-        active_only = request.args.get("active_only", "false").lower() == "true"
-        loans = BookService.get_user_loans(user_id, active_only=active_only)
-
-        return (
-            jsonify({"loans": [loan.to_dict() for loan in loans], "total": len(loans)}),
-            200,
+        filters = _loans_filter(user_id)
+
+        if "cursor" in request.args:
+            result = BookService.get_loans_by_cursor(
+                filters,
+                cursor=request.args["cursor"],
+                limit=cursor_limit(),
+                fields=request.args.get("fields"),
+            )
+            return jsonify(result), 200
+
+        result = BookService.get_loans(
+            filters,
+            page=request.args.get("page", 1, type=int),
+            per_page=max(1, min(request.args.get("per_page", 20, type=int), 100)),
+            count=request.args.get("count", "exact"),
+            fields=request.args.get("fields"),
         )
+        return jsonify(result), 200
 
     except ServiceValidationError as err:
         return jsonify({"error": str(err)}), err.status_code
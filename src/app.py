@@ -7,10 +7,12 @@ application factory pattern for better modularity and testing.
 
 import os
 
+import click
 from dotenv import load_dotenv
 from flask import Flask
 
 from src import create_app  # noqa: E402
+from src.storage.suggestions import preload_suggestions
 
 # Load environment variables
 load_dotenv()
@@ -20,6 +22,12 @@ def create_application() -> Flask:
     """Create and configure the Flask application."""
     config_name = os.environ.get("FLASK_ENV", "development")
     app = create_app(config_name)
+    # Only servers answer suggestions. CLI commands, such as ``flask db
+    # upgrade``, load the app within a click context and may run before the
+    # books table exists; a server started by ``flask run`` builds the index
+    # on first use.
+    if click.get_current_context(silent=True) is None:
+        preload_suggestions(app)
     return app
 
 
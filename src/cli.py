@@ -2,6 +2,10 @@
 CLI commands for the application.
 """
 
+import time
+from datetime import timedelta
+from typing import Optional
+
 import click
 from flask import Flask
 
@@ -128,6 +132,61 @@ def register_commands(app: Flask) -> None:
 
         click.echo("Database seeding completed!")
 
+    @app.cli.command()
+    @click.option("--repair", is_flag=True, help="Fix the counters that drifted")
+    def check_loan_counters(repair: bool) -> None:
+        """Check the active loan counters of books and users against the loans."""
+        drifts = BookService.check_active_loans(repair)
+        for drift in drifts:
+            click.echo(
+                f"{drift.table} {drift.id}: counter {drift.counter}, "
+                f"{drift.loans} unreturned loans"
+            )
+
+        if not drifts:
+            click.echo("All active loan counters match the loans.")
+        elif repair:
+            click.echo(f"Repaired {len(drifts)} counters.")
+        else:
+            click.echo(
+                f"{len(drifts)} counters drifted; run with --repair to fix them."
+            )
+            raise SystemExit(1)
+
+    @app.cli.command()
+    @click.option(
+        "--older-than",
+        type=click.IntRange(min=0),
+        help="Archive the loans returned more than this many days ago "
+        "(default: LOAN_ARCHIVE_AFTER_DAYS)",
+    )
+    @click.option(
+        "--batch-size",
+        type=click.IntRange(min=1),
+        help="Loans moved per transaction (default: LOAN_ARCHIVE_BATCH_SIZE)",
+    )
+    @click.option(
+        "--every",
+        type=click.FloatRange(min=0),
+        default=0,
+        help="Keep running, archiving again every this many seconds",
+    )
+    def archive_loans(
+        older_than: Optional[int], batch_size: Optional[int], every: float
+    ) -> None:
+        """Move long-returned loans out of the loans table into the archive."""
+        days = (
+            app.config["LOAN_ARCHIVE_AFTER_DAYS"] if older_than is None else older_than
+        )
+        batch_size = batch_size or app.config["LOAN_ARCHIVE_BATCH_SIZE"]
+        while True:
+            archived = BookService.archive_loans(timedelta(days=days), batch_size)
+            click.echo(f"Archived {archived} loans returned over {days} days ago.")
+            if not every:
+                return
+            db.session.remove()
+            time.sleep(every)
+
     @app.cli.command()
     @click.option("--email", prompt=True, help="Admin email")
     @click.option("--password", prompt=True, hide_input=True, help="Admin password")
@@ -22,6 +22,56 @@ class Config:
         "pool_recycle": 300,
     }
 
+    # JSON encoding of responses: "orjson", "stdlib" or "auto" (orjson if
+    # installed)
+    JSON_PROVIDER = os.environ.get("JSON_PROVIDER") or "auto"
+
+    # Storage backend used by the services: "sqlalchemy" or "memory"
+    STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND") or "sqlalchemy"
+
+    # Rebuild a worker's typeahead index once it is this old, to pick up
+    # books written by other workers
+    SUGGEST_MAX_AGE_SECONDS = int(os.environ.get("SUGGEST_MAX_AGE_SECONDS", 300))
+
+    # Reuse an exact listing count for this long, unless a write in this
+    # worker invalidates it first
+    COUNT_CACHE_SECONDS = int(os.environ.get("COUNT_CACHE_SECONDS", 60))
+
+    # Cache of public catalog responses: "memory", "redis" or "none"
+    RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND") or "memory"
+    RESPONSE_CACHE_REDIS_URL = (
+        os.environ.get("RESPONSE_CACHE_REDIS_URL")
+        or os.environ.get("REDIS_URL")
+        or "redis://localhost:6379/0"
+    )
+    RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", 30))
+    # How long past its TTL a response is served while being refreshed
+    RESPONSE_CACHE_STALE_SECONDS = float(
+        os.environ.get("RESPONSE_CACHE_STALE_SECONDS", 30)
+    )
+    RESPONSE_CACHE_MAX_BYTES = int(
+        os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    )
+
+    # Cache of books and users by ID: a per-worker L1 of up to this many
+    # entities (0 disables the cache) and an optional shared L2 ("redis")
+    ENTITY_CACHE_SIZE = int(os.environ.get("ENTITY_CACHE_SIZE", 10000))
+    ENTITY_CACHE_TTL_SECONDS = float(os.environ.get("ENTITY_CACHE_TTL_SECONDS", 30))
+    ENTITY_CACHE_L2 = os.environ.get("ENTITY_CACHE_L2") or "none"
+    ENTITY_CACHE_REDIS_URL = (
+        os.environ.get("ENTITY_CACHE_REDIS_URL")
+        or os.environ.get("REDIS_URL")
+        or "redis://localhost:6379/0"
+    )
+    ENTITY_CACHE_L2_TTL_SECONDS = float(
+        os.environ.get("ENTITY_CACHE_L2_TTL_SECONDS", 300)
+    )
+
+    # Legacy in-memory storage persistence (disabled when unset); each worker
+    # process keeps its own data in the directory or a worker-<n> subdirectory
+    LIBRARY_STORAGE_DIR = os.environ.get("LIBRARY_STORAGE_DIR")
+    LIBRARY_SNAPSHOT_EVERY = int(os.environ.get("LIBRARY_SNAPSHOT_EVERY", 100000))
+
     # Security settings
     JWT_SECRET_KEY = (
         os.environ.get("JWT_SECRET_KEY") or "jwt-secret-change-in-production"
@@ -38,6 +88,14 @@ class Config:
     ITEMS_PER_PAGE = int(os.environ.get("ITEMS_PER_PAGE", 20))
     MAX_ITEMS_PER_PAGE = int(os.environ.get("MAX_ITEMS_PER_PAGE", 100))
 
+    # Most unreturned loans a user may have at once (0 for no limit)
+    MAX_ACTIVE_LOANS = int(os.environ.get("MAX_ACTIVE_LOANS", 0))
+
+    # ``flask archive-loans`` moves loans returned more than this many days
+    # ago out of the loans table, this many loans per transaction
+    LOAN_ARCHIVE_AFTER_DAYS = int(os.environ.get("LOAN_ARCHIVE_AFTER_DAYS", 365))
+    LOAN_ARCHIVE_BATCH_SIZE = int(os.environ.get("LOAN_ARCHIVE_BATCH_SIZE", 1000))
+
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -56,6 +114,7 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     BCRYPT_LOG_ROUNDS = 4  # Faster hashing for tests
     WTF_CSRF_ENABLED = False
+    LIBRARY_STORAGE_DIR = None
 
 
 class ProductionConfig(Config):
@@ -33,6 +33,13 @@ class ConflictError(LibraryException):
         super().__init__(message, 409)
 
 
+class PreconditionFailedError(LibraryException):
+    """Exception for a request precondition, such as If-Match, that fails."""
+
+    def __init__(self, message: str):
+        super().__init__(message, 412)
+
+
 class UnauthorizedError(LibraryException):
     """Exception for unauthorized access."""
 
@@ -45,3 +52,15 @@ class ForbiddenError(LibraryException):
 
     def __init__(self, message: str):
         super().__init__(message, 403)
+
+
+class DuplicateError(ConflictError):
+    """Exception for a unique field that is already taken in storage."""
+
+
+class LimitExceededError(ConflictError):
+    """Exception for a write that would exceed a limit, such as loans per user."""
+
+
+class StaleVersionError(PreconditionFailedError):
+    """Exception for a write to an entity that changed since it was read."""
@@ -0,0 +1,88 @@
+"""
+JSON providers for encoding responses and decoding request bodies.
+
+``JSON_PROVIDER`` selects the provider of the app:
+
+- ``orjson``: ``OrjsonProvider``, which encodes in C with the optional
+  ``orjson`` package;
+- ``stdlib``: ``StdlibJSONProvider``, Flask's provider on the standard
+  ``json`` module;
+- ``auto`` (default): ``orjson`` when it is installed, ``stdlib`` otherwise.
+
+Both keep keys in insertion order instead of sorting them, and encode dates
+and datetimes in ISO 8601 format (``isoformat()``), so the serializers in
+``src.serializers`` hand timestamps over as they are.
+"""
+
+from datetime import date
+from typing import Any, Union
+
+from flask import Flask, Response
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore[assignment]
+
+JSON_PROVIDERS = ("auto", "orjson", "stdlib")
+
+
+def _default(value: Any) -> Any:
+    """Encodes dates in ISO 8601 format and other values as Flask does."""
+    if isinstance(value, date):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, without sorting keys and with ISO 8601 dates."""
+
+    default = staticmethod(_default)  # type: ignore[assignment]
+    sort_keys = False
+
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider on ``orjson``, which writes responses as bytes directly."""
+
+    # Same meaning as ``DefaultJSONProvider.compact``
+    compact = None
+    mimetype = "application/json"
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """Serializes ``obj`` to a JSON string; ``kwargs`` are ignored."""
+        return self._encode(obj).decode()
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        """Deserializes a JSON string or bytes; ``kwargs`` are ignored."""
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        """Serializes the arguments, as ``jsonify`` does, into a response."""
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = self._encode(obj, orjson.OPT_INDENT_2 if indent else 0)
+        response: Response = self._app.response_class(body, mimetype=self.mimetype)
+        return response
+
+    @staticmethod
+    def _encode(obj: Any, option: int = 0) -> bytes:
+        """Encodes a value, allowing non-string dictionary keys like ``json``."""
+        encoded: bytes = orjson.dumps(
+            obj, default=_default, option=option | orjson.OPT_NON_STR_KEYS
+        )
+        return encoded
+
+
+def init_json_provider(app: Flask) -> None:
+    """Installs the JSON provider configured for the app."""
+    name = app.config["JSON_PROVIDER"]
+    if name not in JSON_PROVIDERS:
+        raise ValueError(f"Unknown JSON provider: {name}")
+    if name == "orjson" and orjson is None:
+        raise ValueError("JSON_PROVIDER=orjson requires the orjson package")
+
+    if name == "stdlib" or orjson is None:
+        app.json = StdlibJSONProvider(app)
+    else:
+        app.json = OrjsonProvider(app)
@@ -5,6 +5,7 @@ Database models for the library application.
 from datetime import datetime
 from typing import Any, Dict
 
+from sqlalchemy import event
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from src.extensions import db
@@ -19,6 +20,15 @@ class TimestampMixin:
     )
 
 
+# Engines whose indexes can cover only the rows matching a condition
+PARTIAL_INDEX_DIALECTS = ("postgresql", "sqlite")
+
+
+def _without_partial_indexes(ddl: Any, target: Any, bind: Any, **kw: Any) -> bool:
+    """Whether DDL runs on an engine without partial indexes."""
+    return kw["dialect"].name not in PARTIAL_INDEX_DIALECTS
+
+
 class User(db.Model, TimestampMixin):  # type: ignore[name-defined]
     """User model for library system."""
 
@@ -30,6 +40,12 @@ class User(db.Model, TimestampMixin):  # type: ignore[name-defined]
     password_hash = db.Column(db.String(255), nullable=False)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     role = db.Column(db.String(20), default="user", nullable=False)  # user, admin
+    # Unreturned loans, kept up to date by borrows and returns
+    active_loans = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    # Incremented by every update, which only applies to the version it read
+    version = db.Column(db.Integer, nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     # Relationships
     borrowed_books = db.relationship("BookLoan", back_populates="user", lazy="dynamic")
@@ -39,7 +55,13 @@ class User(db.Model, TimestampMixin):  # type: ignore[name-defined]
 
     def set_password(self, password: str) -> None:
         """Set password hash."""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = self.hash_password(password)
+
+    @staticmethod
+    def hash_password(password: str) -> str:
+        """Hash a password for ``password_hash``."""
+        hashed: str = generate_password_hash(password)
+        return hashed
 
     def check_password(self, password: str) -> bool:
         """Check if provided password matches hash."""
@@ -52,6 +74,7 @@ class User(db.Model, TimestampMixin):  # type: ignore[name-defined]
             "name": self.name,
             "is_active": self.is_active,
             "role": self.role,
+            "version": self.version,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
         }
@@ -87,6 +110,12 @@ class Book(db.Model, TimestampMixin):  # type: ignore[name-defined]
     is_available = db.Column(db.Boolean, default=True, nullable=False)
     total_copies = db.Column(db.Integer, default=1, nullable=False)
     available_copies = db.Column(db.Integer, default=1, nullable=False)
+    # Unreturned loans, kept up to date by borrows and returns
+    active_loans = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    # Incremented by every update, which only applies to the version it read
+    version = db.Column(db.Integer, nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     # Relationships
     loans = db.relationship("BookLoan", back_populates="book", lazy="dynamic")
@@ -106,6 +135,7 @@ class Book(db.Model, TimestampMixin):  # type: ignore[name-defined]
             "is_available": self.is_available,
             "total_copies": self.total_copies,
             "available_copies": self.available_copies,
+            "version": self.version,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
         }
@@ -141,8 +171,38 @@ class BookLoan(db.Model, TimestampMixin):  # type: ignore[name-defined]
     user = db.relationship("User", back_populates="borrowed_books")
     book = db.relationship("Book", back_populates="loans")
 
+    # Loans are looked up by user or book and whether they are returned, and
+    # overdue loans by the due dates of the unreturned ones, which a partial
+    # index keeps apart from the ever growing returned loans. Engines
+    # without partial indexes index every due date after ``is_returned``
+    # instead, and cannot enforce that a user has at most one unreturned
+    # loan of a book (returned loans are kept, so that uniqueness only
+    # covers the open ones).
+    __table_args__ = (
+        db.Index("ix_book_loans_user_id_is_returned", "user_id", "is_returned"),
+        db.Index("ix_book_loans_book_id_is_returned", "book_id", "is_returned"),
+        db.Index(
+            "ix_book_loans_open_due_date",
+            "due_date",
+            sqlite_where=~is_returned,
+            postgresql_where=~is_returned,
+        ).ddl_if(dialect=PARTIAL_INDEX_DIALECTS),
+        db.Index(
+            "ix_book_loans_is_returned_due_date", "is_returned", "due_date"
+        ).ddl_if(callable_=_without_partial_indexes),
+        db.Index(
+            "uq_book_loans_open_user_book",
+            "user_id",
+            "book_id",
+            unique=True,
+            sqlite_where=db.text("NOT is_returned"),
+            postgresql_where=db.text("NOT is_returned"),
+        ).ddl_if(dialect=PARTIAL_INDEX_DIALECTS),
+    )
+
     def __repr__(self) -> str:
-        return f"<BookLoan {self.user.name} - {self.book.title}>"
+        # IDs only: reading the user or book would load them
+        return f"<BookLoan {self.id} user={self.user_id} book={self.book_id}>"
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert loan to dictionary."""
@@ -157,6 +217,7 @@ class BookLoan(db.Model, TimestampMixin):  # type: ignore[name-defined]
             "returned_at": self.returned_at.isoformat() if self.returned_at else None,
             "is_returned": self.is_returned,
             "is_overdue": self.is_overdue(),
+            "days_overdue": self.days_overdue(),
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
         }
@@ -166,3 +227,59 @@ class BookLoan(db.Model, TimestampMixin):  # type: ignore[name-defined]
         if self.is_returned:
             return False
         return bool(datetime.utcnow() > self.due_date)
+
+    def days_overdue(self) -> int:
+        """Whole days the loan is overdue by, 0 if it is not overdue."""
+        if not self.is_overdue():
+            return 0
+        return int((datetime.utcnow() - self.due_date).days)
+
+
+class BookLoanHistory(db.Model, TimestampMixin):  # type: ignore[name-defined]
+    """
+    Archive of long-returned loans, moved out of ``book_loans`` with their
+    IDs and columns unchanged, so the loans table only grows with the loans
+    still in use. Loan listings that can show returned loans read both.
+    """
+
+    __tablename__ = "book_loans_history"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    book_id = db.Column(db.Integer, db.ForeignKey("books.id"), nullable=False)
+    borrowed_at = db.Column(db.DateTime, nullable=False)
+    due_date = db.Column(db.DateTime, nullable=False)
+    returned_at = db.Column(db.DateTime)
+    is_returned = db.Column(db.Boolean, nullable=False)
+
+    # Archived loans are only listed by user
+    __table_args__ = (db.Index("ix_book_loans_history_user_id", "user_id"),)
+
+    def __repr__(self) -> str:
+        return f"<BookLoanHistory {self.id} user={self.user_id} book={self.book_id}>"
+
+
+class CatalogGeneration(db.Model):  # type: ignore[name-defined]
+    """
+    Counter bumped by every write to one type of entity, so that workers can
+    tell whether their in-process caches of that type are still current.
+    """
+
+    __tablename__ = "catalog_generations"
+
+    # The entity types with a generation
+    NAMES = ("books", "users")
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, default=0, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<CatalogGeneration {self.name}={self.value}>"
+
+
+@event.listens_for(CatalogGeneration.__table__, "after_create")
+def _seed_generations(target: Any, connection: Any, **kwargs: Any) -> None:
+    connection.execute(
+        target.insert(),
+        [{"name": name, "value": 0} for name in CatalogGeneration.NAMES],
+    )
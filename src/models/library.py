@@ -3,25 +3,270 @@ This module defines the Library data class which represents a collection of
 users and books.
 """
 
+import threading
+from bisect import bisect_left, insort
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from typing import List
+from operator import attrgetter
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+)
 
 from .book import Book
 from .user import LibraryUser
 
+# Sorts after every character a title prefix can be followed by.
+_MAX_CHAR = "\U0010ffff"
 
-@dataclass
+# Book fields with a sorted secondary index.
+_INDEXED_BOOK_FIELDS = ("author", "title", "year")
+
+_book_id = attrgetter("id")
+
+
+class LibraryJournal(Protocol):
+    """
+    Receives every change made to a Library, e.g. to persist it.
+
+    ``append`` is called while the changed collection is still locked, so the
+    journal sees changes in the order they were applied. ``commit`` is called
+    after the lock is released with the ticket ``append`` returned, and should
+    block until that change is durable.
+    """
+
+    def append(self, operation: str, record: Tuple[Any, ...]) -> int:
+        """Records a change and returns a ticket for ``commit``."""
+
+    def commit(self, ticket: int) -> None:
+        """Blocks until the change with the given ticket is durable."""
+
+
+@dataclass(init=False)
 class Library:
     """
     A dataclass representing a library with books and users.
 
-    :ivar books: A list of Book objects that are present in the library.
-    :ivar users: A list of LibraryUser objects representing the users of the
-    library.
+    Records are kept in insertion-ordered dictionaries keyed by ID, so lookups
+    and deletes by primary key take constant time while iteration still
+    follows insertion order. Users are additionally indexed by name and email.
+    Books are also indexed by author, title and year in sorted arrays of
+    ``(key, id)`` pairs, so exact, prefix and range queries take
+    O(log n + k) instead of a full scan. These indexes are built on the first
+    query, so restoring a large library does not pay for them up front.
+
+    The library is safe to share between threads. Books and users each have
+    their own lock, so writers of one collection never wait for the other.
+    Full listings are served from immutable snapshots that are rebuilt lazily
+    after a write, so readers render them without holding any lock. IDs
+    handed out by ``allocate_book_id``/``allocate_user_id`` are never reused,
+    even after deletes.
+
+    Every create and delete is reported to the attached journal, if any.
+
+    :ivar books: The books that are present in the library, read-only.
+    :ivar users: The LibraryUser objects representing the users of the
+    library, read-only.
     """
 
-    books: List[Book] = field(default_factory=list)
-    users: List[LibraryUser] = field(default_factory=list)
+    _books: Dict[int, Book] = field(repr=False)
+    _users: Dict[int, LibraryUser] = field(repr=False)
+    _users_by_name: Dict[str, Dict[int, LibraryUser]] = field(repr=False)
+    _users_by_email: Dict[str, Dict[int, LibraryUser]] = field(repr=False)
+    _book_indexes: Optional[Dict[str, "SortedIndex"]] = field(repr=False, compare=False)
+    _next_book_id: int = field(repr=False)
+    _next_user_id: int = field(repr=False)
+    _books_snapshot: Optional[Tuple[Book, ...]] = field(repr=False, compare=False)
+    _users_snapshot: Optional[Tuple[LibraryUser, ...]] = field(
+        repr=False, compare=False
+    )
+    _book_lock: threading.RLock = field(repr=False, compare=False)
+    _user_lock: threading.RLock = field(repr=False, compare=False)
+    _journal: Optional[LibraryJournal] = field(repr=False, compare=False)
+
+    def __init__(
+        self, books: Iterable[Book] = (), users: Iterable[LibraryUser] = ()
+    ) -> None:
+        """
+        Creates a library holding the given books and users.
+
+        :param books: The books to hold, in insertion order.
+        :param users: The users to hold, in insertion order.
+        """
+        self._book_lock = threading.RLock()
+        self._user_lock = threading.RLock()
+        self._journal = None
+        self.load(books, users)
+
+    @property
+    def books(self) -> Tuple[Book, ...]:
+        """
+        All books in insertion order, as the shared snapshot of
+        ``books_snapshot``: free to read again until the next write to books,
+        after which the first access copies the references of all of them.
+        """
+        return self.books_snapshot()
+
+    @property
+    def users(self) -> Tuple[LibraryUser, ...]:
+        """
+        All users in insertion order, as the shared snapshot of
+        ``users_snapshot``, copied again only after a write to users.
+        """
+        return self.users_snapshot()
+
+    @property
+    def book_count(self) -> int:
+        """The number of books in the library."""
+        return len(self._books)
+
+    @property
+    def user_count(self) -> int:
+        """The number of users in the library."""
+        return len(self._users)
+
+    @property
+    def next_book_id(self) -> int:
+        """The ID the next call to ``allocate_book_id`` will return."""
+        return self._next_book_id
+
+    @property
+    def next_user_id(self) -> int:
+        """The ID the next call to ``allocate_user_id`` will return."""
+        return self._next_user_id
+
+    # Journaling and bulk loading
+    def attach_journal(self, journal: Optional[LibraryJournal]) -> None:
+        """
+        Reports all further changes to the given journal.
+
+        :param journal: The journal to attach, or None to detach the current one.
+        """
+        with self.write_locked():
+            self._journal = journal
+
+    @contextmanager
+    def write_locked(self) -> Iterator[None]:
+        """Blocks all writers to the library for the duration of the block."""
+        with self._book_lock, self._user_lock:
+            yield
+
+    def load(
+        self,
+        books: Iterable[Book],
+        users: Iterable[LibraryUser],
+        next_book_id: int = 0,
+        next_user_id: int = 0,
+        book_ids: Optional[Sequence[int]] = None,
+    ) -> None:
+        """
+        Replaces the whole content of the library in one pass.
+
+        Used to restore persisted state; nothing is reported to the journal.
+
+        :param books: The books to hold, in insertion order.
+        :param users: The users to hold, in insertion order.
+        :param next_book_id: The lowest book ID that may be allocated next.
+        :param next_user_id: The lowest user ID that may be allocated next.
+        :param book_ids: The IDs of the books, in the same order, when the
+            caller already has them as a column; saves reading each book's.
+        """
+        with self.write_locked():
+            if book_ids is None:
+                books = books if isinstance(books, list) else list(books)
+                book_ids = list(map(_book_id, books))
+            self._books = dict(zip(book_ids, books))
+            self._book_indexes = None
+            self._users = {user.id: user for user in users}
+            self._users_by_name = {}
+            self._users_by_email = {}
+            for user in self._users.values():
+                self._users_by_name.setdefault(user.name, {})[user.id] = user
+                self._users_by_email.setdefault(user.email, {})[user.id] = user
+            self._next_book_id = max(next_book_id, max(book_ids, default=-1) + 1)
+            self._next_user_id = max(next_user_id, max(self._users, default=-1) + 1)
+            self._books_snapshot = None
+            self._users_snapshot = None
+
+    def _log(self, operation: str, record: Tuple[Any, ...]) -> int:
+        """Reports a change to the journal; must be called under the lock."""
+        if self._journal is None:
+            return 0
+        return self._journal.append(operation, record)
+
+    def _commit(self, ticket: int) -> None:
+        """Waits until a reported change is durable; call outside the lock."""
+        journal = self._journal
+        if journal is not None and ticket:
+            journal.commit(ticket)
+
+    # Snapshots
+    def books_snapshot(self) -> Tuple[Book, ...]:
+        """
+        Returns an immutable view of all books, in insertion order.
+
+        The view is shared between readers until the next write to books.
+        """
+        snapshot = self._books_snapshot
+        if snapshot is None:
+            with self._book_lock:
+                snapshot = self._books_snapshot
+                if snapshot is None:
+                    snapshot = self._books_snapshot = tuple(self._books.values())
+        return snapshot
+
+    def users_snapshot(self) -> Tuple[LibraryUser, ...]:
+        """
+        Returns an immutable view of all users, in insertion order.
+
+        The view is shared between readers until the next write to users.
+        """
+        snapshot = self._users_snapshot
+        if snapshot is None:
+            with self._user_lock:
+                snapshot = self._users_snapshot
+                if snapshot is None:
+                    snapshot = self._users_snapshot = tuple(self._users.values())
+        return snapshot
+
+    # Bulk export
+    def book_dicts(self) -> List[Dict[str, Any]]:
+        """Returns all books as dictionaries, in insertion order."""
+        return [book.to_dict() for book in self.books_snapshot()]
+
+    def book_rows(self) -> List[Tuple[int, str, str, int]]:
+        """Returns all books as ``(id, title, author, year)`` tuples."""
+        return [book.to_row() for book in self.books_snapshot()]
+
+    def user_dicts(self) -> List[Dict[str, Any]]:
+        """Returns all users as dictionaries, in insertion order."""
+        return [user.to_dict() for user in self.users_snapshot()]
+
+    def user_rows(self) -> List[Tuple[int, str, str, str]]:
+        """Returns all users as ``(id, name, email, password)`` tuples."""
+        return [user.to_row() for user in self.users_snapshot()]
+
+    # ID allocation
+    def allocate_book_id(self) -> int:
+        """Returns a book ID that has never been used in this library."""
+        with self._book_lock:
+            book_id = self._next_book_id
+            self._next_book_id += 1
+            return book_id
+
+    def allocate_user_id(self) -> int:
+        """Returns a user ID that has never been used in this library."""
+        with self._user_lock:
+            user_id = self._next_user_id
+            self._next_user_id += 1
+            return user_id
 
     # CRUD operations for books
     def create_book(self, book: Book) -> None:
@@ -30,7 +275,25 @@ class Library:
 
         :param book: The Book object to be added to the library.
         """
-        self.books.append(book)
+        with self._book_lock:
+            if book.id in self._books:
+                raise ValueError(f"Book with ID {book.id} already exists")
+            self._books[book.id] = book
+            if self._book_indexes is not None:
+                for name, index in self._book_indexes.items():
+                    index.add((getattr(book, name), book.id))
+            self._next_book_id = max(self._next_book_id, book.id + 1)
+            self._books_snapshot = None
+            ticket = self._log("create_book", book.to_row())
+        self._commit(ticket)
+
+    def get_book(self, id: int) -> Optional[Book]:
+        """
+        Returns the book with the given ID, if it exists.
+
+        :param id: The ID of the book to look up.
+        """
+        return self._books.get(id)
 
     def delete_book(self, id: int) -> None:
         """
@@ -38,11 +301,88 @@ class Library:
 
         :param id: The ID of the book to be deleted.
         """
-        for i, book in enumerate(self.books):
-            if book.id == id:
-                del self.books[i]
-                return
-        raise ValueError(f"Book with ID {id} not found")
+        with self._book_lock:
+            book = self._books.pop(id, None)
+            if book is None:
+                raise ValueError(f"Book with ID {id} not found")
+            if self._book_indexes is not None:
+                for name, index in self._book_indexes.items():
+                    index.remove((getattr(book, name), id))
+            self._books_snapshot = None
+            ticket = self._log("delete_book", (id,))
+        self._commit(ticket)
+
+    # Secondary index queries for books
+    def find_books_by_author(
+        self, author: str, limit: Optional[int] = None, offset: int = 0
+    ) -> List[Book]:
+        """
+        Returns the books by the given author, ordered by ID.
+
+        :param author: The exact author name.
+        :param limit: The maximum number of books to return; all by default.
+        :param offset: The number of matching books to skip.
+        """
+        return self._range("author", (author,), (author + "\0",), limit, offset)
+
+    def find_books_by_title_prefix(
+        self, prefix: str, limit: Optional[int] = None, offset: int = 0
+    ) -> List[Book]:
+        """
+        Returns the books whose title starts with the given prefix, ordered by
+        title and then ID.
+
+        :param prefix: The case-sensitive title prefix.
+        :param limit: The maximum number of books to return; all by default.
+        :param offset: The number of matching books to skip.
+        """
+        return self._range("title", (prefix,), (prefix + _MAX_CHAR,), limit, offset)
+
+    def find_books_by_year_range(
+        self,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[Book]:
+        """
+        Returns the books published within a year range, ordered by year and
+        then ID.
+
+        :param start: The first year to include; unbounded by default.
+        :param end: The last year to include; unbounded by default.
+        :param limit: The maximum number of books to return; all by default.
+        :param offset: The number of matching books to skip.
+        """
+        low = () if start is None else (start,)
+        high = None if end is None else (end + 1,)
+        return self._range("year", low, high, limit, offset)
+
+    def _range(
+        self,
+        name: str,
+        low: Tuple[Any, ...],
+        high: Optional[Tuple[Any, ...]],
+        limit: Optional[int],
+        offset: int,
+    ) -> List[Book]:
+        """
+        Returns the books whose entries in the index on the given field lie
+        in ``[low, high)``, where a missing ``high`` means no upper bound.
+        """
+        with self._book_lock:
+            if self._book_indexes is None:
+                self._book_indexes = {
+                    field_name: SortedIndex(
+                        (getattr(book, field_name), book.id)
+                        for book in self._books.values()
+                    )
+                    for field_name in _INDEXED_BOOK_FIELDS
+                }
+            index = self._book_indexes[name]
+            book_ids = index.range(low, high, limit, max(offset, 0))
+            books = self._books
+            return [books[book_id] for book_id in book_ids]
 
     def create_user(self, user: LibraryUser) -> None:
         """
@@ -50,7 +390,42 @@ class Library:
 
         :param user: The LibraryUser object to be added to the library.
         """
-        self.users.append(user)
+        with self._user_lock:
+            if user.id in self._users:
+                raise ValueError(f"User with ID {user.id} already exists")
+            self._users[user.id] = user
+            self._users_by_name.setdefault(user.name, {})[user.id] = user
+            self._users_by_email.setdefault(user.email, {})[user.id] = user
+            self._next_user_id = max(self._next_user_id, user.id + 1)
+            self._users_snapshot = None
+            ticket = self._log("create_user", user.to_row())
+        self._commit(ticket)
+
+    def get_user(self, user_id: int) -> Optional[LibraryUser]:
+        """
+        Returns the user with the given ID, if it exists.
+
+        :param user_id: The ID of the user to look up.
+        """
+        return self._users.get(user_id)
+
+    def find_user_by_name(self, name: str) -> Optional[LibraryUser]:
+        """
+        Returns the earliest added user with the given name, if any.
+
+        :param name: The name of the user to look up.
+        """
+        with self._user_lock:
+            return _first(self._users_by_name.get(name))
+
+    def find_user_by_email(self, email: str) -> Optional[LibraryUser]:
+        """
+        Returns the earliest added user with the given email, if any.
+
+        :param email: The email of the user to look up.
+        """
+        with self._user_lock:
+            return _first(self._users_by_email.get(email))
 
     def delete_user(self, user_id: int) -> None:
         """
@@ -58,8 +433,118 @@ class Library:
 
         :param user_id: The ID of the user to be deleted.
         """
-        for i, user in enumerate(self.users):
-            if user.id == user_id:
-                del self.users[i]
-                return
-        raise ValueError(f"User with ID {user_id} not found")
+        with self._user_lock:
+            user = self._users.pop(user_id, None)
+            if user is None:
+                raise ValueError(f"User with ID {user_id} not found")
+            _unindex(self._users_by_name, user.name, user_id)
+            _unindex(self._users_by_email, user.email, user_id)
+            self._users_snapshot = None
+            ticket = self._log("delete_user", (user_id,))
+        self._commit(ticket)
+
+
+def _first(bucket: Optional[Dict[int, LibraryUser]]) -> Optional[LibraryUser]:
+    """Returns the first user of an index bucket, if the bucket is non-empty."""
+    if not bucket:
+        return None
+    return next(iter(bucket.values()))
+
+
+def _unindex(index: Dict[str, Dict[int, LibraryUser]], key: str, user_id: int) -> None:
+    """Removes a user ID from an index bucket, dropping the bucket when empty."""
+    bucket = index.get(key)
+    if bucket is None:
+        return
+    bucket.pop(user_id, None)
+    if not bucket:
+        del index[key]
+
+
+class SortedIndex:
+    """
+    A sorted array of ``(key, id)`` entries, split into chunks of bounded
+    size so an insert or delete only shifts one chunk instead of the whole
+    array. ``_maxes`` holds the last entry of each chunk for bisecting.
+    """
+
+    _LOAD = 512
+
+    def __init__(self, entries: Iterable[Tuple[Any, int]] = ()) -> None:
+        ordered = sorted(entries)
+        self._chunks: List[List[Tuple[Any, int]]] = []
+        for start in range(0, len(ordered), self._LOAD):
+            end = start + self._LOAD
+            self._chunks.append(ordered[start:end])
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+
+    def add(self, entry: Tuple[Any, int]) -> None:
+        """Inserts an entry, keeping the array sorted."""
+        if not self._chunks:
+            self._chunks.append([entry])
+            self._maxes.append(entry)
+            return
+        position = min(bisect_left(self._maxes, entry), len(self._chunks) - 1)
+        chunk = self._chunks[position]
+        insort(chunk, entry)
+        self._maxes[position] = chunk[-1]
+        load = self._LOAD
+        if len(chunk) > 2 * load:
+            tail = chunk[load:]
+            del chunk[load:]
+            self._chunks.insert(position + 1, tail)
+            self._maxes[position] = chunk[-1]
+            self._maxes.insert(position + 1, tail[-1])
+
+    def remove(self, entry: Tuple[Any, int]) -> None:
+        """Removes an entry, if present."""
+        position = bisect_left(self._maxes, entry)
+        if position == len(self._chunks):
+            return
+        chunk = self._chunks[position]
+        index = bisect_left(chunk, entry)
+        if index == len(chunk) or chunk[index] != entry:
+            return
+        del chunk[index]
+        if chunk:
+            self._maxes[position] = chunk[-1]
+        else:
+            del self._chunks[position]
+            del self._maxes[position]
+
+    def range(
+        self,
+        low: Tuple[Any, ...],
+        high: Optional[Tuple[Any, ...]],
+        limit: Optional[int],
+        offset: int,
+    ) -> List[int]:
+        """
+        Returns the IDs of the entries in ``[low, high)`` in order, skipping
+        the first ``offset`` of them and returning at most ``limit``.
+        """
+        ids: List[int] = []
+        position = bisect_left(self._maxes, low)
+        first = True
+        while position < len(self._chunks):
+            if limit is not None and len(ids) >= limit:
+                break
+            chunk = self._chunks[position]
+            start = bisect_left(chunk, low) if first else 0
+            end = len(chunk)
+            if high is not None and not chunk[-1] < high:
+                end = max(start, bisect_left(chunk, high))
+            matches = end - start
+            if offset >= matches:
+                offset -= matches
+            else:
+                start += offset
+                offset = 0
+                if limit is not None:
+                    end = min(end, start + limit - len(ids))
+                ids.extend(book_id for _, book_id in chunk[start:end])
+            if end < len(chunk):
+                break
+            first = False
+            position += 1
+        return ids
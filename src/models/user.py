@@ -4,9 +4,10 @@ library.
 """
 
 from dataclasses import dataclass
+from typing import Any, Dict, Tuple
 
 
-@dataclass
+@dataclass(frozen=True)
 class LibraryUser:
     """
     A LibraryUser object represents a user of a library system and has the
@@ -16,8 +17,13 @@ class LibraryUser:
     :ivar name: the user's name
     :ivar email: the user's email
     :ivar password: the user's password
+
+    Instances are immutable and use ``__slots__`` instead of a per-instance
+    ``__dict__``.
     """
 
+    __slots__ = ("id", "name", "email", "password")
+
     id: int
     name: str
     email: str
@@ -43,3 +49,21 @@ class LibraryUser:
             email=str(user_dict["email"]),
             password=str(user_dict["password"]),
         )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Return the user as a dictionary, without the recursive copying done by
+        ``dataclasses.asdict``.
+        """
+        return {
+            "id": self.id,
+            "name": self.name,
+            "email": self.email,
+            "password": self.password,
+        }
+
+    def to_row(self) -> Tuple[int, str, str, str]:
+        """
+        Return the user as an ``(id, name, email, password)`` tuple.
+        """
+        return (self.id, self.name, self.email, self.password)
@@ -0,0 +1,175 @@
+"""
+Prebuilt serializers for the API representations of the models.
+
+Each serializer is a closure built once per representation over the keys of
+its fields: columns are read straight from the instance ``__dict__``
+instead of through the ORM's attribute descriptors, and timestamps are left as ``datetime`` objects for
+the app's JSON provider (see ``src.json_provider``) to encode in ISO 8601
+format, as ``to_dict`` does with ``isoformat()``. When a column is not
+loaded (expired after a commit, or deferred), the serializer falls back to
+reading attributes normally, which loads it.
+
+The output encodes to the same JSON as the models' ``to_dict``.
+
+Listings support sparse fieldsets: ``select_fields`` resolves the fields a
+client asks for, which the storage backends then read alone (see
+``src.storage.backend``), and ``fieldset_serializer`` builds the matching
+trimmed serializer.
+"""
+
+from functools import lru_cache
+from operator import attrgetter, methodcaller
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple, Union
+
+from src.exceptions import ValidationError
+from src.models import User
+
+Serializer = Callable[[Any], Dict[str, Any]]
+
+# A column read from the instance, or a key and the function of the instance
+# that computes it
+Field = Union[str, Tuple[str, Callable[[Any], Any]]]
+
+
+def make_serializer(fields: Sequence[Field]) -> Serializer:
+    """
+    Builds a function returning ``{key: value}`` for the given fields of an
+    instance, in that order.
+    """
+    # Columns only: no computed field to check for on every key
+    if all(isinstance(field, str) for field in fields):
+        keys = tuple(map(_key, fields))
+
+        def serialize_columns(obj: Any) -> Dict[str, Any]:
+            values = obj.__dict__
+            try:
+                return {key: values[key] for key in keys}
+            except KeyError:
+                return {key: getattr(obj, key) for key in keys}
+
+        return serialize_columns
+
+    readers = tuple(
+        (field, None) if isinstance(field, str) else field for field in fields
+    )
+
+    def serialize(obj: Any) -> Dict[str, Any]:
+        values = obj.__dict__
+        try:
+            return {
+                key: values[key] if compute is None else compute(obj)
+                for key, compute in readers
+            }
+        except KeyError:
+            return {
+                key: getattr(obj, key) if compute is None else compute(obj)
+                for key, compute in readers
+            }
+
+    return serialize
+
+
+def _key(field: Field) -> str:
+    """Returns the key a field has in the representation."""
+    return field if isinstance(field, str) else field[0]
+
+
+# The columns of the book and user representations, in order
+BOOK_FIELDS = (
+    "id",
+    "title",
+    "author",
+    "isbn",
+    "year",
+    "description",
+    "is_available",
+    "total_copies",
+    "available_copies",
+    "version",
+    "created_at",
+    "updated_at",
+)
+USER_FIELDS = (
+    "id",
+    "name",
+    "is_active",
+    "role",
+    "version",
+    "created_at",
+    "updated_at",
+)
+
+LOAN_FIELDS: Tuple[Field, ...] = (
+    "id",
+    "user_id",
+    "book_id",
+    ("user_name", attrgetter("user.name")),
+    ("book_title", attrgetter("book.title")),
+    "borrowed_at",
+    "due_date",
+    "returned_at",
+    "is_returned",
+    ("is_overdue", methodcaller("is_overdue")),
+    ("days_overdue", methodcaller("days_overdue")),
+    "created_at",
+    "updated_at",
+)
+
+# The fields book listings return unless asked for others: descriptions are
+# the bulk of a book, so only the book's own endpoint includes them
+BOOK_LIST_FIELDS = tuple(field for field in BOOK_FIELDS if field != "description")
+
+# Returns the API representation of a book
+serialize_book = make_serializer(BOOK_FIELDS)
+
+_serialize_user = make_serializer(USER_FIELDS)
+_serialize_user_with_email = make_serializer(USER_FIELDS + ("email",))
+
+# Returns the API representation of a loan
+serialize_loan = make_serializer(LOAN_FIELDS)
+
+_FIELDS: Dict[str, Sequence[Field]] = {
+    "book": BOOK_FIELDS,
+    "user": USER_FIELDS,
+    "loan": LOAN_FIELDS,
+}
+
+
+def serialize_user(user: User, include_email: bool = False) -> Dict[str, Any]:
+    """Returns the API representation of a user, optionally with the email."""
+    if include_email:
+        return _serialize_user_with_email(user)
+    return _serialize_user(user)
+
+
+def field_names(kind: str) -> Tuple[str, ...]:
+    """Returns the keys of the representation of a ``book``, ``user`` or ``loan``."""
+    return tuple(_key(field) for field in _FIELDS[kind])
+
+
+def select_fields(
+    kind: str, requested: Optional[str], default: Optional[Sequence[str]] = None
+) -> Tuple[str, ...]:
+    """
+    Returns the fields of a sparse fieldset: those named in the
+    comma-separated ``requested`` list, plus the ID, in representation
+    order. Without a list, returns ``default``, or all the fields.
+
+    Raises ValidationError for fields the representation does not have.
+    """
+    available = field_names(kind)
+    if not requested:
+        return tuple(default or available)
+
+    names = {name.strip() for name in requested.split(",")} - {""}
+    unknown = names.difference(available)
+    if unknown:
+        raise ValidationError(f"Unknown {kind} fields: {', '.join(sorted(unknown))}")
+    return tuple(name for name in available if name == "id" or name in names)
+
+
+@lru_cache(maxsize=256)
+def fieldset_serializer(kind: str, fields: Tuple[str, ...]) -> Serializer:
+    """Returns a serializer of only the given fields of a representation."""
+    chosen = [field for field in _FIELDS[kind] if _key(field) in fields]
+    return make_serializer(chosen)
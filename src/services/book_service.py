@@ -2,14 +2,47 @@
 Service layer for book management.
 """
 
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
-
-from sqlalchemy import or_
-
-from src.exceptions import ConflictError, NotFoundError, ValidationError
-from src.extensions import db
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from src.exceptions import (
+    ConflictError,
+    DuplicateError,
+    LimitExceededError,
+    NotFoundError,
+    PreconditionFailedError,
+    StaleVersionError,
+    ValidationError,
+)
 from src.models import Book, BookLoan, User
+from src.serializers import BOOK_LIST_FIELDS, select_fields
+from src.services.pagination import (
+    LOAN_COUNT_STRATEGIES,
+    check_count_strategy,
+    count_listing,
+    decode_cursor,
+    split_page,
+)
+from src.services.user_service import UserService
+from src.storage.backend import (
+    LOAN_STATUSES,
+    SEARCH_MODES,
+    CounterDrift,
+    LoanFilter,
+    Page,
+    get_backend,
+)
+from src.storage.counts import get_counts
+from src.storage.entity_cache import get_entity_cache
+from src.storage.generations import get_generations
+from src.storage.response_cache import get_response_cache
+from src.storage.suggestions import BookSuggestions, get_suggestions
+
+# The query arguments that bound the dates of a loan listing (see
+# ``BookService.loan_filter``)
+LOAN_DATE_FILTERS = ("borrowed_from", "borrowed_until", "due_from", "due_until")
 
 
 class BookService:
@@ -24,46 +57,76 @@ class BookService:
             if not data.get(field):
                 raise ValidationError(f"{field} is required")
 
+        backend = get_backend()
+
         # Check if book with same ISBN already exists
         if data.get("isbn"):
-            existing_book = Book.query.filter_by(isbn=data["isbn"]).first()
+            existing_book = backend.get_book_by_isbn(data["isbn"])
             if existing_book:
                 raise ConflictError("Book with this ISBN already exists")
 
-        book = Book.from_dict(data)
-        db.session.add(book)
-        db.session.commit()
+        try:
+            book = Book.from_dict(data)
+            backend.save(book)
+            generation = backend.bump_generation("books")
+            backend.commit()
+        except DuplicateError:
+            raise ConflictError("Book with this ISBN already exists")
+
+        get_suggestions().add(book.id, book.title, book.author)
+        get_counts().invalidate("books")
+        _catalog_changed(None, generation)
         return book
 
     @staticmethod
     def get_book_by_id(book_id: int) -> Optional[Book]:
-        """Get book by ID."""
-        book = Book.query.get(book_id)
-        if not isinstance(book, Book):
-            return None
-        return book
+        """Get book by ID, for reading only."""
+        backend = get_backend()
+        cache = get_entity_cache()
+        if cache is None:
+            return backend.get_book(book_id)
+        return cache.get(Book, book_id, lambda: backend.get_book(book_id))
 
     @staticmethod
     def get_all_books(
-        page: int = 1, per_page: int = 20, search: Optional[str] = None
+        page: int = 1,
+        per_page: int = 20,
+        search: Optional[str] = None,
+        mode: str = "substring",
+        count: str = "exact",
+        fields: Optional[str] = None,
     ) -> Dict[str, Any]:
-        """Get paginated list of all books with optional search."""
-        query = Book.query
-
-        if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                or_(
-                    Book.title.ilike(search_term),
-                    Book.author.ilike(search_term),
-                    Book.isbn.ilike(search_term),
-                )
+        """
+        Get paginated list of all books with optional search, with the
+        comma-separated ``fields`` only or without descriptions.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValidationError(f"mode must be one of: {', '.join(SEARCH_MODES)}")
+        check_count_strategy(count)
+        columns = select_fields("book", fields, BOOK_LIST_FIELDS)
+
+        backend = get_backend()
+        if search and mode == "fuzzy" and not backend.has_trigram_index():
+            # The in-process index finds every match, so the count is free
+            matches = _book_index().search_similar(search)
+            per_page = max(per_page, 1)
+            start = (max(page, 1) - 1) * per_page
+            end = start + per_page
+            book_ids = [book_id for book_id, _ in matches[start:end]]
+            pagination = Page(
+                backend.get_books(book_ids, columns), len(matches), page, per_page
             )
-
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        else:
+            search_key = (search, mode) if search else None
+            total = count_listing(
+                "books", count, search_key, lambda: backend.count_books(search, mode)
+            )
+            pagination = backend.list_books(page, per_page, search, mode, columns)
+            pagination.total = total
 
         return {
-            "books": [book.to_dict() for book in pagination.items],
+            "books": pagination.items,
+            "count": count,
             "total": pagination.total,
             "pages": pagination.pages,
             "current_page": page,
@@ -71,15 +134,70 @@ class BookService:
             "has_next": pagination.has_next,
             "has_prev": pagination.has_prev,
             "search": search,
+            "mode": mode,
+        }
+
+    @staticmethod
+    def get_books_version(
+        search: Optional[str] = None, mode: str = "substring"
+    ) -> Tuple[int, Optional[datetime]]:
+        """
+        Get the number of books a listing pages through and when the latest
+        of them changed, cached until the next write to books.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValidationError(f"mode must be one of: {', '.join(SEARCH_MODES)}")
+
+        backend = get_backend()
+        if search and mode == "fuzzy" and not backend.has_trigram_index():
+            # The in-process index may match any book, so version them all
+            search = None
+        key = (search, mode) if search else None
+        return get_counts().get(
+            "book_versions", key, lambda: backend.get_books_version(search, mode)
+        )
+
+    @staticmethod
+    def get_books_by_cursor(
+        cursor: str = "",
+        limit: int = 20,
+        search: Optional[str] = None,
+        mode: str = "substring",
+        fields: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Get the page of books after a cursor, with optional search."""
+        if search and mode != "substring":
+            raise ValidationError("Cursor pagination supports substring search only")
+
+        columns = select_fields("book", fields, BOOK_LIST_FIELDS)
+        after_id = decode_cursor("books", cursor)
+        rows = get_backend().list_books_after(after_id, limit + 1, search, columns)
+        books, next_cursor = split_page("books", rows, limit)
+
+        return {
+            "books": books,
+            "next_cursor": next_cursor,
+            "limit": limit,
+            "search": search,
+            "mode": mode,
         }
 
     @staticmethod
-    def update_book(book_id: int, data: Dict[str, Any]) -> Book:
-        """Update book information."""
-        book = BookService.get_book_by_id(book_id)
+    def update_book(
+        book_id: int, data: Dict[str, Any], version: Optional[int] = None
+    ) -> Book:
+        """
+        Update book information, only if the book is still at ``version``
+        when one is given.
+        """
+        backend = get_backend()
+        book = backend.get_book(book_id)
         if not book:
             raise NotFoundError("Book not found")
 
+        if version is not None and book.version != version:
+            raise PreconditionFailedError("Book was changed by another request")
+
         # Update allowed fields
         allowed_fields = [
             "title",
@@ -89,120 +207,302 @@ class BookService:
             "description",
             "total_copies",
         ]
-        for field in allowed_fields:
-            if field in data:
-                setattr(book, field, data[field])
+        changes = {field: data[field] for field in allowed_fields if field in data}
 
         # Update available copies if total copies changed
-        if "total_copies" in data:
-            borrowed_count = BookLoan.query.filter_by(
-                book_id=book_id, is_returned=False
-            ).count()
-            book.available_copies = max(0, book.total_copies - borrowed_count)
+        if "total_copies" in changes:
+            changes["available_copies"] = max(
+                0, changes["total_copies"] - book.active_loans
+            )
 
-        db.session.commit()
+        try:
+            backend.update(book, changes)
+            generation = backend.bump_generation("books")
+            backend.commit()
+        except DuplicateError:
+            raise ConflictError("Book with this ISBN already exists")
+        except StaleVersionError:
+            raise PreconditionFailedError("Book was changed by another request")
+
+        get_suggestions().add(book.id, book.title, book.author)
+        get_counts().invalidate("books")
+        _catalog_changed(book.id, generation)
         return book
 
     @staticmethod
     def delete_book(book_id: int) -> bool:
         """Delete book if no active loans exist."""
-        book = BookService.get_book_by_id(book_id)
+        backend = get_backend()
+        book = backend.get_book(book_id)
         if not book:
             raise NotFoundError("Book not found")
 
         # Check for active loans
-        active_loans = BookLoan.query.filter_by(
-            book_id=book_id, is_returned=False
-        ).count()
-
-        if active_loans > 0:
+        if book.active_loans > 0:
             raise ConflictError("Cannot delete book with active loans")
 
-        db.session.delete(book)
-        db.session.commit()
+        backend.delete(book)
+        generation = backend.bump_generation("books")
+        backend.commit()
+        get_suggestions().remove(book_id)
+        get_counts().invalidate("books")
+        _catalog_changed(book_id, generation)
         return True
 
     @staticmethod
-    def borrow_book(book_id: int, user_id: int, days: int = 14) -> BookLoan:
-        """Borrow a book."""
-        book = BookService.get_book_by_id(book_id)
-        if not book:
-            raise NotFoundError("Book not found")
+    def suggest_books(prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get typeahead suggestions for a title or author prefix."""
+        return _book_index().suggest(prefix, limit)
 
-        if book.available_copies <= 0:
-            raise ConflictError("Book is not available for borrowing")
-
-        user = User.query.get(user_id)
+    @staticmethod
+    def borrow_book(book_id: int, user_id: int, days: int = 14) -> BookLoan:
+        """
+        Borrow a book. The copy is taken and the loan recorded in one atomic
+        step of the backend (see ``StorageBackend.open_loan``), so
+        concurrent borrows never lend more copies than the book has, nor
+        more books to a user than ``MAX_ACTIVE_LOANS``.
+        """
+        backend = get_backend()
+
+        user = UserService.get_user_by_id(user_id)
         if not user or not user.is_active:
             raise NotFoundError("User not found or inactive")
 
-        # Check if user already has this book borrowed
-        existing_loan = BookLoan.query.filter_by(
-            book_id=book_id, user_id=user_id, is_returned=False
-        ).first()
-
-        if existing_loan:
-            raise ConflictError("User already has this book borrowed")
-
-        # Create loan
         loan = BookLoan(
             book_id=book_id,
             user_id=user_id,
             due_date=datetime.utcnow() + timedelta(days=days),
         )
+        max_active = current_app.config["MAX_ACTIVE_LOANS"] or None
+        try:
+            opened = backend.open_loan(loan, max_active)
+        except DuplicateError as err:
+            raise ConflictError("User already has this book borrowed") from err
+        except LimitExceededError as err:
+            raise ConflictError(
+                f"User already has {max_active} books borrowed, the most allowed"
+            ) from err
+        if not opened:
+            backend.rollback()
+            if not backend.get_book(book_id):
+                raise NotFoundError("Book not found")
+            raise ConflictError("Book is not available for borrowing")
 
-        # Update book availability
-        book.available_copies -= 1
-        book.is_available = book.available_copies > 0
-
-        db.session.add(loan)
-        db.session.commit()
-
-        if not isinstance(loan, BookLoan):
-            raise RuntimeError("Failed to create loan")
+        generation = backend.bump_generation("books")
+        backend.commit()
+        _catalog_changed(book_id, generation, user_id)
         return loan
 
+    @staticmethod
+    def get_loan_by_id(loan_id: int) -> Optional[BookLoan]:
+        """Get loan by ID."""
+        return get_backend().get_loan(loan_id)
+
     @staticmethod
     def return_book(loan_id: int) -> BookLoan:
-        """Return a borrowed book."""
-        loan = BookLoan.query.get(loan_id)
-        if not isinstance(loan, BookLoan):
+        """
+        Return a borrowed book. The loan is closed and the copy put back in
+        one atomic step of the backend (see ``StorageBackend.close_loan``),
+        so concurrent returns of a loan put back one copy.
+        """
+        backend = get_backend()
+
+        loan = backend.get_loan(loan_id)
+        if not loan:
             raise NotFoundError("Loan not found")
 
-        if loan.is_returned:
+        if loan.is_returned or not backend.close_loan(loan, datetime.utcnow()):
+            backend.rollback()
             raise ConflictError("Book already returned")
 
-        # Mark as returned
-        loan.is_returned = True
-        loan.returned_at = datetime.utcnow()
-
-        # Update book availability
-        book = loan.book
-        if hasattr(book, "available_copies") and hasattr(book, "is_available"):
-            book.available_copies += 1  # type: ignore[attr-defined]
-            book.is_available = True  # type: ignore[attr-defined]
-        db.session.commit()
+        generation = backend.bump_generation("books")
+        backend.commit()
+        _catalog_changed(loan.book_id, generation, loan.user_id)
         return loan
 
     @staticmethod
-    def get_user_loans(user_id: int, active_only: bool = False) -> List[BookLoan]:
-        """Get all loans for a user."""
-        query = BookLoan.query.filter_by(user_id=user_id)
+    def check_active_loans(repair: bool = False) -> List[CounterDrift]:
+        """
+        Find the books and users whose active loan counters drifted from
+        their unreturned loans, and fix them if ``repair`` is set.
+        """
+        backend = get_backend()
+        drifts = backend.check_active_loans(repair)
+        if not repair or not drifts:
+            backend.rollback()
+            return drifts
+
+        generation = backend.bump_generation("books")
+        backend.commit()
+        entity_cache = get_entity_cache()
+        if entity_cache is not None:
+            for drift in drifts:
+                entity_cache.evict(Book if drift.table == "books" else User, drift.id)
+        _catalog_changed(None, generation)
+        return drifts
 
-        if active_only:
-            query = query.filter_by(is_returned=False)
+    @staticmethod
+    def archive_loans(older_than: timedelta, batch_size: int = 1000) -> int:
+        """
+        Move the loans returned more than ``older_than`` ago out of the
+        current loans into the archive, ``batch_size`` loans per
+        transaction so borrows and returns never wait long on the move.
+        Listings show archived loans as before. Returns how many moved.
+        """
+        backend = get_backend()
+        returned_before = datetime.utcnow() - older_than
+        archived = 0
+        while True:
+            moved = backend.archive_loans(returned_before, batch_size)
+            backend.commit()
+            archived += moved
+            if moved < batch_size:
+                return archived
 
-        loans = query.all()
-        if not isinstance(loans, list):
-            return []
-        return loans
+    @staticmethod
+    def loan_filter(
+        user_id: Optional[int] = None,
+        status: str = "all",
+        borrowed_from: Optional[str] = None,
+        borrowed_until: Optional[str] = None,
+        due_from: Optional[str] = None,
+        due_until: Optional[str] = None,
+    ) -> LoanFilter:
+        """
+        Get the filter of a loan listing from a status (see ``LOAN_STATUSES``)
+        and ISO 8601 dates or datetimes bounding when loans were borrowed and
+        are due.
+        """
+        if status not in LOAN_STATUSES:
+            raise ValidationError(f"status must be one of: {', '.join(LOAN_STATUSES)}")
+        return LoanFilter(
+            user_id,
+            status,
+            _parse_date("borrowed_from", borrowed_from),
+            _parse_date("borrowed_until", borrowed_until),
+            _parse_date("due_from", due_from),
+            _parse_date("due_until", due_until),
+        )
 
     @staticmethod
-    def get_overdue_loans() -> List[BookLoan]:
-        """Get all overdue loans."""
-        loans = BookLoan.query.filter(
-            BookLoan.is_returned.is_(False), BookLoan.due_date < datetime.utcnow()
-        ).all()
-        if not isinstance(loans, list):
-            return []
-        return loans
+    def get_loans(
+        filters: LoanFilter,
+        page: int = 1,
+        per_page: int = 20,
+        count: str = "exact",
+        fields: Optional[str] = None,
+        listing: str = "loans",
+    ) -> Dict[str, Any]:
+        """
+        Get paginated list of the loans matching a filter, under the
+        ``listing`` key, with the comma-separated ``fields`` only. Loans
+        become overdue without writes, so totals are counted, not cached
+        or estimated: ``count`` is ``exact`` or ``none``.
+        """
+        check_count_strategy(count, LOAN_COUNT_STRATEGIES)
+        columns = select_fields("loan", fields)
+        backend = get_backend()
+        now = datetime.utcnow()
+        pagination = backend.list_loans(filters, now, page, per_page, columns)
+        if count != "none":
+            pagination.total = backend.count_loans(filters, now)
+
+        return {
+            listing: pagination.items,
+            "count": count,
+            "total": pagination.total,
+            "pages": pagination.pages,
+            "current_page": page,
+            "per_page": per_page,
+            "has_next": pagination.has_next,
+            "has_prev": pagination.has_prev,
+            "status": filters.status,
+        }
+
+    @staticmethod
+    def get_loans_version(
+        filters: LoanFilter,
+    ) -> Tuple[int, Optional[datetime], int, int]:
+        """
+        Get the number of the loans matching a filter, their latest change,
+        and how many of them are overdue and by how many days in total.
+        """
+        return get_backend().get_loans_version(filters, datetime.utcnow())
+
+    @staticmethod
+    def get_loans_by_cursor(
+        filters: LoanFilter,
+        cursor: str = "",
+        limit: int = 20,
+        fields: Optional[str] = None,
+        listing: str = "loans",
+    ) -> Dict[str, Any]:
+        """Get the page of the loans matching a filter after a cursor."""
+        columns = select_fields("loan", fields)
+        after_id = decode_cursor(listing, cursor)
+        rows = get_backend().list_loans_after(
+            filters, datetime.utcnow(), after_id, limit + 1, columns
+        )
+        loans, next_cursor = split_page(listing, rows, limit)
+
+        return {
+            listing: loans,
+            "next_cursor": next_cursor,
+            "limit": limit,
+            "status": filters.status,
+        }
+
+
+def _parse_date(name: str, value: Optional[str]) -> Optional[datetime]:
+    """Parses the ISO 8601 date or datetime of a filter, if any, as naive UTC."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValidationError(f"{name} must be an ISO 8601 date or datetime") from None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _book_index() -> BookSuggestions:
+    """
+    Returns the in-process title/author index, building it on first use and
+    refreshing it in the background once it is stale.
+    """
+    suggestions = get_suggestions()
+
+    if not suggestions.is_built:
+        suggestions.build(get_backend().list_book_titles())
+    elif suggestions.is_stale:
+        app = current_app._get_current_object()  # type: ignore[attr-defined]
+
+        def load() -> List[Tuple[int, str, str]]:
+            with app.app_context():
+                return get_backend().list_book_titles()
+
+        suggestions.refresh_in_background(load)
+
+    return suggestions
+
+
+def _catalog_changed(
+    book_id: Optional[int], generation: int, user_id: Optional[int] = None
+) -> None:
+    """
+    Stops serving the cached catalog responses and versions, and the cached
+    copy of the written book if any, after a write that committed
+    ``generation``. Borrows and returns also pass the user whose active
+    loan counter they changed, to evict it as well.
+    """
+    cache = get_response_cache()
+    if cache is not None:
+        cache.invalidate("books")
+    get_counts().invalidate("book_versions")
+    entity_cache = get_entity_cache()
+    if entity_cache is not None and book_id is not None:
+        entity_cache.evict(Book, book_id)
+    if entity_cache is not None and user_id is not None:
+        entity_cache.evict(User, user_id)
+    get_generations().note_write("books", generation)
@@ -0,0 +1,94 @@
+"""
+Pagination helpers: listing totals and opaque keyset cursors.
+
+Page-numbered listings report a total according to the ``count`` strategy
+the client asks for (see ``COUNT_STRATEGIES``).
+
+A cursor names the listing it belongs to and the ID of the last row of the
+page it follows. Listings are ordered by ID, so the next page is the rows
+with a greater ID: one indexed range scan, whatever the depth. Cursors are
+URL-safe base64 so clients treat them as opaque tokens.
+"""
+
+import base64
+import binascii
+import json
+from typing import Callable, Hashable, List, Optional, Tuple
+
+from src.exceptions import ValidationError
+from src.storage.backend import Row, get_backend
+from src.storage.counts import get_counts
+
+# How a page-numbered listing reports its total:
+# - exact: the number of matching rows, cached until a write invalidates it
+# - estimate: the database's row estimate for unfiltered listings; filtered
+#   listings are counted exactly
+# - none: no total; ``has_next`` is exact either way
+COUNT_STRATEGIES = ("exact", "estimate", "none")
+
+# Loan listings, whose totals are always counted: they offer no estimate
+LOAN_COUNT_STRATEGIES = ("exact", "none")
+
+
+def check_count_strategy(
+    count: str, strategies: Tuple[str, ...] = COUNT_STRATEGIES
+) -> None:
+    """Raises ValidationError for a count strategy not among ``strategies``."""
+    if count not in strategies:
+        raise ValidationError(f"count must be one of: {', '.join(strategies)}")
+
+
+def count_listing(
+    table: str, count: str, search_key: Optional[Hashable], load: Callable[[], int]
+) -> Optional[int]:
+    """
+    Returns the total of a listing of ``table`` under a count strategy.
+    ``search_key`` identifies the listing's filter (None if unfiltered) and
+    ``load`` counts its rows exactly.
+    """
+    check_count_strategy(count)
+    if count == "none":
+        return None
+    if count == "estimate" and search_key is None:
+        estimate = get_backend().estimate_count(table)
+        if estimate is not None:
+            return estimate
+    return get_counts().get(table, search_key, load)
+
+
+def encode_cursor(listing: str, after_id: int) -> str:
+    """Returns the cursor for the page after the row with the given ID."""
+    payload = json.dumps({"l": listing, "a": after_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(listing: str, cursor: str) -> Optional[int]:
+    """
+    Returns the ID the page after ``cursor`` starts after, or None for the
+    empty cursor, which asks for the first page.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        after_id = payload["a"]
+        matches = payload["l"] == listing and isinstance(after_id, int)
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        matches = False
+    if not matches:
+        raise ValidationError("Invalid cursor")
+    return int(after_id)
+
+
+def split_page(
+    listing: str, rows: List[Row], limit: int
+) -> Tuple[List[Row], Optional[str]]:
+    """
+    Splits rows fetched with one row more than ``limit`` into the page and
+    the cursor of the next page, or None if this is the last one.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(listing, page[-1]["id"])
@@ -7,11 +7,22 @@ from typing import Any, Dict, Optional
 
 from flask import current_app
 from flask_jwt_extended import create_access_token
-from sqlalchemy.exc import IntegrityError
 
-from src.exceptions import ConflictError, NotFoundError, ValidationError
-from src.extensions import db
+from src.exceptions import (
+    ConflictError,
+    DuplicateError,
+    NotFoundError,
+    PreconditionFailedError,
+    StaleVersionError,
+    ValidationError,
+)
 from src.models import User
+from src.serializers import select_fields
+from src.services.pagination import count_listing, decode_cursor, split_page
+from src.storage.backend import get_backend
+from src.storage.counts import get_counts
+from src.storage.entity_cache import get_entity_cache
+from src.storage.generations import get_generations
 
 
 class UserService:
@@ -30,34 +41,37 @@ class UserService:
         if "@" not in data["email"]:
             raise ValidationError("Invalid email format")
 
+        backend = get_backend()
+
         # Check if user already exists
-        if User.query.filter_by(email=data["email"]).first():
+        if backend.get_user_by_email(data["email"]):
             raise ConflictError("User with this email already exists")
 
         try:
             user = User.from_dict(data)
-            db.session.add(user)
-            db.session.commit()
-            return user
-        except IntegrityError:
-            db.session.rollback()
+            backend.save(user)
+            generation = backend.bump_generation("users")
+            backend.commit()
+        except DuplicateError:
             raise ConflictError("User with this email already exists")
 
+        get_counts().invalidate("users")
+        get_generations().note_write("users", generation)
+        return user
+
     @staticmethod
     def get_user_by_id(user_id: int) -> Optional[User]:
-        """Get user by ID."""
-        user = User.query.get(user_id)
-        if not isinstance(user, User):
-            return None
-        return user
+        """Get user by ID, for reading only."""
+        backend = get_backend()
+        cache = get_entity_cache()
+        if cache is None:
+            return backend.get_user(user_id)
+        return cache.get(User, user_id, lambda: backend.get_user(user_id))
 
     @staticmethod
     def get_user_by_email(email: str) -> Optional[User]:
         """Get user by email."""
-        user = User.query.filter_by(email=email).first()
-        if not isinstance(user, User):
-            return None
-        return user
+        return get_backend().get_user_by_email(email)
 
     @staticmethod
     def authenticate_user(email: str, password: str) -> Optional[User]:
@@ -81,12 +95,25 @@ class UserService:
         return token
 
     @staticmethod
-    def get_all_users(page: int = 1, per_page: int = 20) -> Dict[str, Any]:
-        """Get paginated list of all users."""
-        pagination = User.query.paginate(page=page, per_page=per_page, error_out=False)
+    def get_all_users(
+        page: int = 1,
+        per_page: int = 20,
+        count: str = "exact",
+        fields: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Get paginated list of all users, counted as requested, with the
+        comma-separated ``fields`` only.
+        """
+        columns = select_fields("user", fields)
+        backend = get_backend()
+        total = count_listing("users", count, None, backend.count_users)
+        pagination = backend.list_users(page, per_page, columns)
+        pagination.total = total
 
         return {
-            "users": [user.to_dict() for user in pagination.items],
+            "users": pagination.items,
+            "count": count,
             "total": pagination.total,
             "pages": pagination.pages,
             "current_page": page,
@@ -96,35 +123,78 @@ class UserService:
         }
 
     @staticmethod
-    def update_user(user_id: int, data: Dict[str, Any]) -> User:
-        """Update user information."""
-        user = UserService.get_user_by_id(user_id)
+    def get_users_by_cursor(
+        cursor: str = "", limit: int = 20, fields: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Get the page of users after a cursor."""
+        columns = select_fields("user", fields)
+        after_id = decode_cursor("users", cursor)
+        rows = get_backend().list_users_after(after_id, limit + 1, columns)
+        users, next_cursor = split_page("users", rows, limit)
+
+        return {
+            "users": users,
+            "next_cursor": next_cursor,
+            "limit": limit,
+        }
+
+    @staticmethod
+    def update_user(
+        user_id: int, data: Dict[str, Any], version: Optional[int] = None
+    ) -> User:
+        """
+        Update user information, only if the user is still at ``version``
+        when one is given.
+        """
+        backend = get_backend()
+        user = backend.get_user(user_id)
         if not user:
             raise NotFoundError("User not found")
 
+        if version is not None and user.version != version:
+            raise PreconditionFailedError("User was changed by another request")
+
         # Update allowed fields
         allowed_fields = ["name", "email", "role", "is_active"]
-        for field in allowed_fields:
-            if field in data:
-                setattr(user, field, data[field])
+        changes = {field: data[field] for field in allowed_fields if field in data}
 
         if "password" in data:
-            user.set_password(data["password"])
+            changes["password_hash"] = User.hash_password(data["password"])
 
         try:
-            db.session.commit()
-            return user
-        except IntegrityError:
-            db.session.rollback()
+            backend.update(user, changes)
+            generation = backend.bump_generation("users")
+            backend.commit()
+        except DuplicateError:
             raise ConflictError("Email already exists")
+        except StaleVersionError:
+            raise PreconditionFailedError("User was changed by another request")
+
+        _user_changed(user_id, generation)
+        return user
 
     @staticmethod
     def delete_user(user_id: int) -> bool:
         """Delete user (soft delete by setting is_active to False)."""
-        user = UserService.get_user_by_id(user_id)
+        backend = get_backend()
+        user = backend.get_user(user_id)
         if not user:
             raise NotFoundError("User not found")
 
         user.is_active = False
-        db.session.commit()
+        backend.save(user)
+        generation = backend.bump_generation("users")
+        backend.commit()
+        _user_changed(user_id, generation)
         return True
+
+
+def _user_changed(user_id: int, generation: int) -> None:
+    """
+    Drops the cached copy of a user after a write to it that committed
+    ``generation``.
+    """
+    cache = get_entity_cache()
+    if cache is not None:
+        cache.evict(User, user_id)
+    get_generations().note_write("users", generation)
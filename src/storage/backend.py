@@ -0,0 +1,357 @@
+"""
+Storage backend protocol used by the service layer.
+
+``BookService`` and ``UserService`` never query the database directly. They
+go through the ``StorageBackend`` configured for the app with
+``STORAGE_BACKEND``:
+
+- ``sqlalchemy`` (default): ``SqlAlchemyBackend``, which uses the
+  Flask-SQLAlchemy session and the configured database.
+- ``memory``: ``MemoryBackend``, which keeps all entities in indexed
+  in-process dictionaries, for database-less read nodes and tests.
+
+Both backends hand out the ``src.models`` entity classes, so the services
+and their callers work the same way with either. Listings are the
+exception: they return rows, the dictionaries ``src.serializers`` makes of
+entities, which the SQLAlchemy backend reads as plain column tuples without
+building entities at all. Listings take an optional sparse fieldset, the
+keys of the rows (see ``src.serializers.select_fields``), and only read
+those columns.
+"""
+
+import math
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Generic, List, Optional, Protocol, Tuple, TypeVar
+
+from flask import Flask, current_app
+
+from src.models import Book, BookLoan, User
+from src.storage import fulltext, fuzzy  # noqa: F401  (index DDL listeners)
+
+T = TypeVar("T")
+
+# A listed entity, as the dictionary its ``src.serializers`` serializer makes
+Row = Dict[str, Any]
+
+# The keys of listed rows, in representation order; None for all of them
+Fields = Optional[Tuple[str, ...]]
+
+# How ``list_books`` matches a search term:
+# - substring: title, author or ISBN contain the term (case-insensitive)
+# - fulltext: every word of the term appears in the title, author, ISBN or
+#   description; results are ranked by relevance
+# - fuzzy: the title or author words are similar to the term's words, so
+#   misspellings still match; results are ranked by similarity
+SEARCH_MODES = ("substring", "fulltext", "fuzzy")
+
+# Which loans a loan listing includes, by their state at the listing's time:
+# - all: every loan
+# - active: the loans not returned yet
+# - returned: the returned loans
+# - overdue: the loans not returned yet and past their due date
+LOAN_STATUSES = ("all", "active", "returned", "overdue")
+
+
+@dataclass(frozen=True)
+class LoanFilter:
+    """
+    The loans a loan listing includes: those of one user (of all users if
+    None) in a state (see ``LOAN_STATUSES``), borrowed and due in optional
+    ranges. Ranges include their start and exclude their end.
+    """
+
+    user_id: Optional[int] = None
+    status: str = "all"
+    borrowed_from: Optional[datetime] = None
+    borrowed_until: Optional[datetime] = None
+    due_from: Optional[datetime] = None
+    due_until: Optional[datetime] = None
+
+
+@dataclass(frozen=True)
+class CounterDrift:
+    """
+    A book or user (``table`` "books" or "users") whose ``active_loans``
+    counter differs from the number of its unreturned loans.
+    """
+
+    table: str
+    id: int
+    counter: int
+    loans: int
+
+
+@dataclass
+class Page(Generic[T]):
+    """
+    One page of a listing. ``total`` is None when the listing was not
+    counted; ``more`` then tells whether rows follow the page.
+    """
+
+    items: List[T]
+    total: Optional[int]
+    page: int
+    per_page: int
+    more: Optional[bool] = None
+
+    @property
+    def pages(self) -> Optional[int]:
+        """The total number of pages, if the listing was counted."""
+        if self.total is None:
+            return None
+        if self.total == 0 or self.per_page <= 0:
+            return 0
+        return math.ceil(self.total / self.per_page)
+
+    @property
+    def has_next(self) -> bool:
+        """Whether a page follows this one."""
+        if self.more is not None:
+            return self.more
+        return self.page < (self.pages or 0)
+
+    @property
+    def has_prev(self) -> bool:
+        """Whether a page precedes this one."""
+        return self.page > 1
+
+
+class StorageBackend(Protocol):
+    """
+    Data access needed by the service layer.
+
+    Changes made through ``save`` and ``delete`` become visible to other
+    requests once ``commit`` returns. ``save`` or ``commit`` raise
+    ``DuplicateError`` when a unique field (user email, book ISBN) is taken.
+
+    Borrows and returns go through ``open_loan`` and ``close_loan``, which
+    check and move a book's copies in the same atomic step, so concurrent
+    requests can never lend more copies than a book has. The same step
+    maintains the ``active_loans`` counters of the book and the user, which
+    answer "how many unreturned loans" without counting them;
+    ``check_active_loans`` finds and repairs counters that drifted from the
+    loans.
+
+    Books and users have a ``version`` that every ``save`` of a change
+    increments. ``commit`` raises ``StaleVersionError`` if another request
+    saved a new version of one of them after it was read.
+    """
+
+    # Unit of work
+    def save(self, entity: Any) -> None:
+        """Stores a new entity or the changes made to an existing one."""
+
+    def update(self, entity: Any, changes: Dict[str, Any]) -> None:
+        """
+        Sets the changed fields of a stored entity and saves it. Raises
+        ``DuplicateError``, from here or from ``commit``, if a changed
+        unique field is taken, and the entity and its indexes then keep
+        their stored values.
+        """
+
+    def delete(self, entity: Any) -> None:
+        """Removes an entity."""
+
+    def commit(self) -> None:
+        """Makes all saved changes permanent."""
+
+    def rollback(self) -> None:
+        """Discards changes that have not been committed yet."""
+
+    # Books
+    def get_book(self, book_id: int) -> Optional[Book]:
+        """Returns the book with the given ID, if any."""
+
+    def get_book_by_isbn(self, isbn: str) -> Optional[Book]:
+        """Returns the book with the given ISBN, if any."""
+
+    def list_books(
+        self,
+        page: int,
+        per_page: int,
+        search: Optional[str] = None,
+        mode: str = "substring",
+        fields: Fields = None,
+    ) -> Page[Row]:
+        """
+        Returns a page of book rows ordered by ID, optionally only those
+        matching ``search`` in the given mode (see ``SEARCH_MODES``).
+        Full-text and fuzzy results are ordered by relevance instead. Fuzzy
+        mode is only supported if ``has_trigram_index()``.
+
+        The page is not counted: its ``total`` is None and ``more`` tells
+        whether books follow it (see ``count_books``).
+        """
+
+    def count_books(self, search: Optional[str] = None, mode: str = "substring") -> int:
+        """Returns the number of books ``list_books`` pages through."""
+
+    def get_books_version(
+        self, search: Optional[str] = None, mode: str = "substring"
+    ) -> Tuple[int, Optional[datetime]]:
+        """
+        Returns the number of books ``list_books`` pages through and the
+        latest ``updated_at`` among them (None if there are none).
+        """
+
+    def list_books_after(
+        self,
+        after_id: Optional[int],
+        limit: int,
+        search: Optional[str] = None,
+        fields: Fields = None,
+    ) -> List[Row]:
+        """
+        Returns up to ``limit`` book rows with an ID above ``after_id`` (all
+        if None), ordered by ID, optionally only those whose title, author
+        or ISBN contain ``search``. Each call costs the same at any depth.
+        """
+
+    def get_books(self, book_ids: List[int], fields: Fields = None) -> List[Row]:
+        """Returns the rows of the existing books among the given IDs, in order."""
+
+    def has_trigram_index(self) -> bool:
+        """Whether ``list_books`` can run fuzzy searches itself."""
+
+    def list_book_titles(self) -> List[Tuple[int, str, str]]:
+        """Returns ``(id, title, author)`` for every book."""
+
+    def estimate_count(self, table: str) -> Optional[int]:
+        """
+        Returns the approximate number of rows of a table ("books" or
+        "users") from the database's statistics, without scanning it, or
+        None if the database keeps no such statistics.
+        """
+
+    # Users
+    def get_user(self, user_id: int) -> Optional[User]:
+        """Returns the user with the given ID, if any."""
+
+    def get_user_by_email(self, email: str) -> Optional[User]:
+        """Returns the user with the given email, if any."""
+
+    def list_users(self, page: int, per_page: int, fields: Fields = None) -> Page[Row]:
+        """Returns an uncounted page of user rows ordered by ID."""
+
+    def count_users(self) -> int:
+        """Returns the number of users."""
+
+    def list_users_after(
+        self, after_id: Optional[int], limit: int, fields: Fields = None
+    ) -> List[Row]:
+        """Returns up to ``limit`` user rows with an ID above ``after_id``."""
+
+    # Loans
+    def get_loan(self, loan_id: int) -> Optional[BookLoan]:
+        """Returns the loan with the given ID, if any and not archived."""
+
+    def open_loan(self, loan: BookLoan, max_active: Optional[int] = None) -> bool:
+        """
+        Takes an available copy of the new loan's book, counts the loan in
+        the book's and its user's ``active_loans`` and stores it, atomically,
+        as part of the current unit of work. Returns False, and stores
+        nothing, if the book has no copy left or does not exist. Raises
+        ``NotFoundError`` if the user does not exist, ``DuplicateError`` if
+        they already have an unreturned loan of the book, and
+        ``LimitExceededError`` if they already have ``max_active``
+        unreturned loans.
+        """
+
+    def close_loan(self, loan: BookLoan, returned_at: datetime) -> bool:
+        """
+        Marks an unreturned loan returned, puts its copy back on its book
+        and uncounts it from the book's and user's ``active_loans``,
+        atomically, as part of the current unit of work. Returns False, and
+        changes nothing, if the loan was already returned.
+        """
+
+    def check_active_loans(self, repair: bool = False) -> List[CounterDrift]:
+        """
+        Returns the books and users whose ``active_loans`` differs from
+        their number of unreturned loans, in ID order. With ``repair``, also
+        sets those counters, and the drifted books' available copies, from
+        the loans as part of the current unit of work.
+        """
+
+    def archive_loans(self, returned_before: datetime, limit: int) -> int:
+        """
+        Moves up to ``limit`` of the loans returned before
+        ``returned_before``, oldest first, out of the current loans into the
+        archive, as part of the current unit of work; returns how many it
+        moved. Archived loans keep their IDs and are still listed, but no
+        longer looked up by ``get_loan``.
+        """
+
+    def list_loans(
+        self,
+        filters: LoanFilter,
+        now: datetime,
+        page: int,
+        per_page: int,
+        fields: Fields = None,
+    ) -> Page[Row]:
+        """
+        Returns an uncounted page of the rows of the loans matching
+        ``filters`` at ``now``, archived or not, ordered by ID.
+        """
+
+    def count_loans(self, filters: LoanFilter, now: datetime) -> int:
+        """Returns the number of loans ``list_loans`` pages through."""
+
+    def list_loans_after(
+        self,
+        filters: LoanFilter,
+        now: datetime,
+        after_id: Optional[int],
+        limit: int,
+        fields: Fields = None,
+    ) -> List[Row]:
+        """
+        Returns up to ``limit`` rows of the loans matching ``filters`` at
+        ``now`` with an ID above ``after_id`` (all if None), ordered by ID.
+        """
+
+    def get_loans_version(
+        self, filters: LoanFilter, now: datetime
+    ) -> Tuple[int, Optional[datetime], int, int]:
+        """
+        Returns the number of loans ``list_loans`` pages through, the latest
+        ``updated_at`` among them and their books and users (None if there
+        are none), how many of them are overdue at ``now`` and their total
+        days overdue.
+        """
+
+    # Cache coherence
+    def get_generations(self) -> Dict[str, int]:
+        """Returns the current generation of every entity type."""
+
+    def bump_generation(self, name: str) -> int:
+        """
+        Atomically increments the generation of an entity type as part of
+        the current unit of work; returns the new value.
+        """
+
+
+def create_backend(name: str) -> StorageBackend:
+    """Creates the storage backend with the given name."""
+    if name == "sqlalchemy":
+        from src.storage.sqlalchemy_backend import SqlAlchemyBackend
+
+        return SqlAlchemyBackend()
+    if name == "memory":
+        from src.storage.memory_backend import MemoryBackend
+
+        return MemoryBackend()
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+def init_backend(app: Flask) -> None:
+    """Creates the storage backend configured for the app."""
+    app.extensions["storage_backend"] = create_backend(app.config["STORAGE_BACKEND"])
+
+
+def get_backend() -> StorageBackend:
+    """Returns the storage backend of the current app."""
+    backend: StorageBackend = current_app.extensions["storage_backend"]
+    return backend
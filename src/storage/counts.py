@@ -0,0 +1,88 @@
+"""
+Cached row counts for paginated listings.
+
+Counting every row that matches a listing is the most expensive part of a
+page request on a large table. ``CountCache`` keeps the exact counts of each
+worker's recent listings, keyed by table and filter, until they are older
+than ``COUNT_CACHE_SECONDS`` or a service write to the table invalidates
+them. Writes made by other workers show up once the entry expires.
+
+The same cache keeps the versions conditional GETs of the book listing
+derive their ETags from (table "book_versions"), which every write to books
+invalidates.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple, TypeVar
+
+from flask import Flask, current_app
+
+from src.storage.generations import validate_caches
+
+T = TypeVar("T")
+
+
+class CountCache:
+    """Least-recently-used cache of exact counts, per table and filter."""
+
+    def __init__(self, max_age: float = 60.0, max_entries: int = 1024) -> None:
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._counts: "OrderedDict[Tuple[str, Hashable], Tuple[Any, float]]" = (
+            OrderedDict()
+        )
+        # Bumped on invalidation, so counts loaded meanwhile are not stored
+        self._generations: Dict[str, int] = {}
+
+    def get(self, table: str, key: Hashable, load: Callable[[], T]) -> T:
+        """Returns the cached count of a filter, loading it if needed."""
+        entry_key = (table, key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counts.get(entry_key)
+            if entry is not None and now - entry[1] <= self.max_age:
+                self._counts.move_to_end(entry_key)
+                value: T = entry[0]
+                return value
+            generation = self._generations.get(table, 0)
+
+        count = load()
+
+        with self._lock:
+            if self._generations.get(table, 0) == generation:
+                self._counts[entry_key] = (count, now)
+                self._counts.move_to_end(entry_key)
+                while len(self._counts) > self.max_entries:
+                    self._counts.popitem(last=False)
+        return count
+
+    def invalidate(self, table: str) -> None:
+        """Drops every count of a table, after a write to it."""
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for entry_key in [key for key in self._counts if key[0] == table]:
+                del self._counts[entry_key]
+
+
+def init_counts(app: Flask) -> None:
+    """Creates the (empty) count cache of the app."""
+    counts = app.extensions["count_cache"] = CountCache(
+        max_age=app.config["COUNT_CACHE_SECONDS"]
+    )
+    generations = app.extensions["catalog_generations"]
+    for name, table in (
+        ("books", "books"),
+        ("books", "book_versions"),
+        ("users", "users"),
+    ):
+        generations.listen(name, lambda table=table: counts.invalidate(table))
+
+
+def get_counts() -> CountCache:
+    """Returns the count cache of the current app."""
+    validate_caches()
+    counts: CountCache = current_app.extensions["count_cache"]
+    return counts
@@ -0,0 +1,234 @@
+"""
+Read-through cache of books and users by ID.
+
+``EntityCache`` keeps the column values of recently read entities in two
+levels:
+
+- L1: a per-worker LRU of up to ``ENTITY_CACHE_SIZE`` entities, each kept
+  for ``ENTITY_CACHE_TTL_SECONDS``;
+- L2 (optional, ``ENTITY_CACHE_L2=redis``): a store shared by every worker,
+  whose entries live for ``ENTITY_CACHE_L2_TTL_SECONDS``.
+
+Hits return a new, detached instance built from the cached values, so they
+are for reading only: write paths load the entity from the storage backend
+and evict it from both levels once their change is committed. Keys carry a
+version derived from the model's columns, so entries written before a
+schema change are never read back.
+
+Credentials (``UNCACHED_COLUMNS``) are never cached, in either level, so a
+shared L2 holds no password hashes: cached users cannot check passwords,
+which authentication reads from the storage backend by email anyway.
+
+The cache is not used with the ``memory`` storage backend, which keeps
+entities in process already.
+"""
+
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple, Type, TypeVar
+
+from flask import Flask, current_app
+from sqlalchemy.orm.instrumentation import manager_of_class
+
+from src.models import Book, User
+from src.storage.generations import validate_caches
+from src.storage.response_cache import CacheStore, RedisCacheStore
+
+T = TypeVar("T")
+
+# Bump to invalidate every cached entity, e.g. when the encoding changes
+ENTITY_CACHE_VERSION = 2
+
+# Columns left out of the cached values, per model
+UNCACHED_COLUMNS: Dict[type, Tuple[str, ...]] = {User: ("password_hash",)}
+
+_key_prefixes: Dict[type, str] = {}
+
+
+class EntityCache:
+    """Two-level read-through cache of entities by ID."""
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl: float = 30.0,
+        l2: Optional[CacheStore] = None,
+        l2_ttl: float = 300.0,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.l2 = l2
+        self.l2_ttl = l2_ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._stats = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit, miss, eviction and invalidation counts so far."""
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+    def get(
+        self, model: Type[T], entity_id: int, load: Callable[[], Optional[T]]
+    ) -> Optional[T]:
+        """
+        Returns the entity with the given ID from the first level that has
+        it, or from ``load()``, whose result is then cached in both levels.
+        """
+        key = _key(model, entity_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self._stats["l1_hits"] += 1
+                return _build(model, entry[0])
+
+        if self.l2 is not None:
+            value = self.l2.get(key)
+            if value is not None:
+                values = _decode(model, value)
+                self._remember(key, values, now)
+                self._count("l2_hits")
+                return _build(model, values)
+
+        self._count("misses")
+        entity = load()
+        if entity is not None:
+            values = _values(model, entity)
+            self._remember(key, values, now)
+            if self.l2 is not None:
+                self.l2.set(key, _encode(values), self.l2_ttl)
+        return entity
+
+    def evict(self, model: Type[Any], entity_id: int) -> None:
+        """Drops an entity from both levels, after a write to it."""
+        key = _key(model, entity_id)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._stats["invalidations"] += 1
+        if self.l2 is not None:
+            self.l2.delete(key)
+
+    def clear(self, model: Type[Any]) -> None:
+        """
+        Drops every L1 entry of a model, after writes by other workers
+        (which evict their entities from L2 themselves).
+        """
+        prefix = _key_prefix(model) + ":"
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+            self._stats["invalidations"] += 1
+
+    def _remember(self, key: str, values: Dict[str, Any], now: float) -> None:
+        """Stores values in L1, evicting the least recently used entries."""
+        with self._lock:
+            self._entries[key] = (values, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+
+def _key(model: Type[Any], entity_id: int) -> str:
+    """Returns the versioned cache key of an entity."""
+    return f"{_key_prefix(model)}:{entity_id}"
+
+
+def _key_prefix(model: Type[Any]) -> str:
+    """Returns the key prefix of a model, versioned by its columns."""
+    prefix = _key_prefixes.get(model)
+    if prefix is None:
+        columns = ",".join(column.key for column in model.__table__.columns)
+        schema = zlib.crc32(columns.encode())
+        prefix = f"entity:{ENTITY_CACHE_VERSION}:{model.__tablename__}:{schema:x}"
+        _key_prefixes[model] = prefix
+    return prefix
+
+
+def _values(model: Type[Any], entity: Any) -> Dict[str, Any]:
+    """Returns the cached column values of an entity."""
+    uncached = UNCACHED_COLUMNS.get(model, ())
+    return {
+        column.key: getattr(entity, column.key)
+        for column in model.__table__.columns
+        if column.key not in uncached
+    }
+
+
+def _build(model: Type[T], values: Dict[str, Any]) -> T:
+    """
+    Returns a new transient instance with the given column values, set the
+    way the ORM loads rows rather than through the instrumented attributes.
+    """
+    entity: T = manager_of_class(model).new_instance()
+    entity.__dict__.update(values)
+    return entity
+
+
+def _encode(values: Dict[str, Any]) -> bytes:
+    """Encodes column values as JSON, datetimes in ISO format."""
+    return json.dumps(
+        {
+            name: value.isoformat() if isinstance(value, datetime) else value
+            for name, value in values.items()
+        }
+    ).encode()
+
+
+def _decode(model: Type[Any], value: bytes) -> Dict[str, Any]:
+    """Decodes column values encoded by ``_encode``."""
+    values: Dict[str, Any] = json.loads(value)
+    for column in model.__table__.columns:
+        raw = values.get(column.key)
+        if raw is not None and column.type.python_type is datetime:
+            values[column.key] = datetime.fromisoformat(raw)
+    return values
+
+
+def init_entity_cache(app: Flask) -> None:
+    """Creates the entity cache of the app, unless disabled."""
+    if (
+        app.config["STORAGE_BACKEND"] == "memory"
+        or app.config["ENTITY_CACHE_SIZE"] <= 0
+    ):
+        app.extensions["entity_cache"] = None
+        return
+
+    l2: Optional[CacheStore] = None
+    if app.config["ENTITY_CACHE_L2"] == "redis":
+        l2 = RedisCacheStore.from_url(app.config["ENTITY_CACHE_REDIS_URL"])
+    elif app.config["ENTITY_CACHE_L2"] != "none":
+        raise ValueError(f"Unknown entity cache L2: {app.config['ENTITY_CACHE_L2']}")
+
+    cache = app.extensions["entity_cache"] = EntityCache(
+        max_entries=app.config["ENTITY_CACHE_SIZE"],
+        ttl=app.config["ENTITY_CACHE_TTL_SECONDS"],
+        l2=l2,
+        l2_ttl=app.config["ENTITY_CACHE_L2_TTL_SECONDS"],
+    )
+    generations = app.extensions["catalog_generations"]
+    generations.listen("books", lambda: cache.clear(Book))
+    generations.listen("users", lambda: cache.clear(User))
+
+
+def get_entity_cache() -> Optional[EntityCache]:
+    """Returns the entity cache of the current app, None if disabled."""
+    validate_caches()
+    cache: Optional[EntityCache] = current_app.extensions.get("entity_cache")
+    return cache
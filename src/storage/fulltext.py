@@ -0,0 +1,157 @@
+"""
+Full-text search index for the books table.
+
+The index is kept by the database itself, so every writer keeps it in sync:
+
+- SQLite: an external-content FTS5 table, ``books_fts``, maintained by
+  insert/update/delete triggers on ``books`` and ranked with BM25.
+- PostgreSQL: a generated ``search_vector`` tsvector column with a GIN index,
+  ranked with ``ts_rank``.
+
+Title matches rank above author, ISBN and description matches. Other dialects
+have no full-text index; searches there fall back to substring matching.
+
+The index is installed by ``db.create_all()`` (through an ``after_create``
+listener on the books table) and by the migration that introduced it.
+"""
+
+import re
+import unicodedata
+from typing import Any, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection
+
+from src.models import Book
+
+FTS_TABLE = "books_fts"
+
+# Relative weights of title, author, ISBN and description matches
+FIELD_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+_WORD = re.compile(r"\w+")
+
+_FIELDS = "title, author, isbn, description"
+_NEW_FIELDS = "new.title, new.author, new.isbn, new.description"
+_OLD_FIELDS = "old.title, old.author, old.isbn, old.description"
+
+_SQLITE_INSTALL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{_FIELDS}, content='books', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) "
+    f"VALUES ('rank', 'bm25({', '.join(map(str, FIELD_WEIGHTS))})')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON books BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_FIELDS}) VALUES (new.id, {_NEW_FIELDS}); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON books BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_FIELDS}) "
+    f"VALUES ('delete', old.id, {_OLD_FIELDS}); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update "
+    f"AFTER UPDATE OF {_FIELDS} ON books BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_FIELDS}) "
+    f"VALUES ('delete', old.id, {_OLD_FIELDS}); "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_FIELDS}) VALUES (new.id, {_NEW_FIELDS}); "
+    "END",
+]
+
+_SQLITE_UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+_POSTGRES_INSTALL = [
+    "ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(author, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(isbn, '')), 'C') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'D')"
+    ") STORED",
+    "CREATE INDEX IF NOT EXISTS ix_books_search_vector "
+    "ON books USING GIN (search_vector)",
+]
+
+_POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS ix_books_search_vector",
+    "ALTER TABLE books DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def is_supported(dialect_name: str) -> bool:
+    """Whether the database dialect has a full-text index for books."""
+    return dialect_name in ("sqlite", "postgresql")
+
+
+def install(connection: Connection) -> None:
+    """Creates the full-text index and backfills it from existing rows."""
+    dialect_name = connection.dialect.name
+    if dialect_name == "sqlite":
+        for statement in _SQLITE_INSTALL:
+            connection.execute(text(statement))
+        rebuild(connection)
+    elif dialect_name == "postgresql":
+        # The generated column is computed for existing rows when it is added
+        for statement in _POSTGRES_INSTALL:
+            connection.execute(text(statement))
+
+
+def uninstall(connection: Connection) -> None:
+    """Drops the full-text index."""
+    dialect_name = connection.dialect.name
+    if dialect_name == "sqlite":
+        statements = _SQLITE_UNINSTALL
+    elif dialect_name == "postgresql":
+        statements = _POSTGRES_UNINSTALL
+    else:
+        return
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def rebuild(connection: Connection) -> None:
+    """Re-indexes every book, e.g. after rows were written with triggers off."""
+    if connection.dialect.name == "sqlite":
+        connection.execute(
+            text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        )
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """
+    Splits text into lowercase words without diacritics, the way the SQLite
+    index does.
+    """
+    if not value:
+        return []
+    folded = value.casefold()
+    if not folded.isascii():
+        decomposed = unicodedata.normalize("NFKD", folded)
+        folded = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _WORD.findall(folded)
+
+
+def match_expression(search: str) -> Optional[str]:
+    """
+    Returns an FTS5 query that matches rows containing every word of the
+    search, or None if the search has no words.
+    """
+    words = tokenize(search)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words)
+
+
+def _install_after_create(target: Any, connection: Connection, **kwargs: Any) -> None:
+    install(connection)
+
+
+def _uninstall_before_drop(target: Any, connection: Connection, **kwargs: Any) -> None:
+    uninstall(connection)
+
+
+event.listen(Book.__table__, "after_create", _install_after_create)
+event.listen(Book.__table__, "before_drop", _uninstall_before_drop)
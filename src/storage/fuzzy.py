@@ -0,0 +1,178 @@
+"""
+Typo-tolerant book search with trigram similarity.
+
+Words are compared by their trigrams the way PostgreSQL's ``pg_trgm`` does:
+each word is padded with two leading spaces and one trailing space, and the
+similarity of two words is the number of trigrams they share divided by the
+number of distinct trigrams in either. "tolkein" and "tolkien" share 4 of 12
+trigrams, a similarity of 0.33, above the default threshold of 0.3.
+
+On PostgreSQL the search runs in the database, on GIN trigram indexes over
+title and author (``install`` creates them, if the ``pg_trgm`` extension is
+available). Everywhere else ``TrigramIndex`` answers it in process.
+"""
+
+from typing import Any, Dict, List, Set, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+from src.models import Book
+from src.storage.fulltext import tokenize
+
+# Minimum similarity for a word, and for a book, to match
+SIMILARITY_THRESHOLD = 0.3
+
+_POSTGRES_INSTALL = [
+    "CREATE INDEX IF NOT EXISTS ix_books_title_trgm "
+    "ON books USING GIN (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_books_author_trgm "
+    "ON books USING GIN (author gin_trgm_ops)",
+]
+
+_POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS ix_books_author_trgm",
+    "DROP INDEX IF EXISTS ix_books_title_trgm",
+]
+
+
+def trigrams(word: str) -> Set[str]:
+    """Returns the trigrams of a normalized word, padded like pg_trgm."""
+    padded = f"  {word} "
+    return {a + b + c for a, b, c in zip(padded, padded[1:], padded[2:])}
+
+
+class TrigramIndex:
+    """
+    Inverted index from trigrams to the distinct words of book titles and
+    authors, and from words to the books containing them. Searching scores
+    only the vocabulary, which stays small as the catalog grows, and then
+    fans out to the books of the matching words.
+
+    Not thread-safe; callers serialize access.
+    """
+
+    def __init__(self) -> None:
+        self._word_books: Dict[str, Set[int]] = {}
+        self._word_trigram_counts: Dict[str, int] = {}
+        self._trigram_words: Dict[str, Set[str]] = {}
+        self._book_words: Dict[int, Set[str]] = {}
+
+    def add(self, book_id: int, *values: str) -> None:
+        """Indexes the words of a book's values, replacing earlier ones."""
+        self.remove(book_id)
+        words = {word for value in values for word in tokenize(value)}
+        self._book_words[book_id] = words
+        for word in words:
+            books = self._word_books.get(word)
+            if books is None:
+                books = self._word_books[word] = set()
+                word_trigrams = trigrams(word)
+                self._word_trigram_counts[word] = len(word_trigrams)
+                for trigram in word_trigrams:
+                    self._trigram_words.setdefault(trigram, set()).add(word)
+            books.add(book_id)
+
+    def remove(self, book_id: int) -> None:
+        """Removes a book's words, if it is indexed."""
+        for word in self._book_words.pop(book_id, ()):
+            books = self._word_books[word]
+            books.discard(book_id)
+            if books:
+                continue
+            del self._word_books[word]
+            del self._word_trigram_counts[word]
+            for trigram in trigrams(word):
+                words = self._trigram_words[trigram]
+                words.discard(word)
+                if not words:
+                    del self._trigram_words[trigram]
+
+    def search(
+        self, query: str, threshold: float = SIMILARITY_THRESHOLD
+    ) -> List[Tuple[int, float]]:
+        """
+        Returns ``(book_id, score)`` for the books similar to the query, best
+        first. A book scores the mean, over the query's words, of the best
+        similarity of that word to any word of the book.
+        """
+        query_words = set(tokenize(query))
+        if not query_words:
+            return []
+
+        totals: Dict[int, float] = {}
+        for query_word in query_words:
+            query_trigrams = trigrams(query_word)
+            shared: Dict[str, int] = {}
+            for trigram in query_trigrams:
+                for word in self._trigram_words.get(trigram, ()):
+                    shared[word] = shared.get(word, 0) + 1
+
+            best: Dict[int, float] = {}
+            for word, count in shared.items():
+                union = len(query_trigrams) + self._word_trigram_counts[word] - count
+                similarity = count / union
+                if similarity < threshold:
+                    continue
+                for book_id in self._word_books[word]:
+                    if similarity > best.get(book_id, 0.0):
+                        best[book_id] = similarity
+            for book_id, similarity in best.items():
+                totals[book_id] = totals.get(book_id, 0.0) + similarity
+
+        word_count = len(query_words)
+        results = [
+            (book_id, total / word_count)
+            for book_id, total in totals.items()
+            if total / word_count >= threshold
+        ]
+        results.sort(key=lambda result: (-result[1], result[0]))
+        return results
+
+
+def install(connection: Connection) -> None:
+    """
+    Creates the pg_trgm extension and the trigram indexes on PostgreSQL.
+    Skipped, leaving fuzzy search in process, if the extension cannot be
+    created (e.g. for lack of privileges).
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except DBAPIError:
+        return
+    for statement in _POSTGRES_INSTALL:
+        connection.execute(text(statement))
+
+
+def uninstall(connection: Connection) -> None:
+    """Drops the trigram indexes; the extension is left in place."""
+    if connection.dialect.name != "postgresql":
+        return
+    for statement in _POSTGRES_UNINSTALL:
+        connection.execute(text(statement))
+
+
+def has_trigram_index(connection: Connection) -> bool:
+    """Whether the database can run fuzzy searches itself."""
+    if connection.dialect.name != "postgresql":
+        return False
+    found = connection.execute(
+        text("SELECT 1 FROM pg_indexes WHERE indexname = 'ix_books_title_trgm'")
+    ).first()
+    return found is not None
+
+
+def _install_after_create(target: Any, connection: Connection, **kwargs: Any) -> None:
+    install(connection)
+
+
+def _uninstall_before_drop(target: Any, connection: Connection, **kwargs: Any) -> None:
+    uninstall(connection)
+
+
+event.listen(Book.__table__, "after_create", _install_after_create)
+event.listen(Book.__table__, "before_drop", _uninstall_before_drop)
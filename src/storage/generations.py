@@ -0,0 +1,90 @@
+"""
+Cross-worker coherence of in-process caches.
+
+Every write to books or users bumps that type's generation, a counter in
+the ``catalog_generations`` table, in the same transaction as the write.
+Each worker remembers the generations its caches reflect. The first time a
+request uses a cache, ``validate_caches`` reads all generations in one
+query. For each type whose generation moved, it runs the invalidation
+callbacks the caches registered with ``CatalogGenerations.listen``.
+
+A worker's own writes invalidate its caches directly. ``note_write`` then
+records the generation the write committed, so the worker does not
+invalidate its caches a second time. That only happens when no other
+worker wrote to the same type in the meantime.
+"""
+
+import threading
+from typing import Callable, Dict, List
+
+from flask import Flask, current_app, g
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.storage.backend import get_backend
+
+
+class CatalogGenerations:
+    """The generations a worker's caches reflect, and their invalidations."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._seen: Dict[str, int] = {}
+        self._listeners: Dict[str, List[Callable[[], None]]] = {}
+
+    def listen(self, name: str, invalidate: Callable[[], None]) -> None:
+        """Registers a callback that drops cached entities of a type."""
+        self._listeners.setdefault(name, []).append(invalidate)
+
+    def update(self, current: Dict[str, int]) -> List[str]:
+        """
+        Records the current generations and runs the callbacks of the types
+        whose generation changed since the last update; returns those types.
+        """
+        with self._lock:
+            changed = [
+                name
+                for name, value in current.items()
+                if name in self._seen and self._seen[name] != value
+            ]
+            self._seen.update(current)
+        for name in changed:
+            for invalidate in self._listeners.get(name, ()):
+                invalidate()
+        return changed
+
+    def note_write(self, name: str, generation: int) -> None:
+        """Records the generation committed by a write of this worker."""
+        with self._lock:
+            if self._seen.get(name) == generation - 1:
+                self._seen[name] = generation
+
+
+def init_generations(app: Flask) -> None:
+    """Creates the generation tracker of the app."""
+    app.extensions["catalog_generations"] = CatalogGenerations()
+
+
+def get_generations() -> CatalogGenerations:
+    """Returns the generation tracker of the current app."""
+    generations: CatalogGenerations = current_app.extensions["catalog_generations"]
+    return generations
+
+
+def validate_caches() -> None:
+    """
+    Drops cached entities written by other workers, reading the
+    generations at most once per request (or app context).
+    """
+    if g.get("caches_validated"):
+        return
+    g.caches_validated = True
+
+    backend = get_backend()
+    try:
+        current = backend.get_generations()
+    except SQLAlchemyError as err:
+        # No generations table yet (database not migrated): rely on TTLs
+        backend.rollback()
+        current_app.logger.debug("Cache generations unavailable: %s", err)
+        return
+    get_generations().update(current)
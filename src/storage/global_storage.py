@@ -6,6 +6,15 @@ library storage, check if a user with a given username exists in the storage,
 retrieve the password for a user, and retrieve a list of dictionaries
 representing all the users and books in the storage.
 
+All functions are safe to call from concurrent request threads. New records
+get IDs from a monotonic allocator, so IDs are never reused after a delete.
+
+By default the storage lives only in memory. Call ``enable_persistence`` with
+a directory to restore it from, and journal it to, a write-ahead log and
+snapshots on disk (see ``src.storage.persistence``). Each process has its own
+storage: with several workers, each one persists to its own slot of the
+directory and sees only its own data.
+
 Example usage:
 
     add_user_to_library({"name": "Alice", "email": "alice@example.com",
@@ -18,81 +27,143 @@ Example usage:
 
     all_users = read_all_users()
     all_books = read_all_books()
+    tolkien_books = read_books_by_author("J.R.R. Tolkien", limit=10)
 """
 
-from dataclasses import asdict
-from typing import Dict, List, Optional
+import os
+from itertools import count
+from typing import Any, Dict, List, Optional
 
 from src.models.book import Book
 from src.models.library import Library
 from src.models.user import LibraryUser
+from src.storage.persistence import DirectoryLockedError, StoragePersistence
 
 GLOBAL_STORAGE: Library = Library()
+_PERSISTENCE: Optional[StoragePersistence] = None
 
 
 def add_user_to_library(user_dict: Dict[str, str]) -> None:
     """Adds a new user to the global library storage."""
-    user_dict["id"] = str(len(GLOBAL_STORAGE.users))  # Ensure id is str
+    storage = GLOBAL_STORAGE
+    user_dict["id"] = str(storage.allocate_user_id())  # Ensure id is str
 
     user = LibraryUser.from_dict(user_dict)
-    GLOBAL_STORAGE.create_user(user)
+    storage.create_user(user)
 
 
 def add_book_to_library(book_dict: Dict[str, str]) -> None:
     """Adds a new book to the global library storage."""
-    book_dict["id"] = str(len(GLOBAL_STORAGE.books))  # Ensure id is str
+    storage = GLOBAL_STORAGE
+    book_dict["id"] = str(storage.allocate_book_id())  # Ensure id is str
     book = Book.from_dict(book_dict)
-    GLOBAL_STORAGE.create_book(book)
+    storage.create_book(book)
 
 
 def user_exists(username: str) -> bool:
     """Checks if a user with the given username exists in the global library
     storage."""
-    for user in GLOBAL_STORAGE.users:
-        if user.name == username:
-            return True
-    return False
+    return GLOBAL_STORAGE.find_user_by_name(username) is not None
 
 
 def retrieve_password(username: str) -> Optional[str]:
     """Retrieves the password for the user with the given username, if it
     exists."""
-    for user in GLOBAL_STORAGE.users:
-        if user.name == username:
-            return user.password
-    return None
+    user = GLOBAL_STORAGE.find_user_by_name(username)
+    if user is None:
+        return None
+    return user.password
 
 
-def read_all_users() -> List[Dict[str, str]]:
+def read_all_users() -> List[Dict[str, Any]]:
     """Returns a list of dictionaries representing all the users in the global
     library storage."""
-    return [asdict(user) for user in GLOBAL_STORAGE.users]
+    return GLOBAL_STORAGE.user_dicts()
 
 
-def read_all_books() -> List[Dict[str, str]]:
+def read_all_books() -> List[Dict[str, Any]]:
     """Returns a list of dictionaries representing all the books in the global
     library storage."""
-    return [asdict(book) for book in GLOBAL_STORAGE.books]
+    return GLOBAL_STORAGE.book_dicts()
+
+
+def read_books_by_author(
+    author: str, limit: Optional[int] = None, offset: int = 0
+) -> List[Dict[str, Any]]:
+    """Returns a page of dictionaries representing the books by the given
+    author, ordered by ID."""
+    books = GLOBAL_STORAGE.find_books_by_author(author, limit, offset)
+    return [book.to_dict() for book in books]
+
+
+def read_books_by_title_prefix(
+    prefix: str, limit: Optional[int] = None, offset: int = 0
+) -> List[Dict[str, Any]]:
+    """Returns a page of dictionaries representing the books whose title
+    starts with the given prefix, ordered by title."""
+    books = GLOBAL_STORAGE.find_books_by_title_prefix(prefix, limit, offset)
+    return [book.to_dict() for book in books]
+
+
+def read_books_by_year_range(
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    """Returns a page of dictionaries representing the books published
+    between the given years (inclusive), ordered by year."""
+    books = GLOBAL_STORAGE.find_books_by_year_range(start, end, limit, offset)
+    return [book.to_dict() for book in books]
 
 
 def read_book(book_id: int) -> Optional[Book]:
     """Retrieves the book with the given ID, if it exists."""
-    for book in GLOBAL_STORAGE.books:
-        if book.id == book_id:
-            return book
-    return None
+    return GLOBAL_STORAGE.get_book(book_id)
 
 
 def delete_book(book_id: int) -> bool:
     """Deletes the book with the given ID, if it exists."""
-    for i, book in enumerate(GLOBAL_STORAGE.books):
-        if book.id == book_id:
-            del GLOBAL_STORAGE.books[i]
-            return True
-    return False
+    try:
+        GLOBAL_STORAGE.delete_book(book_id)
+    except ValueError:
+        return False
+    return True
+
+
+def enable_persistence(directory: str, snapshot_every: int = 100_000) -> None:
+    """Restores the global storage from the given directory and persists all
+    further changes to it.
+
+    A directory is owned by one process at a time, so the first process uses
+    the directory itself and each further one, e.g. another gunicorn worker,
+    the first free ``worker-<n>`` subdirectory. A restarted worker takes over
+    the slot, and the data, a stopped one left free."""
+    global GLOBAL_STORAGE, _PERSISTENCE
+    disable_persistence()
+    for slot in count():
+        path = directory if slot == 0 else os.path.join(directory, f"worker-{slot}")
+        persistence = StoragePersistence(path, snapshot_every=snapshot_every)
+        try:
+            GLOBAL_STORAGE = persistence.open()
+        except DirectoryLockedError:
+            continue
+        _PERSISTENCE = persistence
+        return
+
+
+def disable_persistence() -> None:
+    """Stops persisting the global storage, keeping its in-memory content."""
+    global _PERSISTENCE
+    if _PERSISTENCE is not None:
+        _PERSISTENCE.close()
+        _PERSISTENCE = None
 
 
 def reset_global_storage() -> None:
-    """Resets the storage."""
+    """Resets the storage. If persistence is enabled, the persisted data is
+    discarded as well."""
     global GLOBAL_STORAGE
     GLOBAL_STORAGE = Library()
+    if _PERSISTENCE is not None:
+        _PERSISTENCE.reset(GLOBAL_STORAGE)
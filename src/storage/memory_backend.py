@@ -0,0 +1,632 @@
+"""
+In-process storage backend.
+
+Keeps books, users and loans as transient model instances in its own
+insertion-ordered dictionaries keyed by ID, with hash indexes on the fields
+the services look up by (ISBN, email, active loans), all guarded by one
+lock. Full-text searches use an inverted index from words to weighted book
+matches, and keyset listings the legacy storage's ``SortedIndex`` (from
+``src.models.library``) of IDs, the only structure the two share. It needs
+no database, which makes it suitable for read-only edge nodes and for
+tests.
+
+Listings return the rows the serializers of ``src.serializers`` build from
+the stored instances, like the SQLAlchemy backend returns them from its
+selects. Changes are applied when ``save``/``delete`` is called;
+``rollback`` cannot undo them. Data lives as long as the process. Saves increment the version
+of books and users, but since requests share the stored instances, commits
+never find a version stale.
+"""
+
+import threading
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from src.exceptions import DuplicateError, LimitExceededError, NotFoundError
+from src.models import Book, BookLoan, User
+from src.models.library import SortedIndex
+from src.serializers import (
+    Serializer,
+    fieldset_serializer,
+    serialize_book,
+    serialize_loan,
+    serialize_user,
+)
+from src.storage import fulltext
+from src.storage.backend import CounterDrift, Fields, LoanFilter, Page, Row
+
+T = TypeVar("T")
+
+
+class MemoryBackend:
+    """Storage backend that keeps all entities in process memory."""
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._books: Dict[int, Book] = {}
+        self._users: Dict[int, User] = {}
+        self._loans: Dict[int, BookLoan] = {}
+        self._archived_loans: Dict[int, BookLoan] = {}
+        self._next_ids: Dict[type, int] = {Book: 1, User: 1, BookLoan: 1}
+        self._book_order = SortedIndex()
+        self._user_order = SortedIndex()
+        self._generations: Dict[str, int] = {}
+
+        # Secondary indexes, plus the value each entity is indexed under
+        self._books_by_isbn: Dict[str, int] = {}
+        self._book_isbns: Dict[int, str] = {}
+        self._users_by_email: Dict[str, int] = {}
+        self._user_emails: Dict[int, str] = {}
+        self._loans_by_user: Dict[int, Dict[int, BookLoan]] = {}
+        self._active_loans: Dict[Tuple[int, int], BookLoan] = {}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._book_words: Dict[int, Dict[str, float]] = {}
+
+    # Unit of work
+    def save(self, entity: Any) -> None:
+        """Stores a new entity or re-indexes a changed one."""
+        with self._lock:
+            table = self._table(entity)
+            now = datetime.utcnow()
+            if entity.id is None or entity.id not in table:
+                self._check_unique(entity)
+                _apply_column_defaults(entity)
+                if entity.id is None:
+                    entity.id = self._next_ids[type(entity)]
+                self._next_ids[type(entity)] = max(
+                    self._next_ids[type(entity)], entity.id + 1
+                )
+                entity.created_at = now
+                table[entity.id] = entity
+                if isinstance(entity, Book):
+                    self._book_order.add((entity.id, entity.id))
+                elif isinstance(entity, User):
+                    self._user_order.add((entity.id, entity.id))
+            else:
+                self._check_unique(entity)
+            _bump_version(entity)
+            entity.updated_at = now
+            self._index(entity)
+
+    def update(self, entity: Any, changes: Dict[str, Any]) -> None:
+        """
+        Checks the changed unique fields before setting any field, under the
+        lock: stored instances are shared and ``rollback`` cannot undo a
+        change, so a rejected update must not touch the entity.
+        """
+        with self._lock:
+            self._check_unique(entity, changes)
+            for name, value in changes.items():
+                setattr(entity, name, value)
+            self.save(entity)
+
+    def delete(self, entity: Any) -> None:
+        """Removes an entity and its index entries."""
+        with self._lock:
+            if self._table(entity).pop(entity.id, None) is None:
+                return
+            if isinstance(entity, Book):
+                self._books_by_isbn.pop(self._book_isbns.pop(entity.id, ""), None)
+                self._unindex_words(entity.id)
+                self._book_order.remove((entity.id, entity.id))
+            elif isinstance(entity, User):
+                self._users_by_email.pop(self._user_emails.pop(entity.id, ""), None)
+                self._user_order.remove((entity.id, entity.id))
+            elif isinstance(entity, BookLoan):
+                self._loans_by_user.get(entity.user_id, {}).pop(entity.id, None)
+                self._unindex_active_loan(entity)
+
+    def commit(self) -> None:
+        """Nothing to do: changes are applied as soon as they are saved."""
+
+    def rollback(self) -> None:
+        """Nothing to do: saved changes cannot be undone."""
+
+    # Books
+    def get_book(self, book_id: int) -> Optional[Book]:
+        """Returns the book with the given ID, if any."""
+        return self._books.get(book_id)
+
+    def get_book_by_isbn(self, isbn: str) -> Optional[Book]:
+        """Returns the book with the given ISBN, if any."""
+        with self._lock:
+            book_id = self._books_by_isbn.get(isbn)
+            return None if book_id is None else self._books.get(book_id)
+
+    def list_books(
+        self,
+        page: int,
+        per_page: int,
+        search: Optional[str] = None,
+        mode: str = "substring",
+        fields: Fields = None,
+    ) -> Page[Row]:
+        """Returns a page of books, optionally filtered by a search term."""
+        serialize = _serializer("book", fields, serialize_book)
+        with self._lock:
+            if not search:
+                return _page(self._books.values(), page, per_page, serialize)
+        return _page(self._matching_books(search, mode), page, per_page, serialize)
+
+    def count_books(self, search: Optional[str] = None, mode: str = "substring") -> int:
+        """Returns the number of books matching a search term."""
+        if not search:
+            return len(self._books)
+        return len(self._matching_books(search, mode))
+
+    def get_books_version(
+        self, search: Optional[str] = None, mode: str = "substring"
+    ) -> Tuple[int, Optional[datetime]]:
+        """Counts the matching books and finds their latest change."""
+        if search:
+            books = self._matching_books(search, mode)
+        else:
+            with self._lock:
+                books = list(self._books.values())
+        return len(books), max((book.updated_at for book in books), default=None)
+
+    def list_books_after(
+        self,
+        after_id: Optional[int],
+        limit: int,
+        search: Optional[str] = None,
+        fields: Fields = None,
+    ) -> List[Row]:
+        """Returns the next books after an ID, optionally filtered."""
+        term = search.lower() if search else None
+        with self._lock:
+            books = _scan_after(
+                self._book_order,
+                self._books,
+                after_id,
+                limit,
+                None if term is None else lambda book: _contains(book, term),
+            )
+        return list(map(_serializer("book", fields, serialize_book), books))
+
+    def get_books(self, book_ids: List[int], fields: Fields = None) -> List[Row]:
+        """Returns the existing books among the given IDs, in that order."""
+        books = self._books
+        serialize = _serializer("book", fields, serialize_book)
+        return [serialize(books[book_id]) for book_id in book_ids if book_id in books]
+
+    def estimate_count(self, table: str) -> Optional[int]:
+        """Dictionary sizes are exact and free, so they are the estimate."""
+        return len({"books": self._books, "users": self._users}[table])
+
+    def has_trigram_index(self) -> bool:
+        """Fuzzy searches use the in-process index of ``BookService``."""
+        return False
+
+    def list_book_titles(self) -> List[Tuple[int, str, str]]:
+        """Returns ``(id, title, author)`` for every book."""
+        with self._lock:
+            return [(book.id, book.title, book.author) for book in self._books.values()]
+
+    # Users
+    def get_user(self, user_id: int) -> Optional[User]:
+        """Returns the user with the given ID, if any."""
+        return self._users.get(user_id)
+
+    def get_user_by_email(self, email: str) -> Optional[User]:
+        """Returns the user with the given email, if any."""
+        with self._lock:
+            user_id = self._users_by_email.get(email)
+            return None if user_id is None else self._users.get(user_id)
+
+    def list_users(self, page: int, per_page: int, fields: Fields = None) -> Page[Row]:
+        """Returns a page of users."""
+        serialize = _serializer("user", fields, serialize_user)
+        with self._lock:
+            return _page(self._users.values(), page, per_page, serialize)
+
+    def count_users(self) -> int:
+        """Returns the number of users."""
+        return len(self._users)
+
+    def list_users_after(
+        self, after_id: Optional[int], limit: int, fields: Fields = None
+    ) -> List[Row]:
+        """Returns the next users after an ID."""
+        with self._lock:
+            users = _scan_after(self._user_order, self._users, after_id, limit)
+        return list(map(_serializer("user", fields, serialize_user), users))
+
+    # Loans
+    def get_loan(self, loan_id: int) -> Optional[BookLoan]:
+        """Returns the loan with the given ID, if any."""
+        return self._loans.get(loan_id)
+
+    def open_loan(self, loan: BookLoan, max_active: Optional[int] = None) -> bool:
+        """Checks and takes the copy, and stores the loan, under the lock."""
+        with self._lock:
+            book = self._books.get(loan.book_id)
+            if book is None or book.available_copies <= 0:
+                return False
+            user = self._users.get(loan.user_id)
+            if user is None:
+                raise NotFoundError(f"User {loan.user_id} not found")
+            if max_active is not None and user.active_loans >= max_active:
+                raise LimitExceededError(
+                    f"User {loan.user_id} has {max_active} active loans already"
+                )
+            self.save(loan)
+            _lend(book, user, 1)
+            return True
+
+    def close_loan(self, loan: BookLoan, returned_at: datetime) -> bool:
+        """Checks and closes the loan, and puts the copy back, under the lock."""
+        with self._lock:
+            if loan.is_returned:
+                return False
+            loan.is_returned = True
+            loan.returned_at = returned_at
+            self.save(loan)
+            _lend(self._books.get(loan.book_id), self._users.get(loan.user_id), -1)
+            return True
+
+    def check_active_loans(self, repair: bool = False) -> List[CounterDrift]:
+        """Counts the unreturned loans of every book and user from the index."""
+        with self._lock:
+            by_book = Counter(book_id for book_id, _ in self._active_loans)
+            by_user = Counter(user_id for _, user_id in self._active_loans)
+            drifts = _drifts("books", self._books, by_book)
+            drifts += _drifts("users", self._users, by_user)
+            if repair:
+                for drift in drifts:
+                    if drift.table == "books":
+                        book = self._books[drift.id]
+                        book.active_loans = drift.loans
+                        book.available_copies = max(0, book.total_copies - drift.loans)
+                        book.is_available = book.available_copies > 0
+                        _bump_version(book)
+                    else:
+                        self._users[drift.id].active_loans = drift.loans
+            return drifts
+
+    def archive_loans(self, returned_before: datetime, limit: int) -> int:
+        """
+        Moves the batch from the loans by ID to the archived ones; the
+        per-user index keeps both.
+        """
+        with self._lock:
+            batch = list(
+                islice(
+                    (
+                        loan
+                        for loan in self._loans.values()
+                        if loan.is_returned and loan.returned_at < returned_before
+                    ),
+                    limit,
+                )
+            )
+            for loan in batch:
+                self._archived_loans[loan.id] = self._loans.pop(loan.id)
+            return len(batch)
+
+    def list_loans(
+        self,
+        filters: LoanFilter,
+        now: datetime,
+        page: int,
+        per_page: int,
+        fields: Fields = None,
+    ) -> Page[Row]:
+        """Returns a page of the loans matching the filters."""
+        serialize = _serializer("loan", fields, serialize_loan)
+        return _page(self._matching_loans(filters, now), page, per_page, serialize)
+
+    def count_loans(self, filters: LoanFilter, now: datetime) -> int:
+        """Returns the number of loans matching the filters."""
+        return len(self._matching_loans(filters, now))
+
+    def list_loans_after(
+        self,
+        filters: LoanFilter,
+        now: datetime,
+        after_id: Optional[int],
+        limit: int,
+        fields: Fields = None,
+    ) -> List[Row]:
+        """Returns the next loans matching the filters after an ID."""
+        loans = _slice_after(self._matching_loans(filters, now), after_id, limit)
+        return list(map(_serializer("loan", fields, serialize_loan), loans))
+
+    def get_loans_version(
+        self, filters: LoanFilter, now: datetime
+    ) -> Tuple[int, Optional[datetime], int, int]:
+        """Aggregates the matching loans and the rows they show."""
+        loans = self._matching_loans(filters, now)
+        rows: List[Any] = list(loans)
+        rows += [loan.book for loan in loans] + [loan.user for loan in loans]
+        stamps = [row.updated_at for row in rows if row is not None]
+        overdue = [loan for loan in loans if _is_overdue(loan, now)]
+        days = sum((now - loan.due_date).days for loan in overdue)
+        return len(loans), max(stamps, default=None), len(overdue), days
+
+    # Cache coherence
+    def get_generations(self) -> Dict[str, int]:
+        """Returns the generations of this process's writes."""
+        with self._lock:
+            return dict(self._generations)
+
+    def bump_generation(self, name: str) -> int:
+        """Increments a generation."""
+        with self._lock:
+            value = self._generations[name] = self._generations.get(name, 0) + 1
+            return value
+
+    # Helpers
+    def _matching_loans(self, filters: LoanFilter, now: datetime) -> List[BookLoan]:
+        """Returns the loans matching the filters at ``now``, in ID order."""
+        with self._lock:
+            if filters.user_id is not None:
+                loans = list(self._loans_by_user.get(filters.user_id, {}).values())
+            elif filters.status in ("active", "overdue"):
+                loans = list(self._active_loans.values())
+            else:
+                loans = [*self._loans.values(), *self._archived_loans.values()]
+        matching = [loan for loan in loans if _matches(loan, filters, now)]
+        return sorted(matching, key=lambda loan: loan.id)
+
+    def _table(self, entity: Any) -> Dict[int, Any]:
+        """Returns the dictionary that holds entities of the entity's type."""
+        if isinstance(entity, Book):
+            return self._books
+        if isinstance(entity, User):
+            return self._users
+        if isinstance(entity, BookLoan):
+            return self._loans
+        raise TypeError(f"Cannot store {type(entity).__name__}")
+
+    def _check_unique(
+        self, entity: Any, changes: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Raises DuplicateError if the entity's unique field, or its new value
+        among ``changes``, is taken.
+        """
+        changes = changes or {}
+        if isinstance(entity, Book):
+            isbn = changes.get("isbn", entity.isbn)
+            owner = None if isbn is None else self._books_by_isbn.get(isbn)
+            if owner is not None and owner != entity.id:
+                raise DuplicateError(f"ISBN {isbn} is already taken")
+        elif isinstance(entity, User):
+            email = changes.get("email", entity.email)
+            owner = self._users_by_email.get(email)
+            if owner is not None and owner != entity.id:
+                raise DuplicateError(f"Email {email} is already taken")
+        elif isinstance(entity, BookLoan) and not entity.is_returned:
+            owner = self._active_loans.get((entity.book_id, entity.user_id))
+            if owner is not None and owner is not entity:
+                raise DuplicateError(
+                    f"User {entity.user_id} already has book {entity.book_id}"
+                )
+
+    def _index(self, entity: Any) -> None:
+        """Brings the secondary indexes up to date with a saved entity."""
+        if isinstance(entity, Book):
+            _reindex(self._books_by_isbn, self._book_isbns, entity.id, entity.isbn)
+            self._index_words(entity)
+        elif isinstance(entity, User):
+            _reindex(self._users_by_email, self._user_emails, entity.id, entity.email)
+        elif isinstance(entity, BookLoan):
+            self._loans_by_user.setdefault(entity.user_id, {})[entity.id] = entity
+            if entity.user is None:
+                entity.user = self._users.get(entity.user_id)
+            if entity.book is None:
+                entity.book = self._books.get(entity.book_id)
+            if entity.is_returned:
+                self._unindex_active_loan(entity)
+            else:
+                self._active_loans[(entity.book_id, entity.user_id)] = entity
+
+    def _index_words(self, book: Book) -> None:
+        """Adds a book's words to the full-text index."""
+        self._unindex_words(book.id)
+        weights: Dict[str, float] = {}
+        fields = (book.title, book.author, book.isbn, book.description)
+        for value, weight in zip(fields, fulltext.FIELD_WEIGHTS):
+            for word in fulltext.tokenize(value):
+                weights[word] = weights.get(word, 0.0) + weight
+        for word, weight in weights.items():
+            self._postings.setdefault(word, {})[book.id] = weight
+        self._book_words[book.id] = weights
+
+    def _unindex_words(self, book_id: int) -> None:
+        """Removes a book's words from the full-text index."""
+        for word in self._book_words.pop(book_id, ()):
+            postings = self._postings[word]
+            del postings[book_id]
+            if not postings:
+                del self._postings[word]
+
+    def _matching_books(self, search: str, mode: str) -> List[Book]:
+        """Returns the books matching a search term, in listing order."""
+        with self._lock:
+            if mode == "fulltext":
+                return self._search_words(fulltext.tokenize(search))
+            books = list(self._books.values())
+        term = search.lower()
+        return [book for book in books if _contains(book, term)]
+
+    def _search_words(self, words: List[str]) -> List[Book]:
+        """
+        Returns the books containing every word, best matches first: a book
+        scores the weights of the fields each word appears in.
+        """
+        if not words:
+            return []
+        postings = [self._postings.get(word, {}) for word in set(words)]
+        postings.sort(key=len)
+        scores = []
+        for book_id, weight in postings[0].items():
+            score = weight
+            for other in postings[1:]:
+                other_weight = other.get(book_id)
+                if other_weight is None:
+                    break
+                score += other_weight
+            else:
+                scores.append((-score, book_id))
+        scores.sort()
+        return [self._books[book_id] for _, book_id in scores]
+
+    def _unindex_active_loan(self, loan: BookLoan) -> None:
+        """Removes a loan from the active loan indexes."""
+        key = (loan.book_id, loan.user_id)
+        if self._active_loans.get(key) is loan:
+            del self._active_loans[key]
+
+
+def _reindex(
+    index: Dict[str, int], values: Dict[int, str], entity_id: int, value: Optional[str]
+) -> None:
+    """Points a unique index at an entity's current value of a field."""
+    previous = values.pop(entity_id, None)
+    if previous is not None and index.get(previous) == entity_id:
+        del index[previous]
+    if value is not None:
+        index[value] = entity_id
+        values[entity_id] = value
+
+
+def _apply_column_defaults(entity: Any) -> None:
+    """Fills unset columns with their defaults, as an INSERT would."""
+    for column in type(entity).__table__.columns:
+        default = column.default
+        if default is None or getattr(entity, column.key) is not None:
+            continue
+        if default.is_scalar:
+            setattr(entity, column.key, default.arg)
+        elif default.is_callable:
+            setattr(entity, column.key, default.arg(None))
+
+
+def _bump_version(entity: Any) -> None:
+    """Increments the version column of a versioned entity, as a flush would."""
+    column = type(entity).__mapper__.version_id_col
+    if column is not None:
+        version = getattr(entity, column.key)
+        setattr(entity, column.key, 1 if version is None else version + 1)
+
+
+def _drifts(
+    name: str, entities: Dict[int, Any], loans: "Counter[int]"
+) -> List[CounterDrift]:
+    """Returns the drifted counters of the entities of a table, in ID order."""
+    return [
+        CounterDrift(
+            name, entity_id, entities[entity_id].active_loans, loans[entity_id]
+        )
+        for entity_id in sorted(entities)
+        if entities[entity_id].active_loans != loans[entity_id]
+    ]
+
+
+def _lend(book: Optional[Book], user: Optional[User], count: int) -> None:
+    """
+    Lends (1) or puts back (-1) a copy of a stored book to a stored user in
+    place, without re-indexing the book's words as ``save`` would.
+    """
+    if book is not None:
+        book.available_copies -= count
+        book.is_available = book.available_copies > 0
+        book.active_loans += count
+        _bump_version(book)
+        book.updated_at = datetime.utcnow()
+    if user is not None:
+        user.active_loans += count
+
+
+def _page(
+    items: Iterable[Any], page: int, per_page: int, serialize: Serializer
+) -> Page[Row]:
+    """
+    Cuts one page, and the next item if any, out of an ordered iterable of
+    entities, and serializes the page.
+    """
+    per_page = max(per_page, 1)
+    start = (max(page, 1) - 1) * per_page
+    entities = list(islice(items, start, start + per_page + 1))
+    more = len(entities) > per_page
+    rows = list(map(serialize, entities[:per_page]))
+    return Page(rows, None, page, per_page, more=more)
+
+
+def _serializer(kind: str, fields: Fields, full: Serializer) -> Serializer:
+    """Returns the serializer of a sparse fieldset, or ``full`` without one."""
+    return full if fields is None else fieldset_serializer(kind, fields)
+
+
+def _contains(book: Book, term: str) -> bool:
+    """Whether the book's title, author or ISBN contain a lowercase term."""
+    return (
+        term in book.title.lower()
+        or term in book.author.lower()
+        or (book.isbn is not None and term in book.isbn.lower())
+    )
+
+
+def _scan_after(
+    order: SortedIndex,
+    table: Dict[int, T],
+    after_id: Optional[int],
+    limit: int,
+    keep: Optional[Callable[[T], bool]] = None,
+) -> List[T]:
+    """
+    Returns up to ``limit`` entities of ``table`` with an ID above
+    ``after_id``, in ID order, optionally only those ``keep`` accepts.
+    """
+    found: List[T] = []
+    low: Tuple[int, ...] = () if after_id is None else (after_id + 1,)
+    while len(found) < limit:
+        ids = order.range(low, None, limit, 0)
+        for entity_id in ids:
+            entity = table[entity_id]
+            if keep is None or keep(entity):
+                found.append(entity)
+                if len(found) == limit:
+                    break
+        if len(ids) < limit:
+            break
+        low = (ids[-1] + 1,)
+    return found
+
+
+def _is_overdue(loan: BookLoan, now: datetime) -> bool:
+    """Whether a loan is overdue at ``now``."""
+    return not loan.is_returned and loan.due_date < now
+
+
+def _matches(loan: BookLoan, filters: LoanFilter, now: datetime) -> bool:
+    """Whether a loan matches the filters of a loan listing at ``now``."""
+    if filters.status == "active" and loan.is_returned:
+        return False
+    if filters.status == "returned" and not loan.is_returned:
+        return False
+    if filters.status == "overdue" and not _is_overdue(loan, now):
+        return False
+    borrowed = (filters.borrowed_from, filters.borrowed_until)
+    due = (filters.due_from, filters.due_until)
+    return _within(loan.borrowed_at, *borrowed) and _within(loan.due_date, *due)
+
+
+def _within(
+    value: datetime, start: Optional[datetime], end: Optional[datetime]
+) -> bool:
+    """Whether a date is in a range that includes its start and excludes its end."""
+    return (start is None or value >= start) and (end is None or value < end)
+
+
+def _slice_after(
+    loans: List[BookLoan], after_id: Optional[int], limit: Optional[int]
+) -> List[BookLoan]:
+    """Keeps the ID-ordered loans above ``after_id``, at most ``limit`` of them."""
+    if after_id is not None:
+        loans = [loan for loan in loans if loan.id > after_id]
+    return loans if limit is None else loans[:limit]
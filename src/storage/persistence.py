@@ -0,0 +1,433 @@
+"""
+This module provides optional on-disk persistence for the in-memory Library.
+
+A ``StoragePersistence`` is attached to a Library as its journal. Every create
+and delete is appended to a write-ahead log (WAL) before the call returns.
+Concurrent writers share fsyncs: whichever writer syncs first also makes the
+records queued behind it durable (group commit). Once enough records have been
+logged, a background thread writes a compacted snapshot of the whole library
+and drops the WAL segments it covers.
+
+Snapshots are stored column by column: integer columns as raw native-endian
+``array`` bytes and string columns as JSON arrays, with authors stored once in
+a lookup table. On start-up the newest snapshot is memory-mapped and each
+column is decoded in a single call, then any newer WAL segments are replayed.
+Replay drops a torn last line, left by a crash, and raises
+``CorruptWalError`` on an undecodable line anywhere else.
+
+Layout of the storage directory:
+
+    snapshot-<generation>.bin  state before wal-<generation>.log was started
+    wal-<generation>.log       one JSON array per line, e.g.
+                               ["create_book", 3, "Dune", "Frank Herbert", 1965]
+    LOCK                       held exclusively by the owning process
+
+Only one process may own a storage directory at a time; ``open`` raises
+``DirectoryLockedError`` in any other. ``global_storage.enable_persistence``
+gives each further process, such as another gunicorn worker, a
+``worker-<n>`` subdirectory of its own.
+
+Example usage:
+
+    persistence = StoragePersistence("/var/lib/library")
+    library = persistence.open()
+    ...
+    persistence.close()
+"""
+
+import gc
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+from typing import IO, Any, Dict, List, Optional, Sequence, Tuple
+
+from src.models.book import Book
+from src.models.library import Library
+from src.models.user import LibraryUser
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+_SNAPSHOT_MAGIC = b"FMLSNAP1"
+_SNAPSHOT_HEADER = struct.Struct("<8sQQ")
+_SECTION_LENGTH = struct.Struct("<Q")
+_SNAPSHOT_NAME = re.compile(r"^snapshot-(\d+)\.bin$")
+_WAL_NAME = re.compile(r"^wal-(\d+)\.log$")
+
+
+class DirectoryLockedError(RuntimeError):
+    """Raised when another process owns the storage directory."""
+
+
+class CorruptWalError(RuntimeError):
+    """Raised when a WAL segment has an undecodable line before its last."""
+
+
+class StoragePersistence:
+    """
+    Write-ahead log and snapshot files backing a Library.
+
+    :param directory: The directory holding the WAL and snapshot files.
+    :param snapshot_every: The number of logged changes after which a new
+        snapshot is written in the background. 0 disables automatic snapshots.
+    :param fsync: Whether commits wait for the data to reach the disk, not just
+        the operating system.
+    """
+
+    def __init__(
+        self, directory: str, snapshot_every: int = 100_000, fsync: bool = True
+    ) -> None:
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self._library: Optional[Library] = None
+        self._lock_file: Optional[IO[bytes]] = None
+        self._wal: Optional[IO[str]] = None
+        self._generation = 0
+        self._pending: List[str] = []
+        self._appended = 0
+        self._durable = 0
+        self._since_snapshot = 0
+        self._append_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_thread: Optional[threading.Thread] = None
+
+    # Lifecycle
+    def open(self, library: Optional[Library] = None) -> Library:
+        """
+        Restores the persisted state and starts journaling changes.
+
+        :param library: The library to restore into; a new one by default.
+        :returns: The restored library, with this persistence attached.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._acquire_directory_lock()
+        library = library if library is not None else Library()
+
+        snapshots = self._generations(_SNAPSHOT_NAME)
+        base = snapshots[-1] if snapshots else 0
+        if snapshots:
+            _read_snapshot(self._snapshot_path(base), library)
+        replayed = 0
+        for generation in self._generations(_WAL_NAME):
+            if generation >= base:
+                replayed += _replay_wal(self._wal_path(generation), library)
+
+        self._generation = max([base] + self._generations(_WAL_NAME))
+        self._wal = self._open_wal(self._generation)
+        self._since_snapshot = replayed
+        self._library = library
+        library.attach_journal(self)
+        return library
+
+    def close(self) -> None:
+        """Flushes pending changes and releases the storage directory."""
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        if self._library is not None:
+            self._library.attach_journal(None)
+            self._library = None
+        if self._wal is not None:
+            with self._sync_lock:
+                self._write_pending()
+                self._wal.close()
+                self._wal = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def reset(self, library: Library) -> None:
+        """
+        Discards all persisted state and starts journaling the given library.
+
+        :param library: The library that replaces the persisted one.
+        """
+        self.close()
+        for name in os.listdir(self.directory):
+            if _SNAPSHOT_NAME.match(name) or _WAL_NAME.match(name):
+                os.remove(os.path.join(self.directory, name))
+        self._pending = []
+        self._appended = self._durable = 0
+        self.open(library)
+
+    # Journal protocol
+    def append(self, operation: str, record: Tuple[Any, ...]) -> int:
+        """
+        Queues a change for the WAL.
+
+        :returns: The ticket to pass to ``commit``.
+        """
+        line = json.dumps([operation, *record], ensure_ascii=False)
+        with self._append_lock:
+            self._pending.append(line + "\n")
+            self._appended += 1
+            self._since_snapshot += 1
+            return self._appended
+
+    def commit(self, ticket: int) -> None:
+        """
+        Blocks until the change with the given ticket is in the WAL.
+
+        Every change queued so far is written with one write and one fsync,
+        so writers waiting on the same sync share its cost.
+        """
+        with self._sync_lock:
+            if self._durable < ticket:
+                self._write_pending()
+        if self.snapshot_every and self._since_snapshot >= self.snapshot_every:
+            self._start_background_snapshot()
+
+    def _write_pending(self) -> None:
+        """Writes and syncs all queued changes; call under the sync lock."""
+        with self._append_lock:
+            lines, self._pending = self._pending, []
+            target = self._appended
+        if self._wal is None or not lines:
+            return
+        self._wal.write("".join(lines))
+        self._wal.flush()
+        if self.fsync:
+            os.fsync(self._wal.fileno())
+        self._durable = target
+
+    # Snapshots
+    def snapshot(self) -> None:
+        """
+        Writes a compacted snapshot of the library and drops the WAL segments
+        it covers.
+        """
+        library = self._library
+        if library is None:
+            return
+        with self._snapshot_lock:
+            with library.write_locked():
+                books = library.books_snapshot()
+                users = library.users_snapshot()
+                next_ids = (library.next_book_id, library.next_user_id)
+                generation = self._rotate_wal()
+
+            _write_snapshot(self._snapshot_path(generation), books, users, *next_ids)
+            self._fsync_directory()
+            for old in self._generations(_SNAPSHOT_NAME):
+                if old < generation:
+                    os.remove(self._snapshot_path(old))
+            for old in self._generations(_WAL_NAME):
+                if old < generation:
+                    os.remove(self._wal_path(old))
+
+    def _start_background_snapshot(self) -> None:
+        """Starts a snapshot thread unless one is already running."""
+        with self._append_lock:
+            running = self._snapshot_thread
+            if running is not None and running.is_alive():
+                return
+            self._since_snapshot = 0
+            self._snapshot_thread = threading.Thread(
+                target=self.snapshot, name="library-snapshot", daemon=True
+            )
+            self._snapshot_thread.start()
+
+    def _rotate_wal(self) -> int:
+        """Moves the WAL to a new segment; call with all writers blocked."""
+        with self._sync_lock:
+            self._write_pending()
+            if self._wal is not None:
+                self._wal.close()
+            self._generation += 1
+            self._since_snapshot = 0
+            self._wal = self._open_wal(self._generation)
+        return self._generation
+
+    # Files
+    def _snapshot_path(self, generation: int) -> str:
+        """Returns the path of the snapshot file of a generation."""
+        return os.path.join(self.directory, f"snapshot-{generation}.bin")
+
+    def _wal_path(self, generation: int) -> str:
+        """Returns the path of the WAL segment of a generation."""
+        return os.path.join(self.directory, f"wal-{generation}.log")
+
+    def _open_wal(self, generation: int) -> IO[str]:
+        """Opens the WAL segment of a generation for appending."""
+        return open(self._wal_path(generation), "a", encoding="utf-8", newline="")
+
+    def _generations(self, pattern: "re.Pattern[str]") -> List[int]:
+        """Returns the sorted generation numbers of files matching a pattern."""
+        matches = (pattern.match(name) for name in os.listdir(self.directory))
+        return sorted(int(match.group(1)) for match in matches if match)
+
+    def _acquire_directory_lock(self) -> None:
+        """Makes sure no other process journals into the same directory."""
+        self._lock_file = open(os.path.join(self.directory, "LOCK"), "ab")
+        if fcntl is None:
+            return
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise DirectoryLockedError(
+                f"Storage directory {self.directory} is used by another process"
+            )
+
+    def _fsync_directory(self) -> None:
+        """Makes renames and new files in the storage directory durable."""
+        if not self.fsync or not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _write_snapshot(
+    path: str,
+    books: Sequence[Book],
+    users: Sequence[LibraryUser],
+    next_book_id: int,
+    next_user_id: int,
+) -> None:
+    """Atomically writes a columnar snapshot file."""
+    authors: Dict[str, int] = {}
+    author_refs = array(
+        "q", [authors.setdefault(b.author, len(authors)) for b in books]
+    )
+    sections = [
+        array("q", [book.id for book in books]).tobytes(),
+        array("q", [book.year for book in books]).tobytes(),
+        author_refs.tobytes(),
+        _dump_strings(list(authors)),
+        _dump_strings([book.title for book in books]),
+        array("q", [user.id for user in users]).tobytes(),
+        _dump_strings([user.name for user in users]),
+        _dump_strings([user.email for user in users]),
+        _dump_strings([user.password for user in users]),
+    ]
+
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as snapshot:
+        snapshot.write(
+            _SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, next_book_id, next_user_id)
+        )
+        for section in sections:
+            snapshot.write(_SECTION_LENGTH.pack(len(section)))
+            snapshot.write(section)
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+    os.replace(temporary, path)
+
+
+def _read_snapshot(path: str, library: Library) -> None:
+    """Loads a snapshot file into the library through a memory map."""
+    with open(path, "rb") as snapshot:
+        with mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            magic, next_book_id, next_user_id = _SNAPSHOT_HEADER.unpack_from(view)
+            if magic != _SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not a library snapshot")
+
+            sections = []
+            offset = _SNAPSHOT_HEADER.size
+            while offset < len(view):
+                (length,) = _SECTION_LENGTH.unpack_from(view, offset)
+                offset += _SECTION_LENGTH.size
+                end = offset + length
+                sections.append(view[offset:end])
+                offset = end
+
+    (book_ids, years, author_refs, authors, titles) = sections[:5]
+    (user_ids, names, emails, passwords) = sections[5:]
+    author_table = [sys.intern(author) for author in json.loads(authors)]
+
+    # The records are acyclic, so pausing the cycle collector is safe and
+    # avoids repeated full collections while a million objects are created.
+    # Later full collections still traverse them all (0.25 s per million),
+    # unless the app freezes them once started (see ``init_storage``).
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        # One list of IDs for the books and the library's keys to share
+        ids = _load_ints(book_ids).tolist()
+        books = Book.from_columns(
+            ids,
+            json.loads(titles),
+            map(author_table.__getitem__, _load_ints(author_refs)),
+            _load_ints(years),
+        )
+        users = map(
+            LibraryUser,
+            _load_ints(user_ids),
+            json.loads(names),
+            json.loads(emails),
+            json.loads(passwords),
+        )
+        library.load(books, users, next_book_id, next_user_id, ids)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _replay_wal(path: str, library: Library) -> int:
+    """
+    Applies the changes logged in a WAL segment to the library.
+
+    A torn last line, left by a crash in the middle of a write, is dropped.
+    Any other undecodable line raises ``CorruptWalError``, leaving the file
+    as is: the changes logged after it are not lost.
+
+    :returns: The number of changes applied.
+    """
+    applied = 0
+    with open(path, "r+", encoding="utf-8", newline="") as wal:
+        valid_length = 0
+        for line in iter(wal.readline, ""):
+            try:
+                operation, *record = json.loads(line)
+            except (TypeError, ValueError):
+                if wal.readline():
+                    raise CorruptWalError(
+                        f"{path}: undecodable change at byte {valid_length}"
+                    ) from None
+                break
+            if not line.endswith("\n"):
+                break
+            _apply(library, operation, record)
+            valid_length += len(line.encode("utf-8"))
+            applied += 1
+        wal.truncate(valid_length)
+    return applied
+
+
+def _apply(library: Library, operation: str, record: List[Any]) -> None:
+    """Applies one logged change to the library."""
+    if operation == "create_book":
+        book_id, title, author, year = record
+        library.create_book(Book(book_id, title, sys.intern(author), year))
+    elif operation == "delete_book":
+        library.delete_book(record[0])
+    elif operation == "create_user":
+        library.create_user(LibraryUser(*record))
+    elif operation == "delete_user":
+        library.delete_user(record[0])
+    else:
+        raise ValueError(f"Unknown WAL operation {operation!r}")
+
+
+def _dump_strings(values: List[str]) -> bytes:
+    """Encodes a string column as a UTF-8 JSON array."""
+    return json.dumps(values, ensure_ascii=False).encode("utf-8")
+
+
+def _load_ints(data: bytes) -> "array[int]":
+    """Decodes an integer column written with ``array.tobytes``."""
+    values = array("q")
+    values.frombytes(data)
+    return values
@@ -0,0 +1,298 @@
+"""
+Server-side cache of public JSON responses.
+
+``ResponseCache`` stores the body of successful responses under the request
+path and its normalized query arguments. An entry is served as is while it
+is younger than ``RESPONSE_CACHE_TTL_SECONDS``. For the following
+``RESPONSE_CACHE_STALE_SECONDS`` it is still served to every request but
+the first to find it stale, which runs the view to replace it
+(stale-while-revalidate): only that request waits for the view, in its own
+request context.
+
+Every key includes the generation of its tag ("books"), and invalidating a
+tag bumps the generation: entries cached before a write are never served
+again and age out of the store. The store is configured with
+``RESPONSE_CACHE_BACKEND``:
+
+- ``memory`` (default): ``MemoryCacheStore``, a per-worker LRU bounded to
+  ``RESPONSE_CACHE_MAX_BYTES`` of cached bodies.
+- ``redis``: ``RedisCacheStore``, shared by every worker and bounded by the
+  server's ``maxmemory`` policy. Needs the ``redis`` package.
+- ``none``: responses are not cached.
+"""
+
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Protocol, Tuple, Type
+from urllib.parse import urlencode
+
+from flask import Flask, Response, current_app, make_response, request
+
+from src.storage.generations import validate_caches
+
+# Wall-clock time the body was stored at, and the HTTP status
+_HEADER = struct.Struct("!dH")
+
+
+class CacheStore(Protocol):
+    """Key-value store for cached responses."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the value of a key, unless missing or expired."""
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Stores a value that expires after ``ttl`` seconds."""
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Stores a value only if the key is free; returns whether it was."""
+
+    def delete(self, key: str) -> None:
+        """Removes a key, if present."""
+
+    def incr(self, key: str) -> int:
+        """Increments a counter that never expires; returns the new value."""
+
+    def get_counter(self, key: str) -> int:
+        """Returns the value of a counter, 0 if never incremented."""
+
+
+class MemoryCacheStore:
+    """In-process LRU store, bounded by the total size of its values."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._values: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._size = 0
+        self._counters: Dict[str, int] = {}
+
+    @property
+    def size(self) -> int:
+        """The total size of the stored values, in bytes."""
+        return self._size
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the value of a key, unless missing or expired."""
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                self._discard(key)
+                return None
+            self._values.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Stores a value, evicting the least recently used ones to fit it."""
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._values[key] = (value, time.monotonic() + ttl)
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                self._discard(next(iter(self._values)))
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Stores a value only if the key is free; returns whether it was."""
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                return False
+        self.set(key, value, ttl)
+        return True
+
+    def delete(self, key: str) -> None:
+        """Removes a key, if present."""
+        with self._lock:
+            self._discard(key)
+
+    def incr(self, key: str) -> int:
+        """Increments a counter; returns the new value."""
+        with self._lock:
+            value = self._counters[key] = self._counters.get(key, 0) + 1
+            return value
+
+    def get_counter(self, key: str) -> int:
+        """Returns the value of a counter, 0 if never incremented."""
+        return self._counters.get(key, 0)
+
+    def _discard(self, key: str) -> None:
+        """Removes a key, if present. Requires the lock."""
+        entry = self._values.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+
+
+class RedisCacheStore:
+    """
+    Store on a Redis (or Redis-protocol) server. Connection errors are
+    treated as misses, so an unavailable server only disables caching.
+    """
+
+    def __init__(
+        self, client: Any, errors: Tuple[Type[BaseException], ...] = (OSError,)
+    ) -> None:
+        self._client = client
+        self._errors = errors
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisCacheStore":
+        """Connects to the server at a ``redis://`` URL."""
+        import redis
+
+        return cls(redis.Redis.from_url(url), (redis.RedisError, OSError))
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the value of a key, unless missing or expired."""
+        try:
+            value: Optional[bytes] = self._client.get(key)
+            return value
+        except self._errors:
+            return None
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Stores a value that expires after ``ttl`` seconds."""
+        try:
+            self._client.set(key, value, px=max(1, int(ttl * 1000)))
+        except self._errors:
+            pass
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Stores a value only if the key is free; returns whether it was."""
+        try:
+            return bool(
+                self._client.set(key, value, px=max(1, int(ttl * 1000)), nx=True)
+            )
+        except self._errors:
+            return False
+
+    def delete(self, key: str) -> None:
+        """Removes a key, if present."""
+        try:
+            self._client.delete(key)
+        except self._errors:
+            pass
+
+    def incr(self, key: str) -> int:
+        """Increments a counter; returns the new value."""
+        try:
+            return int(self._client.incr(key))
+        except self._errors:
+            return 0
+
+    def get_counter(self, key: str) -> int:
+        """Returns the value of a counter, 0 if never incremented."""
+        try:
+            return int(self._client.get(key) or 0)
+        except self._errors:
+            return 0
+
+
+class ResponseCache:
+    """Caches the responses of views, with stale-while-revalidate."""
+
+    def __init__(
+        self,
+        store: CacheStore,
+        ttl: float = 30.0,
+        stale: float = 30.0,
+    ) -> None:
+        self.store = store
+        self.ttl = ttl
+        self.stale = stale
+
+    def respond(self, tag: str, view: Callable[[], Any]) -> Response:
+        """
+        Returns the cached response to the current request, or runs the
+        view and caches its response if it is a 200.
+        """
+        key = self._key(tag)
+        lock = None
+        value = self.store.get(key)
+        if value is not None:
+            stored_at, status = _HEADER.unpack_from(value)
+            start = _HEADER.size
+            body = value[start:]
+            age = time.time() - stored_at
+            if age <= self.ttl:
+                return _cached_response(body, status, "HIT")
+            if age <= self.ttl + self.stale:
+                # Another request is already replacing it
+                lock = f"lock:{key}"
+                if not self.store.add(lock, b"1", self.stale):
+                    return _cached_response(body, status, "STALE")
+
+        try:
+            response = make_response(view())
+            self._store(key, response)
+        finally:
+            if lock is not None:
+                self.store.delete(lock)
+        response.headers["X-Cache"] = "MISS"
+        return response
+
+    def invalidate(self, tag: str) -> None:
+        """Stops serving every response cached under a tag."""
+        self.store.incr(f"generation:{tag}")
+
+    def _key(self, tag: str) -> str:
+        """Returns the key of the current request under a tag's generation."""
+        generation = self.store.get_counter(f"generation:{tag}")
+        args = urlencode(sorted(request.args.items(multi=True)))
+        return f"response:{tag}:{generation}:{request.path}?{args}"
+
+    def _store(self, key: str, response: Response) -> None:
+        """Caches a successful JSON response."""
+        if response.status_code != 200 or response.mimetype != "application/json":
+            return
+        header = _HEADER.pack(time.time(), response.status_code)
+        self.store.set(key, header + response.get_data(), self.ttl + self.stale)
+
+
+def _cached_response(body: bytes, status: int, state: str) -> Response:
+    """Builds a JSON response from a cached body."""
+    response = Response(body, status=status, mimetype="application/json")
+    response.headers["X-Cache"] = state
+    return response
+
+
+def create_store(app: Flask) -> Optional[CacheStore]:
+    """Creates the cache store configured for the app, if any."""
+    name = app.config["RESPONSE_CACHE_BACKEND"]
+    if name == "none":
+        return None
+    if name == "memory":
+        return MemoryCacheStore(app.config["RESPONSE_CACHE_MAX_BYTES"])
+    if name == "redis":
+        return RedisCacheStore.from_url(app.config["RESPONSE_CACHE_REDIS_URL"])
+    raise ValueError(f"Unknown response cache backend: {name}")
+
+
+def init_response_cache(app: Flask) -> None:
+    """Creates the response cache of the app, unless disabled."""
+    store = create_store(app)
+    if store is None:
+        app.extensions["response_cache"] = None
+        return
+
+    cache = app.extensions["response_cache"] = ResponseCache(
+        store,
+        ttl=app.config["RESPONSE_CACHE_TTL_SECONDS"],
+        stale=app.config["RESPONSE_CACHE_STALE_SECONDS"],
+    )
+    # A shared store is invalidated by the writing worker for all of them
+    if isinstance(store, MemoryCacheStore):
+        app.extensions["catalog_generations"].listen(
+            "books", lambda: cache.invalidate("books")
+        )
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Returns the response cache of the current app, None if disabled."""
+    validate_caches()
+    cache: Optional[ResponseCache] = current_app.extensions.get("response_cache")
+    return cache
@@ -0,0 +1,685 @@
+"""
+Storage backend on top of the Flask-SQLAlchemy session.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    Integer,
+    and_,
+    case,
+    cast,
+    column,
+    false,
+    func,
+    literal,
+    literal_column,
+    or_,
+    table,
+    text,
+    union_all,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
+
+from src.exceptions import (
+    DuplicateError,
+    LimitExceededError,
+    NotFoundError,
+    StaleVersionError,
+)
+from src.extensions import db
+from src.models import Book, BookLoan, BookLoanHistory, CatalogGeneration, User
+from src.serializers import BOOK_FIELDS, USER_FIELDS, field_names
+from src.storage import fulltext, fuzzy
+from src.storage.backend import CounterDrift, Fields, LoanFilter, Page, Row
+
+_books = Book.__table__
+_users = User.__table__
+_loans = BookLoan.__table__
+_history = BookLoanHistory.__table__
+
+_LOAN_FIELDS = field_names("loan")
+
+# Loads the user and book of a loan in the same query
+_WITH_USER_AND_BOOK = [
+    joinedload(BookLoan.user),  # type: ignore[arg-type]
+    joinedload(BookLoan.book),  # type: ignore[arg-type]
+]
+
+# Unreturned loans, in the words of the partial indexes over them (see
+# ``BookLoan``): SQLite only uses a partial index for queries whose
+# conditions include the index's own
+_OPEN = ~_loans.c.is_returned
+
+# Every loan, current or archived, with the columns of the loans table. The
+# conditions on it are pushed into both halves of the union by the database,
+# so each half uses its own table's indexes
+_ALL_LOANS = union_all(
+    db.select(_loans), db.select(*(_history.c[name] for name in _loans.c.keys()))
+).subquery("all_loans")
+
+
+class SqlAlchemyBackend:
+    """
+    Storage backend that reads and writes the configured database.
+
+    Single entities are loaded as ORM instances, which the services change
+    and save. Listings only read: they select the columns of their rows
+    with Core statements and build the rows from the result tuples, without
+    entities or identity map bookkeeping.
+    """
+
+    def __init__(self) -> None:
+        self._trigram_index: Optional[bool] = None
+
+    # Unit of work
+    def save(self, entity: Any) -> None:
+        """Adds the entity to the session; changes are flushed on commit."""
+        db.session.add(entity)
+
+    def update(self, entity: Any, changes: Dict[str, Any]) -> None:
+        """
+        Sets the fields; a duplicate is only found on commit, whose rollback
+        expires the entity back to its stored values.
+        """
+        for name, value in changes.items():
+            setattr(entity, name, value)
+        db.session.add(entity)
+
+    def delete(self, entity: Any) -> None:
+        """Marks the entity for deletion on commit."""
+        db.session.delete(entity)
+
+    def commit(self) -> None:
+        """
+        Commits the session, reporting unique constraint violations and
+        updates of versioned rows that another transaction changed first.
+        """
+        try:
+            db.session.commit()
+        except IntegrityError as err:
+            db.session.rollback()
+            raise DuplicateError(str(err.orig)) from err
+        except StaleDataError as err:
+            db.session.rollback()
+            raise StaleVersionError(str(err)) from err
+
+    def rollback(self) -> None:
+        """Rolls back the session."""
+        db.session.rollback()
+
+    # Books
+    def get_book(self, book_id: int) -> Optional[Book]:
+        """Returns the book with the given ID, if any."""
+        return db.session.get(Book, book_id)
+
+    def get_book_by_isbn(self, isbn: str) -> Optional[Book]:
+        """Returns the book with the given ISBN, if any."""
+        book: Optional[Book] = Book.query.filter_by(isbn=isbn).first()
+        return book
+
+    def list_books(
+        self,
+        page: int,
+        per_page: int,
+        search: Optional[str] = None,
+        mode: str = "substring",
+        fields: Fields = None,
+    ) -> Page[Row]:
+        """Returns a page of books, optionally filtered by a search term."""
+        return _page(self._book_query(search, mode, fields), page, per_page)
+
+    def count_books(self, search: Optional[str] = None, mode: str = "substring") -> int:
+        """Returns the number of books matching a search term."""
+        query = self._book_query(search, mode).order_by(None)
+        count: int = db.session.execute(
+            query.with_only_columns(func.count(_books.c.id))
+        ).scalar_one()
+        return count
+
+    def get_books_version(
+        self, search: Optional[str] = None, mode: str = "substring"
+    ) -> Tuple[int, Optional[datetime]]:
+        """Counts the matching books and finds their latest change in one query."""
+        query = self._book_query(search, mode).order_by(None)
+        count, last_modified = db.session.execute(
+            query.with_only_columns(
+                func.count(_books.c.id), func.max(_books.c.updated_at)
+            )
+        ).one()
+        return count, last_modified
+
+    def list_books_after(
+        self,
+        after_id: Optional[int],
+        limit: int,
+        search: Optional[str] = None,
+        fields: Fields = None,
+    ) -> List[Row]:
+        """Returns the next books after an ID, optionally filtered."""
+        query = _select(_books, fields or BOOK_FIELDS)
+
+        if search:
+            query = query.where(_substring_filter(search))
+
+        return _rows(_after(query, _books.c.id, after_id, limit))
+
+    def get_books(self, book_ids: List[int], fields: Fields = None) -> List[Row]:
+        """Returns the existing books among the given IDs, in that order."""
+        if not book_ids:
+            return []
+        query = _select(_books, fields or BOOK_FIELDS).where(_books.c.id.in_(book_ids))
+        books = {book["id"]: book for book in _rows(query)}
+        return [books[book_id] for book_id in book_ids if book_id in books]
+
+    def has_trigram_index(self) -> bool:
+        """Whether the database has pg_trgm indexes on title and author."""
+        if self._trigram_index is None:
+            self._trigram_index = fuzzy.has_trigram_index(db.session.connection())
+        return self._trigram_index
+
+    def list_book_titles(self) -> List[Tuple[int, str, str]]:
+        """Returns ``(id, title, author)`` for every book."""
+        rows = db.session.execute(db.select(Book.id, Book.title, Book.author))
+        return [(book_id, title, author) for book_id, title, author in rows]
+
+    def estimate_count(self, table: str) -> Optional[int]:
+        """
+        Reads the row count the query planner works with: ``reltuples`` on
+        PostgreSQL (None until the table is first analyzed) and, on SQLite,
+        ``sqlite_stat1`` once ``ANALYZE`` has run, or else the largest rowid,
+        which overcounts by the rows deleted since.
+        """
+        dialect_name = _dialect_name()
+        if dialect_name == "postgresql":
+            estimate = db.session.execute(
+                text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table)"),
+                {"table": table},
+            ).scalar()
+            return int(estimate) if estimate is not None and estimate >= 0 else None
+        if dialect_name != "sqlite":
+            return None
+
+        analyzed = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+        ).first()
+        if analyzed is not None:
+            stat = db.session.execute(
+                text("SELECT stat FROM sqlite_stat1 WHERE tbl = :table LIMIT 1"),
+                {"table": table},
+            ).scalar()
+            if stat:
+                return int(stat.split()[0])
+        key = {"books": Book.id, "users": User.id}[table]
+        return int(db.session.execute(db.select(func.max(key))).scalar() or 0)
+
+    def _book_query(
+        self, search: Optional[str], mode: str, fields: Fields = None
+    ) -> Any:
+        """Returns the ordered select of the rows of the books matching a search term."""
+        query = _select(_books, fields or BOOK_FIELDS)
+        dialect_name = _dialect_name()
+
+        if search and mode == "fulltext" and fulltext.is_supported(dialect_name):
+            return _fulltext_query(query, search, dialect_name)
+        if search and mode == "fuzzy" and self.has_trigram_index():
+            db.session.execute(
+                text(
+                    "SET LOCAL pg_trgm.word_similarity_threshold = "
+                    f"{fuzzy.SIMILARITY_THRESHOLD}"
+                )
+            )
+            return _fuzzy_query(query, search)
+        if search:
+            query = query.where(_substring_filter(search))
+        return query.order_by(_books.c.id)
+
+    # Users
+    def get_user(self, user_id: int) -> Optional[User]:
+        """Returns the user with the given ID, if any."""
+        return db.session.get(User, user_id)
+
+    def get_user_by_email(self, email: str) -> Optional[User]:
+        """Returns the user with the given email, if any."""
+        user: Optional[User] = User.query.filter_by(email=email).first()
+        return user
+
+    def list_users(self, page: int, per_page: int, fields: Fields = None) -> Page[Row]:
+        """Returns a page of users."""
+        query = _select(_users, fields or USER_FIELDS).order_by(_users.c.id)
+        return _page(query, page, per_page)
+
+    def count_users(self) -> int:
+        """Returns the number of users."""
+        count: int = User.query.count()
+        return count
+
+    def list_users_after(
+        self, after_id: Optional[int], limit: int, fields: Fields = None
+    ) -> List[Row]:
+        """Returns the next users after an ID."""
+        query = _select(_users, fields or USER_FIELDS)
+        return _rows(_after(query, _users.c.id, after_id, limit))
+
+    # Loans
+    def get_loan(self, loan_id: int) -> Optional[BookLoan]:
+        """Returns the loan with the given ID, if any, with its user and book."""
+        return db.session.get(BookLoan, loan_id, options=_WITH_USER_AND_BOOK)
+
+    def open_loan(self, loan: BookLoan, max_active: Optional[int] = None) -> bool:
+        """
+        Takes the copy with one conditional UPDATE, which checks and
+        decrements the available copies in the same statement, instead of
+        reading the book first: of concurrent borrows of the last copy, only
+        one updates the row. The user's counter is checked against the limit
+        the same way; only when no user row matched is the user looked up,
+        to tell a missing user from one at the limit. The unique index on unreturned loans rejects a second
+        loan of the book by the user when the loan is flushed.
+        """
+        taken = db.session.execute(
+            _books.update()
+            .where(_books.c.id == loan.book_id, _books.c.available_copies > 0)
+            .values(
+                available_copies=_books.c.available_copies - 1,
+                is_available=_books.c.available_copies > 1,
+                active_loans=_books.c.active_loans + 1,
+                version=_books.c.version + 1,
+            )
+        )
+        if taken.rowcount == 0:
+            return False
+
+        within_limit = (
+            [] if max_active is None else [_users.c.active_loans < max_active]
+        )
+        counted = db.session.execute(
+            _count_user_loans(1).where(_users.c.id == loan.user_id, *within_limit)
+        )
+        if counted.rowcount == 0:
+            exists = db.session.execute(
+                db.select(_users.c.id).where(_users.c.id == loan.user_id)
+            ).first()
+            db.session.rollback()
+            if exists is None:
+                raise NotFoundError(f"User {loan.user_id} not found")
+            raise LimitExceededError(
+                f"User {loan.user_id} has {max_active} active loans already"
+            )
+
+        db.session.add(loan)
+        try:
+            db.session.flush()
+        except IntegrityError as err:
+            db.session.rollback()
+            raise DuplicateError(str(err.orig)) from err
+        return True
+
+    def close_loan(self, loan: BookLoan, returned_at: datetime) -> bool:
+        """
+        Closes the loan with an UPDATE conditional on it being open, so only
+        one of concurrent returns puts the copy back, without loading the
+        book.
+        """
+        closed = db.session.execute(
+            _loans.update()
+            .where(_loans.c.id == loan.id, _OPEN)
+            .values(is_returned=True, returned_at=returned_at)
+        )
+        if closed.rowcount == 0:
+            return False
+
+        db.session.execute(
+            _books.update()
+            .where(_books.c.id == loan.book_id)
+            .values(
+                available_copies=_books.c.available_copies + 1,
+                is_available=True,
+                active_loans=_books.c.active_loans - 1,
+                version=_books.c.version + 1,
+            )
+        )
+        db.session.execute(_count_user_loans(-1).where(_users.c.id == loan.user_id))
+        return True
+
+    def check_active_loans(self, repair: bool = False) -> List[CounterDrift]:
+        """
+        Counts the unreturned loans of every book and user in one grouped
+        query each, and repairs drifted rows one UPDATE each: drift is rare.
+        """
+        drifts: List[CounterDrift] = []
+        for entities, key in ((_books, _loans.c.book_id), (_users, _loans.c.user_id)):
+            counts = (
+                db.select(key.label("id"), func.count().label("loans"))
+                .where(_OPEN)
+                .group_by(key)
+                .subquery()
+            )
+            loans = func.coalesce(counts.c.loans, 0)
+            query = (
+                db.select(entities.c.id, entities.c.active_loans, loans)
+                .select_from(entities.outerjoin(counts, counts.c.id == entities.c.id))
+                .where(entities.c.active_loans != loans)
+                .order_by(entities.c.id)
+            )
+            drifts.extend(
+                CounterDrift(entities.name, *row) for row in db.session.execute(query)
+            )
+
+        if repair:
+            for drift in drifts:
+                db.session.execute(_repair_counter(drift))
+        return drifts
+
+    def archive_loans(self, returned_before: datetime, limit: int) -> int:
+        """
+        Picks the batch in ID order, then copies it to the archive with one
+        INSERT ... SELECT and deletes it with one DELETE. Returned loans
+        never change again, so the copy cannot miss a concurrent update.
+        """
+        batch = (
+            db.select(_loans.c.id)
+            .where(_loans.c.is_returned, _loans.c.returned_at < returned_before)
+            .order_by(_loans.c.id)
+            .limit(limit)
+        )
+        loan_ids = list(db.session.execute(batch).scalars())
+        if not loan_ids:
+            return 0
+
+        db.session.execute(
+            _history.insert().from_select(
+                _loans.c.keys(), db.select(_loans).where(_loans.c.id.in_(loan_ids))
+            )
+        )
+        db.session.execute(_loans.delete().where(_loans.c.id.in_(loan_ids)))
+        return len(loan_ids)
+
+    def list_loans(
+        self,
+        filters: LoanFilter,
+        now: datetime,
+        page: int,
+        per_page: int,
+        fields: Fields = None,
+    ) -> Page[Row]:
+        """Returns a page of the loans matching the filters."""
+        loans = _loan_source(filters)
+        query = _loan_query(loans, now, _dialect_name(), fields)
+        query = query.where(*_loan_filter(loans, filters, now)).order_by(loans.c.id)
+        return _page(query, page, per_page)
+
+    def count_loans(self, filters: LoanFilter, now: datetime) -> int:
+        """Returns the number of loans matching the filters."""
+        loans = _loan_source(filters)
+        query = db.select(func.count(loans.c.id)).where(
+            *_loan_filter(loans, filters, now)
+        )
+        count: int = db.session.execute(query).scalar_one()
+        return count
+
+    def list_loans_after(
+        self,
+        filters: LoanFilter,
+        now: datetime,
+        after_id: Optional[int],
+        limit: int,
+        fields: Fields = None,
+    ) -> List[Row]:
+        """Returns the next loans matching the filters after an ID."""
+        loans = _loan_source(filters)
+        query = _loan_query(loans, now, _dialect_name(), fields)
+        query = query.where(*_loan_filter(loans, filters, now))
+        return _rows(_after(query, loans.c.id, after_id, limit))
+
+    def get_loans_version(
+        self, filters: LoanFilter, now: datetime
+    ) -> Tuple[int, Optional[datetime], int, int]:
+        """Aggregates the matching loans, and the rows they show, in one query."""
+        loans = _loan_source(filters)
+        overdue = case((_overdue(loans, now), 1), else_=0)
+        days_overdue = _days_overdue(loans, now, _dialect_name())
+        query = (
+            db.select(
+                func.count(loans.c.id),
+                func.max(loans.c.updated_at),
+                func.max(_books.c.updated_at),
+                func.max(_users.c.updated_at),
+                func.coalesce(func.sum(overdue), 0),
+                func.coalesce(func.sum(days_overdue), 0),
+            )
+            .select_from(
+                loans.outerjoin(_books, _books.c.id == loans.c.book_id).outerjoin(
+                    _users, _users.c.id == loans.c.user_id
+                )
+            )
+            .where(*_loan_filter(loans, filters, now))
+        )
+
+        count, *stamps, overdue_count, days = db.session.execute(query).one()
+        changed = [stamp for stamp in stamps if stamp is not None]
+        return count, max(changed, default=None), int(overdue_count), int(days)
+
+    # Cache coherence
+    def get_generations(self) -> Dict[str, int]:
+        """Reads every generation in one query."""
+        rows = db.session.execute(
+            db.select(CatalogGeneration.name, CatalogGeneration.value)
+        ).all()
+        return {name: value for name, value in rows}
+
+    def bump_generation(self, name: str) -> int:
+        """
+        Increments the generation in the database, in the current
+        transaction, so it commits (and locks the row) with the write.
+        """
+        generation = CatalogGeneration.__table__
+        bumped = db.session.execute(
+            generation.update()
+            .where(generation.c.name == name)
+            .values(value=generation.c.value + 1)
+        )
+        if bumped.rowcount == 0:
+            db.session.add(CatalogGeneration(name=name, value=1))
+            return 1
+        value: int = db.session.execute(
+            db.select(generation.c.value).where(generation.c.name == name)
+        ).scalar_one()
+        return value
+
+
+def _count_user_loans(change: int) -> Any:
+    """
+    Returns an UPDATE adding ``change`` to users' active loans. It keeps
+    their ``updated_at`` and version: the counter is not part of the user's
+    representation, and the ORM only writes the columns it changed, so a
+    concurrent update of the user cannot overwrite it.
+    """
+    return _users.update().values(
+        active_loans=_users.c.active_loans + change, updated_at=_users.c.updated_at
+    )
+
+
+def _repair_counter(drift: CounterDrift) -> Any:
+    """
+    Returns the UPDATE setting a drifted counter to the number of loans,
+    along with a book's available copies.
+    """
+    if drift.table == "users":
+        return (
+            _users.update()
+            .where(_users.c.id == drift.id)
+            .values(active_loans=drift.loans, updated_at=_users.c.updated_at)
+        )
+    total = _books.c.total_copies
+    return (
+        _books.update()
+        .where(_books.c.id == drift.id)
+        .values(
+            active_loans=drift.loans,
+            available_copies=case((total > drift.loans, total - drift.loans), else_=0),
+            is_available=total > drift.loans,
+            version=_books.c.version + 1,
+        )
+    )
+
+
+def _after(query: Any, key: Any, after_id: Optional[int], limit: Optional[int]) -> Any:
+    """Orders a query by ``key`` and keeps the rows after ``after_id``."""
+    if after_id is not None:
+        query = query.where(key > after_id)
+    query = query.order_by(key)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def _substring_filter(search: str) -> Any:
+    """Matches books whose title, author or ISBN contain the search term."""
+    search_term = f"%{search}%"
+    return or_(
+        Book.title.ilike(search_term),
+        Book.author.ilike(search_term),
+        Book.isbn.ilike(search_term),
+    )
+
+
+def _select(source: Any, fields: Tuple[str, ...]) -> Any:
+    """Returns the select of the given columns of a table, named after them."""
+    return db.select(*(source.c[name] for name in fields))
+
+
+def _rows(query: Any) -> List[Row]:
+    """Runs a select and returns its result tuples as rows keyed by label."""
+    result = db.session.execute(query)
+    keys = tuple(result.keys())
+    return [dict(zip(keys, values)) for values in result]
+
+
+def _page(query: Any, page: int, per_page: int) -> Page[Row]:
+    """Fetches one page of a query, and one row more to tell if others follow."""
+    per_page = max(per_page, 1)
+    start = (max(page, 1) - 1) * per_page
+    rows = _rows(query.offset(start).limit(per_page + 1))
+    more = len(rows) > per_page
+    return Page(rows[:per_page], None, page, per_page, more=more)
+
+
+def _dialect_name() -> str:
+    """Returns the name of the dialect of the session's database."""
+    name: str = db.session.get_bind().dialect.name
+    return name
+
+
+def _loan_source(filters: LoanFilter) -> Any:
+    """
+    Returns the loans the filters can match: unreturned loans are never
+    archived, so listings of them only read the current loans.
+    """
+    return _loans if filters.status in ("active", "overdue") else _ALL_LOANS
+
+
+def _loan_query(
+    loans: Any, now: datetime, dialect_name: str, fields: Fields = None
+) -> Any:
+    """
+    Returns the select of loan rows from ``loans``, with the name of the
+    user and the title of the book they show, and whether and by how many
+    days they are overdue at ``now``. Users and books are only joined if
+    their columns are selected.
+    """
+    fields = fields or _LOAN_FIELDS
+    computed = {
+        "user_name": _users.c.name.label("user_name"),
+        "book_title": _books.c.title.label("book_title"),
+        "is_overdue": _overdue(loans, now).label("is_overdue"),
+        "days_overdue": _days_overdue(loans, now, dialect_name).label("days_overdue"),
+    }
+    source = loans
+    if "user_name" in fields:
+        source = source.outerjoin(_users, _users.c.id == loans.c.user_id)
+    if "book_title" in fields:
+        source = source.outerjoin(_books, _books.c.id == loans.c.book_id)
+    return db.select(
+        *(computed[name] if name in computed else loans.c[name] for name in fields)
+    ).select_from(source)
+
+
+def _loan_filter(loans: Any, filters: LoanFilter, now: datetime) -> List[Any]:
+    """Returns the conditions on ``loans`` matching the filters at ``now``."""
+    conditions = []
+    if filters.user_id is not None:
+        conditions.append(loans.c.user_id == filters.user_id)
+
+    if filters.status == "active":
+        conditions.append(~loans.c.is_returned)
+    elif filters.status == "returned":
+        conditions.append(loans.c.is_returned.is_(True))
+    elif filters.status == "overdue":
+        conditions.append(_overdue(loans, now))
+
+    ranges = (
+        (loans.c.borrowed_at, filters.borrowed_from, filters.borrowed_until),
+        (loans.c.due_date, filters.due_from, filters.due_until),
+    )
+    for key, start, end in ranges:
+        if start is not None:
+            conditions.append(key >= start)
+        if end is not None:
+            conditions.append(key < end)
+    return conditions
+
+
+def _overdue(loans: Any, now: datetime) -> Any:
+    """Whether a loan of ``loans`` is overdue at ``now``."""
+    return and_(~loans.c.is_returned, loans.c.due_date < now)
+
+
+def _days_overdue(loans: Any, now: datetime, dialect_name: str) -> Any:
+    """The whole days a loan is overdue by at ``now``, 0 if it is not overdue."""
+    at = literal(now, db.DateTime)
+    if dialect_name == "sqlite":
+        seconds = cast(func.strftime("%s", at), Integer) - cast(
+            func.strftime("%s", loans.c.due_date), Integer
+        )
+        days = seconds // 86400
+    else:
+        elapsed = func.extract("epoch", at - loans.c.due_date)
+        days = cast(func.floor(elapsed / 86400), Integer)
+    return case((_overdue(loans, now), days), else_=0)
+
+
+def _fulltext_query(query: Any, search: str, dialect_name: str) -> Any:
+    """Filters a book query by the full-text index and orders it by rank."""
+    if dialect_name == "sqlite":
+        match = fulltext.match_expression(search)
+        if match is None:
+            return query.where(false())
+        index = table(fulltext.FTS_TABLE, column("rowid"), column("rank"))
+        return (
+            query.join(index, index.c.rowid == _books.c.id)
+            .where(text(f"{fulltext.FTS_TABLE} MATCH :match").bindparams(match=match))
+            .order_by(index.c.rank, _books.c.id)
+        )
+
+    vector: Any = literal_column("books.search_vector")
+    tsquery = func.plainto_tsquery("simple", search)
+    return query.where(vector.op("@@")(tsquery)).order_by(
+        func.ts_rank(vector, tsquery).desc(), _books.c.id
+    )
+
+
+def _fuzzy_query(query: Any, search: str) -> Any:
+    """Filters a book query by trigram word similarity and orders it by score."""
+    score = func.greatest(
+        func.word_similarity(search, Book.title),
+        func.word_similarity(search, Book.author),
+    )
+    return query.where(
+        or_(
+            literal(search).op("<%")(Book.title),
+            literal(search).op("<%")(Book.author),
+        )
+    ).order_by(score.desc(), Book.id)
@@ -0,0 +1,212 @@
+"""
+In-process title/author indexes for typeahead suggestions and fuzzy search.
+
+Each worker keeps its own ``BookSuggestions``, built from the storage
+backend when the worker starts (or on first use) and updated by
+``BookService`` whenever it creates, updates or deletes a book. Titles and
+authors are normalized with ``fulltext.tokenize``. A ``TrigramIndex`` serves
+typo-tolerant searches, and two ``SortedIndex`` arrays serve prefixes:
+
+- the whole normalized title and author, so "the two" suggests
+  "The Two Towers" first;
+- every later word-start suffix ("two towers", "towers", "tolkien"), used
+  to fill the remaining slots.
+
+Books written by other workers appear once the index has been rebuilt in
+the background, which starts when the books generation moves (see
+``generations``) or the index is older than ``SUGGEST_MAX_AGE_SECONDS``.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from flask import Flask, current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.models.library import SortedIndex
+from src.storage.backend import get_backend
+from src.storage.fulltext import tokenize
+from src.storage.fuzzy import TrigramIndex
+from src.storage.generations import validate_caches
+
+# Sorts after every character a prefix can be followed by
+_MAX_CHAR = "\U0010ffff"
+
+BookTitle = Tuple[int, str, str]
+
+
+class BookSuggestions:
+    """Prefix index over book titles and authors."""
+
+    def __init__(self, max_age: float = 300.0) -> None:
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._starts = SortedIndex()
+        self._words = SortedIndex()
+        self._trigrams = TrigramIndex()
+        self._books: Dict[int, Tuple[str, str]] = {}
+        self._built_at: Optional[float] = None
+        # Changes made while a background rebuild is loading, replayed on it
+        self._pending: Optional[List[Tuple[int, Optional[Tuple[str, str]]]]] = None
+
+    @property
+    def is_built(self) -> bool:
+        """Whether the index has been loaded."""
+        return self._built_at is not None
+
+    @property
+    def is_stale(self) -> bool:
+        """Whether the index is older than ``max_age``."""
+        return (
+            self._built_at is not None
+            and time.monotonic() - self._built_at > self.max_age
+        )
+
+    def mark_stale(self) -> None:
+        """Makes the next use rebuild the index, e.g. after others' writes."""
+        with self._lock:
+            if self._built_at is not None:
+                self._built_at = float("-inf")
+
+    def build(self, books: Iterable[BookTitle]) -> None:
+        """Replaces the index with the given ``(id, title, author)`` rows."""
+        titles = {book_id: (title, author) for book_id, title, author in books}
+        starts: List[Tuple[str, int]] = []
+        words: List[Tuple[str, int]] = []
+        for book_id, (title, author) in titles.items():
+            for key, is_start in _keys(title, author):
+                (starts if is_start else words).append((key, book_id))
+        starts_index, words_index = SortedIndex(starts), SortedIndex(words)
+        trigram_index = TrigramIndex()
+        for book_id, (title, author) in titles.items():
+            trigram_index.add(book_id, title, author)
+
+        with self._lock:
+            self._starts, self._words, self._books = starts_index, words_index, titles
+            self._trigrams = trigram_index
+            pending, self._pending = self._pending, None
+            for book_id, change in pending or ():
+                self._apply(book_id, change)
+            self._built_at = time.monotonic()
+
+    def add(self, book_id: int, title: str, author: str) -> None:
+        """Adds a book, or replaces its title and author if already present."""
+        with self._lock:
+            self._apply(book_id, (title, author))
+
+    def remove(self, book_id: int) -> None:
+        """Removes a book, if present."""
+        with self._lock:
+            self._apply(book_id, None)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict[str, object]]:
+        """
+        Returns up to ``limit`` books whose title or author, or a word in
+        them, starts with ``prefix``: whole-title and whole-author matches
+        first, each group in alphabetical order.
+        """
+        key = " ".join(tokenize(prefix))
+        if not key or limit <= 0:
+            return []
+        low, high = (key,), (key + _MAX_CHAR,)
+
+        with self._lock:
+            found: List[int] = []
+            seen: Set[int] = set()
+            for index in (self._starts, self._words):
+                offset = 0
+                while len(found) < limit:
+                    ids = index.range(low, high, limit, offset)
+                    for book_id in ids:
+                        if book_id not in seen and len(found) < limit:
+                            seen.add(book_id)
+                            found.append(book_id)
+                    if len(ids) < limit:
+                        break
+                    offset += limit
+            books = self._books
+            return [
+                {"id": book_id, "title": books[book_id][0], "author": books[book_id][1]}
+                for book_id in found
+            ]
+
+    def search_similar(self, query: str) -> List[Tuple[int, float]]:
+        """
+        Returns ``(book_id, score)`` for the books whose title and author
+        words are similar to the query's words, best first.
+        """
+        with self._lock:
+            return self._trigrams.search(query)
+
+    def refresh_in_background(self, load: Callable[[], Iterable[BookTitle]]) -> None:
+        """
+        Rebuilds the index from ``load()`` in a background thread, keeping
+        the current index in use until the new one is ready.
+        """
+        with self._lock:
+            if self._pending is not None:
+                return
+            self._pending = []
+
+        def run() -> None:
+            try:
+                self.build(load())
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+
+        threading.Thread(target=run, name="book-suggestions", daemon=True).start()
+
+    def _apply(self, book_id: int, change: Optional[Tuple[str, str]]) -> None:
+        """Adds, replaces or (with None) removes a book. Requires the lock."""
+        if self._pending is not None:
+            self._pending.append((book_id, change))
+        previous = self._books.pop(book_id, None)
+        self._trigrams.remove(book_id)
+        if previous is not None:
+            for key, is_start in _keys(*previous):
+                (self._starts if is_start else self._words).remove((key, book_id))
+        if change is not None:
+            self._books[book_id] = change
+            self._trigrams.add(book_id, *change)
+            for key, is_start in _keys(*change):
+                (self._starts if is_start else self._words).add((key, book_id))
+
+
+def _keys(title: str, author: str) -> Set[Tuple[str, bool]]:
+    """
+    Returns the normalized keys of a book, each flagged with whether it is a
+    whole title or author rather than a later word-start suffix.
+    """
+    keys: Set[Tuple[str, bool]] = set()
+    for value in (title, author):
+        words = tokenize(value)
+        for start in range(len(words)):
+            keys.add((" ".join(words[start:]), start == 0))
+    return keys
+
+
+def init_suggestions(app: Flask) -> None:
+    """Creates the (empty) suggestion index of the app."""
+    suggestions = app.extensions["book_suggestions"] = BookSuggestions(
+        max_age=app.config["SUGGEST_MAX_AGE_SECONDS"]
+    )
+    app.extensions["catalog_generations"].listen("books", suggestions.mark_stale)
+
+
+def preload_suggestions(app: Flask) -> None:
+    """Builds the suggestion index at worker start, if the database is ready."""
+    with app.app_context():
+        try:
+            get_suggestions().build(get_backend().list_book_titles())
+        except SQLAlchemyError as err:
+            app.logger.warning("Book suggestions will be built on first use: %s", err)
+
+
+def get_suggestions() -> BookSuggestions:
+    """Returns the suggestion index of the current app."""
+    validate_caches()
+    suggestions: BookSuggestions = current_app.extensions["book_suggestions"]
+    return suggestions
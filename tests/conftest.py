@@ -1,6 +1,10 @@
+from contextlib import contextmanager
+
 import pytest
+from sqlalchemy import event
 
 from src import create_app
+from src.extensions import db
 
 
 @pytest.fixture
@@ -13,3 +17,29 @@ def app():
 @pytest.fixture
 def client(app):
     return app.test_client()
+
+
+@pytest.fixture
+def assert_query_count():
+    """
+    Returns a context manager asserting that exactly ``expected`` SQL
+    statements run on the app's engine inside it. It yields the list of the
+    statements, which the assertion message shows.
+    """
+
+    @contextmanager
+    def assert_query_count(expected):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = db.engine
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        assert len(statements) == expected, "\n\n".join(statements)
+
+    return assert_query_count
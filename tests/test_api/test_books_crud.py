@@ -55,3 +55,29 @@ def test_delete_book(client: Any) -> None:
     assert response.status_code == 200
     data = json.loads(response.get_data(as_text=True))
     assert "message" in data
+
+
+def test_search_books(client: Any) -> None:
+    books = [
+        {"title": "Emma", "author": "Jane Austen", "year": 1815},
+        {"title": "Dune", "author": "Frank Herbert", "year": 1965},
+        {"title": "Persuasion", "author": "Jane Austen", "year": 1817},
+    ]
+    for book in books:
+        client.post("/books", json=book)
+
+    response = client.get("/books/search?author=Jane Austen&limit=1&offset=1")
+    assert response.status_code == 200
+    data = json.loads(response.get_data(as_text=True))
+    assert [book["title"] for book in data["books"]] == ["Persuasion"]
+
+    response = client.get("/books/search?year_from=1816")
+    data = json.loads(response.get_data(as_text=True))
+    assert [book["title"] for book in data["books"]] == ["Persuasion", "Dune"]
+
+    response = client.get("/books/search?title=Du")
+    data = json.loads(response.get_data(as_text=True))
+    assert [book["title"] for book in data["books"]] == ["Dune"]
+
+    response = client.get("/books/search?author=Jane Austen&title=Emma")
+    assert response.status_code == 400
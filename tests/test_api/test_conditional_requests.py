@@ -0,0 +1,175 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from src.extensions import db
+from src.services.book_service import BookService
+from src.services.user_service import UserService
+from src.storage.backend import init_backend
+from src.storage.entity_cache import init_entity_cache
+from src.storage.response_cache import init_response_cache
+
+
+@pytest.fixture(params=["sqlalchemy", "memory"])
+def backend_app(request, app):
+    app.config["STORAGE_BACKEND"] = request.param
+    init_backend(app)
+    init_response_cache(app)
+    init_entity_cache(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _book(isbn="9780000000001", title="Dune"):
+    return BookService.create_book(
+        {"title": title, "author": "Frank Herbert", "isbn": isbn, "total_copies": 2}
+    )
+
+
+def test_book_listing_answers_304_until_books_change(backend_app):
+    client = backend_app.test_client()
+    _book()
+
+    response = client.get("/api/v1/books?search=dune")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200 and etag.startswith('W/"books-1-')
+    assert "Last-Modified" not in response.headers
+
+    response = client.get("/api/v1/books?search=dune", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag and response.get_data() == b""
+
+    # Books outside the filtered set do not change its ETag
+    _book("9780000000002", "Emma")
+    response = client.get("/api/v1/books?search=dune", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    response = client.get("/api/v1/books", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+
+    book = BookService.get_books_by_cursor(search="dune")["books"][0]
+    BookService.delete_book(book["id"])
+    response = client.get("/api/v1/books?search=dune", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["books"] == []
+
+
+def test_book_answers_304_until_it_changes(backend_app):
+    client = backend_app.test_client()
+    book = _book()
+
+    response = client.get(f"/api/v1/books/{book.id}")
+    etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+    assert etag.startswith(f'W/"book-{book.id}-')
+
+    response = client.get(f"/api/v1/books/{book.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    response = client.get(
+        f"/api/v1/books/{book.id}", headers={"If-Modified-Since": last_modified}
+    )
+    assert response.status_code == 304
+
+    BookService.update_book(book.id, {"title": "Dune Messiah"})
+    response = client.get(f"/api/v1/books/{book.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["book"]["title"] == "Dune Messiah"
+
+    response = client.get("/api/v1/books/999", headers={"If-None-Match": "*"})
+    assert response.status_code == 404 and "ETag" not in response.headers
+
+
+def test_loans_answer_304_until_they_change(backend_app):
+    client = backend_app.test_client()
+    user = UserService.create_user(
+        {"name": "Alice", "email": "alice@example.com", "password": "secret123"}
+    )
+    book = _book()
+    token = create_access_token(str(user.id), additional_claims={"role": "admin"})
+    headers = {"Authorization": f"Bearer {token}"}
+    url = f"/api/v1/users/{user.id}/loans"
+
+    loan = BookService.borrow_book(book.id, user.id)
+    response = client.get(url, headers=headers)
+    etag = response.headers["ETag"]
+    assert response.status_code == 200 and response.get_json()["total"] == 1
+
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    BookService.return_book(loan.id)
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["loans"][0]["is_returned"]
+
+    # Loans falling overdue change it although no row does, so it counts them
+    BookService.borrow_book(book.id, user.id, days=-1)
+    etag = client.get(url, headers=headers).headers["ETag"]
+    filters = BookService.loan_filter(user.id)
+    count, last_modified, overdue, days = BookService.get_loans_version(filters)
+    assert (count, overdue, days) == (2, 1, 1)
+    assert etag == f'W/"loans-2-{last_modified.isoformat()}-1-1"'
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 401
+
+
+def test_updates_apply_only_to_the_version_in_if_match(backend_app):
+    client = backend_app.test_client()
+    user = UserService.create_user(
+        {"name": "Alice", "email": "alice@example.com", "password": "secret123"}
+    )
+    book = _book()
+    token = create_access_token(str(user.id), additional_claims={"role": "admin"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get(f"/api/v1/books/{book.id}")
+    etag = response.headers["ETag"]
+    assert etag == f'W/"book-{book.id}-1"'
+    assert response.get_json()["book"]["version"] == 1
+
+    response = client.put(
+        f"/api/v1/books/{book.id}",
+        json={"title": "Dune Messiah"},
+        headers={**headers, "If-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'W/"book-{book.id}-2"'
+    assert response.get_json()["book"]["version"] == 2
+
+    # A second writer holding the old version loses instead of overwriting
+    for if_match in (etag, '"book-1-x"', '"user-1-2"'):
+        response = client.put(
+            f"/api/v1/books/{book.id}",
+            json={"title": "Children of Dune"},
+            headers={**headers, "If-Match": if_match},
+        )
+        assert response.status_code == 412
+    assert BookService.get_book_by_id(book.id).title == "Dune Messiah"
+
+    for year, if_match in ((1976, None), (1977, "*")):
+        response = client.put(
+            f"/api/v1/books/{book.id}",
+            json={"year": year},
+            headers={**headers, "If-Match": if_match} if if_match else headers,
+        )
+        assert response.status_code == 200
+    assert BookService.get_book_by_id(book.id).version == 4
+
+    url = f"/api/v1/users/{user.id}"
+    response = client.get(url, headers=headers)
+    etag = response.headers["ETag"]
+    assert etag == f'W/"user-{user.id}-1"'
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = client.put(
+        url, json={"name": "Alicia"}, headers={**headers, "If-Match": etag}
+    )
+    assert response.status_code == 200
+    response = client.put(
+        url, json={"name": "Ali"}, headers={**headers, "If-Match": etag}
+    )
+    assert response.status_code == 412
+    assert response.get_json()["error"] == "User was changed by another request"
+    assert UserService.get_user_by_id(user.id).name == "Alicia"
@@ -0,0 +1,69 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from src.extensions import db
+from src.services.book_service import BookService
+from src.services.user_service import UserService
+
+
+@pytest.fixture
+def db_app(app):
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _library(loans):
+    """Creates an admin with ``loans`` overdue loans; returns auth headers."""
+    admin = UserService.create_user(
+        {"name": "Admin", "email": "admin@example.com", "password": "secret123"}
+    )
+    for i in range(loans):
+        book = BookService.create_book({"title": f"Book {i}", "author": "Author"})
+        BookService.borrow_book(book.id, admin.id, days=-1)
+    token = create_access_token(str(admin.id), additional_claims={"role": "admin"})
+    db.session.remove()
+    return {"Authorization": f"Bearer {token}"}
+
+
+# Each endpoint runs the same statements whatever the number of loans it
+# lists: loans are read with their user names and book titles in one query
+@pytest.mark.parametrize("loans", [1, 10])
+@pytest.mark.parametrize(
+    "url, key, queries",
+    [
+        # The page, then the count
+        ("/api/v1/books/loans/overdue", "overdue_loans", 2),
+        ("/api/v1/books/loans/overdue?cursor=", "overdue_loans", 1),
+        # The version of the loans for the ETag, then the page and its count
+        ("/api/v1/users/1/loans", "loans", 3),
+        ("/api/v1/users/1/loans?cursor=", "loans", 2),
+        # The version of the books for the ETag, their count, then the page
+        ("/api/v1/books?per_page=100", "books", 3),
+    ],
+)
+def test_listings_run_a_fixed_number_of_queries(
+    db_app, assert_query_count, loans, url, key, queries
+):
+    headers = _library(loans)
+    client = db_app.test_client()
+
+    with assert_query_count(queries):
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert len(response.get_json()[key]) == loans
+
+
+def test_returns_load_the_loan_with_its_user_and_book(db_app, assert_query_count):
+    headers = _library(1)
+    client = db_app.test_client()
+
+    # The loan with its user and book, the conditional loan update, the
+    # book and user counter updates, the generation bump, and the loan
+    # refreshed to answer
+    with assert_query_count(7):
+        response = client.post("/api/v1/books/loans/1/return", headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()["loan"]["book_title"] == "Book 0"
@@ -0,0 +1,151 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from src.exceptions import ValidationError as ServiceValidationError
+from src.extensions import db
+from src.json_provider import OrjsonProvider, StdlibJSONProvider, init_json_provider
+from src.serializers import serialize_book, serialize_loan, serialize_user
+from src.services.book_service import BookService
+from src.services.user_service import UserService
+from src.storage.backend import init_backend
+
+
+@pytest.fixture(params=["sqlalchemy", "memory"])
+def backend_app(request, app):
+    app.config["STORAGE_BACKEND"] = request.param
+    init_backend(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.mark.parametrize("provider", ["stdlib", "orjson"])
+def test_serializers_encode_like_to_dict(backend_app, provider):
+    if provider == "orjson":
+        pytest.importorskip("orjson")
+    backend_app.config["JSON_PROVIDER"] = provider
+    init_json_provider(backend_app)
+
+    user = UserService.create_user(
+        {"name": "Alice", "email": "alice@example.com", "password": "secret123"}
+    )
+    book = BookService.create_book(
+        {"title": "Dune", "author": "Frank Herbert", "isbn": "9780000000001"}
+    )
+    loan = BookService.borrow_book(book.id, user.id)
+
+    def encoded(value):
+        return json.loads(backend_app.json.dumps(value))
+
+    # Timestamps are left to the JSON provider
+    assert serialize_book(book)["updated_at"] == book.updated_at
+    assert encoded(serialize_book(book)) == book.to_dict()
+    assert encoded(serialize_loan(loan)) == loan.to_dict()
+    assert encoded(serialize_user(user)) == user.to_dict()
+    assert encoded(serialize_user(user, include_email=True)) == user.to_dict(
+        include_email=True
+    )
+
+    client = backend_app.test_client()
+    response = client.get(f"/api/v1/books/{book.id}")
+    assert response.get_json()["book"] == book.to_dict()
+
+
+def test_listing_rows_encode_like_to_dict(backend_app):
+    user = UserService.create_user(
+        {"name": "Alice", "email": "alice@example.com", "password": "secret123"}
+    )
+    book = BookService.create_book(
+        {"title": "Dune", "author": "Frank Herbert", "isbn": "9780000000001"}
+    )
+    overdue = BookService.borrow_book(book.id, user.id, days=-1)
+
+    def encoded(rows):
+        return json.loads(backend_app.json.dumps(rows))
+
+    # Book listings leave descriptions to the book's own endpoint
+    listed = book.to_dict()
+    del listed["description"]
+    assert encoded(BookService.get_all_books()["books"]) == [listed]
+    assert encoded(BookService.get_books_by_cursor()["books"]) == [listed]
+    assert encoded(UserService.get_all_users()["users"]) == [user.to_dict()]
+    assert encoded(UserService.get_users_by_cursor()["users"]) == [user.to_dict()]
+    user_loans = BookService.get_loans(BookService.loan_filter(user.id))["loans"]
+    assert encoded(user_loans) == [overdue.to_dict()]
+    overdue_loans = BookService.get_loans_by_cursor(
+        BookService.loan_filter(status="overdue")
+    )["loans"]
+    assert encoded(overdue_loans) == [overdue.to_dict()]
+
+
+def test_sparse_fieldsets(backend_app):
+    user = UserService.create_user(
+        {"name": "Alice", "email": "alice@example.com", "password": "secret123"}
+    )
+    book = BookService.create_book(
+        {"title": "Dune", "author": "Frank Herbert", "description": "Spice"}
+    )
+    BookService.borrow_book(book.id, user.id, days=-1)
+
+    # The ID is always included, and fields come in representation order
+    assert BookService.get_all_books(fields="available_copies, title")["books"] == [
+        {"id": book.id, "title": "Dune", "available_copies": 0}
+    ]
+    assert BookService.get_books_by_cursor(fields="description")["books"] == [
+        {"id": book.id, "description": "Spice"}
+    ]
+    assert BookService.get_all_books(search="dun", fields="title")["books"] == [
+        {"id": book.id, "title": "Dune"}
+    ]
+    assert UserService.get_users_by_cursor(fields="name")["users"] == [
+        {"id": user.id, "name": "Alice"}
+    ]
+    loans = BookService.get_loans(
+        BookService.loan_filter(user.id), fields="book_title,is_overdue"
+    )["loans"]
+    assert loans == [{"id": 1, "book_title": "Dune", "is_overdue": True}]
+    loans = BookService.get_loans_by_cursor(
+        BookService.loan_filter(status="overdue"), fields="user_id"
+    )["loans"]
+    assert loans == [{"id": 1, "user_id": user.id}]
+    with pytest.raises(ServiceValidationError):
+        UserService.get_all_users(fields="name,email")
+
+    response = backend_app.test_client().get("/api/v1/books?fields=title,isbn")
+    assert response.get_json()["books"] == [
+        {"id": book.id, "title": "Dune", "isbn": None}
+    ]
+    response = backend_app.test_client().get("/api/v1/books?fields=price")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Unknown book fields: price"}
+
+
+def test_json_providers(app):
+    value = {"b": 1, "a": datetime(2024, 1, 2, 3, 4, 5, 6), 3: None}
+
+    app.config["JSON_PROVIDER"] = "stdlib"
+    init_json_provider(app)
+    assert isinstance(app.json, StdlibJSONProvider)
+    assert app.json.dumps(value) == (
+        '{"b": 1, "a": "2024-01-02T03:04:05.000006", "3": null}'
+    )
+
+    app.config["JSON_PROVIDER"] = "xml"
+    with pytest.raises(ValueError):
+        init_json_provider(app)
+
+    pytest.importorskip("orjson")
+    for name in ("orjson", "auto"):
+        app.config["JSON_PROVIDER"] = name
+        init_json_provider(app)
+        assert isinstance(app.json, OrjsonProvider)
+    assert app.json.dumps(value) == '{"b":1,"a":"2024-01-02T03:04:05.000006","3":null}'
+    assert app.json.loads(b'{"a": [1]}') == {"a": [1]}
+    with app.test_request_context():
+        response = app.json.response(value)
+    assert response.mimetype == "application/json"
+    assert json.loads(response.get_data()) == json.loads(app.json.dumps(value))
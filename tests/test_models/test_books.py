@@ -1,3 +1,5 @@
+from dataclasses import asdict
+
 from src.models.book import Book
 
 
@@ -22,3 +24,17 @@ def test_book_equality():
     assert book1 == book2
     assert book1 != book3
     assert book2 != book3
+
+
+def test_book_is_compact():
+    book_dict = {"id": 1, "title": "Emma", "author": "Jane Austen", "year": 1815}
+    book1 = Book.from_dict(book_dict)
+    book2 = Book.from_dict({**book_dict, "author": "".join(["Jane ", "Austen"])})
+    assert not hasattr(book1, "__dict__")
+    assert book1.author is book2.author
+
+
+def test_book_export():
+    book = Book(1, "The Great Gatsby", "F. Scott Fitzgerald", 1925)
+    assert book.to_dict() == asdict(book)
+    assert book.to_row() == (1, "The Great Gatsby", "F. Scott Fitzgerald", 1925)
@@ -49,3 +49,86 @@ def test_delete_user() -> None:
     assert user1 not in library.users
     with raises(ValueError):
         library.delete_user(0)
+
+
+def test_create_library_with_books_and_users() -> None:
+    emma = Book(id=3, title="Emma", author="Jane Austen", year=1815)
+    dune = Book(id=1, title="Dune", author="Frank Herbert", year=1965)
+    alice = LibraryUser(id=5, name="Alice", email="a@example.com", password="one")
+    library = Library(books=[emma, dune], users=[alice])
+
+    assert library.books == (emma, dune)
+    assert library.users == (alice,)
+    assert library.get_book(1) is dune
+    assert library.find_user_by_email("a@example.com") is alice
+    assert library.find_books_by_author("Jane Austen") == [emma]
+    assert library.allocate_book_id() == 4
+    assert library.allocate_user_id() == 6
+    assert Library(books=[emma]) == Library(books=[emma])
+    assert Library() != Library(users=[alice])
+
+
+def test_lookup_books_by_id() -> None:
+    library = Library()
+    book = Book(id=7, title="Dune", author="Frank Herbert", year=1965)
+    library.create_book(book)
+    assert library.get_book(7) is book
+    assert library.get_book(8) is None
+    with raises(ValueError):
+        library.create_book(Book(id=7, title="Emma", author="Jane Austen", year=1815))
+    library.delete_book(7)
+    assert library.get_book(7) is None
+    assert library.book_count == 0
+
+
+def test_lookup_users_by_name_and_email() -> None:
+    library = Library()
+    first = LibraryUser(id=1, name="Alice", email="a1@example.com", password="one")
+    second = LibraryUser(id=2, name="Alice", email="a2@example.com", password="two")
+    library.create_user(first)
+    library.create_user(second)
+    assert library.get_user(2) is second
+    assert library.find_user_by_name("Alice") is first
+    assert library.find_user_by_email("a2@example.com") is second
+    library.delete_user(1)
+    assert library.find_user_by_name("Alice") is second
+    assert library.find_user_by_email("a1@example.com") is None
+    library.delete_user(2)
+    assert library.find_user_by_name("Alice") is None
+    assert library.user_count == 0
+
+
+def test_delete_preserves_order() -> None:
+    library = Library()
+    for book_id in range(5):
+        library.create_book(
+            Book(id=book_id, title=f"T{book_id}", author="A", year=2000)
+        )
+    library.delete_book(2)
+    assert [book.id for book in library.books] == [0, 1, 3, 4]
+
+
+def test_secondary_index_queries() -> None:
+    library = Library()
+    library.create_book(Book(id=0, title="Emma", author="Jane Austen", year=1815))
+    library.create_book(Book(id=1, title="Dune", author="Frank Herbert", year=1965))
+    library.create_book(Book(id=2, title="Persuasion", author="Jane Austen", year=1817))
+    library.create_book(
+        Book(id=3, title="Dune Messiah", author="Frank Herbert", year=1969)
+    )
+    library.create_book(
+        Book(id=4, title="Mansfield Park", author="Jane Austen", year=1814)
+    )
+    library.delete_book(4)
+
+    def ids(books: list) -> list:
+        return [book.id for book in books]
+
+    assert ids(library.find_books_by_author("Jane Austen")) == [0, 2]
+    assert ids(library.find_books_by_author("Jane")) == []
+    assert ids(library.find_books_by_title_prefix("Dune")) == [1, 3]
+    assert ids(library.find_books_by_title_prefix("M")) == []
+    assert ids(library.find_books_by_year_range(1815, 1965)) == [0, 2, 1]
+    assert ids(library.find_books_by_year_range(start=1900)) == [1, 3]
+    assert ids(library.find_books_by_year_range(end=1816)) == [0]
+    assert ids(library.find_books_by_year_range(limit=2, offset=1)) == [2, 1]
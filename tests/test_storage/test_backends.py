@@ -0,0 +1,549 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.exceptions import (
+    ConflictError,
+    NotFoundError,
+    PreconditionFailedError,
+    StaleVersionError,
+    ValidationError,
+)
+from src.extensions import db
+from src.models import Book, BookLoan
+from src.serializers import serialize_loan
+from src.services.book_service import BookService
+from src.services.user_service import UserService
+from src.storage.backend import (
+    CounterDrift,
+    LoanFilter,
+    create_backend,
+    get_backend,
+    init_backend,
+)
+from src.storage.entity_cache import init_entity_cache
+from src.storage.memory_backend import MemoryBackend
+from src.storage.sqlalchemy_backend import SqlAlchemyBackend
+
+
+@pytest.fixture(params=["sqlalchemy", "memory"])
+def backend_app(request, app):
+    app.config["STORAGE_BACKEND"] = request.param
+    init_backend(app)
+    init_entity_cache(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _user(email="alice@example.com"):
+    return UserService.create_user(
+        {"name": "Alice", "email": email, "password": "secret123"}
+    )
+
+
+def _book(isbn="9780000000001", **fields):
+    data = {"title": "Dune", "author": "Frank Herbert", "isbn": isbn}
+    data.update(fields)
+    return BookService.create_book(data)
+
+
+def test_create_backend():
+    assert isinstance(create_backend("sqlalchemy"), SqlAlchemyBackend)
+    assert isinstance(create_backend("memory"), MemoryBackend)
+    with pytest.raises(ValueError):
+        create_backend("redis")
+
+
+def test_users(backend_app):
+    alice = _user()
+    bob = _user("bob@example.com")
+
+    assert alice.id != bob.id
+    assert alice.is_active and alice.role == "user"
+    assert alice.created_at is not None
+    assert UserService.get_user_by_id(bob.id) is bob
+    assert UserService.get_user_by_email("alice@example.com") is alice
+    assert UserService.get_user_by_id(12345) is None
+    assert UserService.authenticate_user("alice@example.com", "secret123") is alice
+
+    with pytest.raises(ConflictError):
+        _user()
+    with pytest.raises(ConflictError):
+        UserService.update_user(bob.id, {"email": "alice@example.com"})
+    get_backend().rollback()
+
+    UserService.update_user(alice.id, {"email": "alice@library.com"})
+    assert UserService.get_user_by_email("alice@library.com").id == alice.id
+    assert UserService.get_user_by_email("alice@example.com") is None
+
+    UserService.delete_user(bob.id)
+    assert not UserService.get_user_by_id(bob.id).is_active
+    assert UserService.authenticate_user("bob@example.com", "secret123") is None
+
+
+def test_rejected_duplicate_updates_change_nothing(backend_app):
+    alice = _user()
+    bob = _user("bob@example.com")
+    dune = _book("1", title="Dune")
+    emma = _book("2", title="Emma")
+
+    with pytest.raises(ConflictError):
+        BookService.update_book(emma.id, {"title": "Emma 2", "isbn": "1"})
+    with pytest.raises(ConflictError):
+        UserService.update_user(bob.id, {"name": "Robert", "email": alice.email})
+
+    backend = get_backend()
+    emma = backend.get_book(emma.id)
+    assert (emma.title, emma.isbn) == ("Emma", "2")
+    assert backend.get_book_by_isbn("1").id == dune.id
+    assert backend.get_book_by_isbn("2").id == emma.id
+    assert BookService.get_all_books(search="emma", mode="fulltext")["total"] == 1
+    bob = backend.get_user(bob.id)
+    assert (bob.name, bob.email) == ("Alice", "bob@example.com")
+    assert backend.get_user_by_email("alice@example.com").id == alice.id
+    assert backend.get_user_by_email("bob@example.com").id == bob.id
+
+
+def test_list_users(backend_app):
+    users = [_user(f"user{i}@example.com") for i in range(5)]
+
+    listing = UserService.get_all_users(page=2, per_page=2)
+
+    assert [user["id"] for user in listing["users"]] == [users[2].id, users[3].id]
+    assert listing["total"] == 5
+    assert listing["pages"] == 3
+    assert listing["has_next"] and listing["has_prev"]
+
+
+@pytest.mark.parametrize("per_page", [0, -2, -5])
+def test_page_sizes_below_one_list_one_item(backend_app, per_page):
+    for isbn in "123":
+        _book(isbn)
+
+    listing = BookService.get_all_books(per_page=per_page)
+    assert len(listing["books"]) == 1 and listing["has_next"]
+    listing = UserService.get_all_users(per_page=per_page)
+    assert listing["users"] == [] and not listing["has_next"]
+
+    response = backend_app.test_client().get(f"/api/v1/books?per_page={per_page}")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(body["books"]) == 1 and body["per_page"] == 1
+    assert body["has_next"] and body["pages"] == 3
+
+
+def test_listing_counts(backend_app):
+    _book("1", title="Dune")
+    _book("2", title="Dune Messiah")
+
+    assert BookService.get_all_books(search="dune")["total"] == 2
+    _book("3", title="Children of Dune")
+    assert BookService.get_all_books(search="dune")["total"] == 3
+
+    listing = BookService.get_all_books(per_page=2, count="none")
+    assert listing["total"] is None and listing["pages"] is None
+    assert listing["has_next"]
+    listing = BookService.get_all_books(page=2, per_page=2, count="none")
+    assert not listing["has_next"]
+
+    assert BookService.get_all_books(count="estimate")["total"] == 3
+    assert BookService.get_all_books(search="messiah", count="estimate")["total"] == 1
+    _user()
+    assert UserService.get_all_users(count="estimate")["total"] == 1
+
+    with pytest.raises(ValidationError):
+        BookService.get_all_books(count="roughly")
+
+
+def test_books(backend_app):
+    dune = _book(year=1965)
+    assert dune.total_copies == 1 and dune.available_copies == 1
+    assert dune.is_available
+    assert BookService.get_book_by_id(dune.id) is dune
+
+    with pytest.raises(ConflictError):
+        _book()
+
+    other = _book("9780000000002", title="Emma", author="Jane Austen")
+    with pytest.raises(ConflictError):
+        BookService.update_book(other.id, {"isbn": dune.isbn})
+    get_backend().rollback()
+
+    BookService.update_book(dune.id, {"isbn": "9780000000003", "total_copies": 3})
+    assert dune.available_copies == 3
+    _book()
+
+    BookService.delete_book(other.id)
+    assert BookService.get_book_by_id(other.id) is None
+    with pytest.raises(NotFoundError):
+        BookService.delete_book(other.id)
+
+
+def test_versions(backend_app):
+    dune = _book()
+    alice = _user()
+    assert dune.version == 1 and dune.to_dict()["version"] == 1
+    assert alice.version == 1 and alice.to_dict()["version"] == 1
+
+    BookService.update_book(dune.id, {"year": 1965}, version=1)
+    UserService.update_user(alice.id, {"name": "Alicia"})
+    assert dune.version == 2 and alice.version == 2
+
+    with pytest.raises(PreconditionFailedError):
+        BookService.update_book(dune.id, {"year": 1966}, version=1)
+    with pytest.raises(PreconditionFailedError):
+        UserService.update_user(alice.id, {"name": "Ali"}, version=1)
+    assert dune.year == 1965 and alice.name == "Alicia"
+
+
+def test_stale_versions_are_not_committed(app):
+    app.config["STORAGE_BACKEND"] = "sqlalchemy"
+    init_backend(app)
+    with app.app_context():
+        db.create_all()
+        backend = get_backend()
+        dune = _book()
+        assert dune.version == 1
+
+        # Another request updates the book between this one's read and write
+        books = Book.__table__
+        db.session.execute(books.update().values(version=books.c.version + 1))
+        dune.year = 1965
+        backend.save(dune)
+        with pytest.raises(StaleVersionError):
+            backend.commit()
+
+        db.session.remove()
+        db.drop_all()
+
+
+def test_list_books(backend_app):
+    _book("1", title="Dune")
+    _book("2", title="Emma", author="Jane Austen")
+    _book("3", title="Dune Messiah")
+
+    listing = BookService.get_all_books(page=1, per_page=2)
+    assert [book["title"] for book in listing["books"]] == ["Dune", "Emma"]
+    assert listing["total"] == 3 and listing["pages"] == 2
+
+    listing = BookService.get_all_books(search="dUNE")
+    assert [book["title"] for book in listing["books"]] == ["Dune", "Dune Messiah"]
+    assert not listing["has_next"]
+
+    assert BookService.get_all_books(search="austen")["total"] == 1
+    assert BookService.get_all_books(page=9)["books"] == []
+
+
+def test_loans(backend_app):
+    alice = _user()
+    bob = _user("bob@example.com")
+    book = _book(total_copies=2, available_copies=2)
+
+    loan = BookService.borrow_book(book.id, alice.id)
+    assert loan.book_id == book.id and loan.user_id == alice.id
+    assert not loan.is_returned
+    assert BookService.get_loan_by_id(loan.id) is loan
+    assert book.available_copies == 1
+
+    with pytest.raises(ConflictError):
+        BookService.borrow_book(book.id, alice.id)
+    with pytest.raises(ConflictError):
+        BookService.delete_book(book.id)
+
+    overdue = BookService.borrow_book(book.id, bob.id, days=-1)
+    assert not book.is_available
+    assert _loans(status="overdue") == [serialize_loan(overdue)]
+    assert _loans(alice.id) == [serialize_loan(loan)]
+
+    BookService.return_book(loan.id)
+    assert loan.is_returned and loan.returned_at is not None
+    assert book.available_copies == 1 and book.is_available
+    assert _loans(alice.id, status="active") == []
+    assert _loans(alice.id, status="returned") == [serialize_loan(loan)]
+    with pytest.raises(ConflictError):
+        BookService.return_book(loan.id)
+
+    BookService.borrow_book(book.id, alice.id)
+    assert len(_loans(alice.id)) == 2
+    assert get_backend().get_book(book.id).active_loans == 2
+    assert get_backend().get_user(alice.id).active_loans == 1
+    later = datetime.utcnow() + timedelta(days=30)
+    overdue_later = LoanFilter(status="overdue")
+    assert get_backend().count_loans(overdue_later, later) == 2
+
+
+def test_borrow_limit(backend_app):
+    alice = _user()
+    books = [_book(f"{number}", title=f"Book {number}") for number in range(3)]
+    backend_app.config["MAX_ACTIVE_LOANS"] = 2
+
+    first = BookService.borrow_book(books[0].id, alice.id)
+    BookService.borrow_book(books[1].id, alice.id)
+    with pytest.raises(ConflictError, match="2 books borrowed"):
+        BookService.borrow_book(books[2].id, alice.id)
+    assert get_backend().get_book(books[2].id).available_copies == 1
+
+    BookService.return_book(first.id)
+    BookService.borrow_book(books[2].id, alice.id)
+    assert get_backend().get_user(alice.id).active_loans == 2
+
+
+@pytest.mark.parametrize("max_active", [None, 2])
+def test_loans_of_missing_users_are_not_found(backend_app, max_active):
+    book = _book()
+    backend = get_backend()
+    loan = BookLoan(book_id=book.id, user_id=12345, due_date=datetime.utcnow())
+
+    with pytest.raises(NotFoundError, match="User 12345 not found"):
+        backend.open_loan(loan, max_active)
+    assert backend.get_book(book.id).available_copies == 1
+    assert BookService.get_loans(BookService.loan_filter())["total"] == 0
+
+
+def test_active_loan_counters_are_checked_and_repaired(backend_app):
+    alice = _user()
+    book = _book(total_copies=3)
+    BookService.borrow_book(book.id, alice.id)
+    assert BookService.check_active_loans() == []
+
+    # Counters written behind the loans' back, as a manual fix could
+    backend = get_backend()
+    drifted = backend.get_book(book.id)
+    drifted.active_loans = 3
+    drifted.available_copies = 0
+    backend.save(drifted)
+    user = backend.get_user(alice.id)
+    user.active_loans = 0
+    backend.save(user)
+    backend.commit()
+
+    drifts = [
+        CounterDrift("books", book.id, 3, 1),
+        CounterDrift("users", alice.id, 0, 1),
+    ]
+    assert BookService.check_active_loans() == drifts
+    assert BookService.check_active_loans(repair=True) == drifts
+    assert BookService.check_active_loans() == []
+    repaired = BookService.get_book_by_id(book.id)
+    assert repaired.available_copies == 2 and repaired.active_loans == 1
+
+    runner = backend_app.test_cli_runner()
+    result = runner.invoke(args=["check-loan-counters"])
+    assert result.exit_code == 0
+    assert "All active loan counters match" in result.output
+
+
+def test_loan_filters(backend_app):
+    alice = _user()
+    bob = _user("bob@example.com")
+    books = [_book(f"{number}", title=f"Book {number}") for number in range(3)]
+    late = BookService.borrow_book(books[0].id, alice.id, days=-3)
+    returned = BookService.borrow_book(books[1].id, alice.id)
+    BookService.return_book(returned.id)
+    other = BookService.borrow_book(books[2].id, bob.id, days=-1)
+
+    def ids(**filters):
+        loans = BookService.get_loans(BookService.loan_filter(**filters))["loans"]
+        return [loan["id"] for loan in loans]
+
+    assert ids() == [late.id, returned.id, other.id]
+    assert ids(user_id=alice.id) == [late.id, returned.id]
+    assert ids(status="active") == [late.id, other.id]
+    assert ids(user_id=alice.id, status="returned") == [returned.id]
+    assert ids(status="overdue") == [late.id, other.id]
+
+    now = datetime.utcnow()
+    assert ids(due_until=now.isoformat()) == [late.id, other.id]
+    assert ids(due_from=now.isoformat()) == [returned.id]
+    assert ids(due_from=(now - timedelta(days=2)).isoformat()) == [
+        returned.id,
+        other.id,
+    ]
+    assert ids(borrowed_from=(now + timedelta(days=1)).date().isoformat()) == []
+    assert ids(borrowed_until=f"{(now + timedelta(days=1)).isoformat()}+00:00") == [
+        late.id,
+        returned.id,
+        other.id,
+    ]
+
+    # Days overdue are whole days past the due date, 0 unless overdue
+    result = BookService.get_loans(
+        BookService.loan_filter(), per_page=2, fields="days_overdue"
+    )
+    assert result["loans"] == [
+        {"id": late.id, "days_overdue": 3},
+        {"id": returned.id, "days_overdue": 0},
+    ]
+    assert (result["total"], result["pages"], result["has_next"]) == (3, 2, True)
+    version = BookService.get_loans_version(BookService.loan_filter(status="overdue"))
+    assert (version[0], version[2], version[3]) == (2, 2, 4)
+
+    result = BookService.get_loans(BookService.loan_filter(), count="none")
+    assert result["total"] is None and not result["has_next"]
+    with pytest.raises(ValidationError, match="exact, none"):
+        BookService.get_loans(BookService.loan_filter(), count="estimate")
+    with pytest.raises(ValidationError):
+        BookService.loan_filter(status="lost")
+    with pytest.raises(ValidationError):
+        BookService.loan_filter(due_from="next tuesday")
+
+
+def _loans(user_id=None, status="all"):
+    filters = BookService.loan_filter(user_id, status)
+    return BookService.get_loans(filters, per_page=100)["loans"]
+
+
+def test_archived_loans_are_still_listed(backend_app):
+    alice = _user()
+    bob = _user("bob@example.com")
+    books = [
+        _book(f"{number}", title=f"Book {number}", total_copies=2)
+        for number in range(3)
+    ]
+    loans = [
+        BookService.borrow_book(books[0].id, alice.id).id,
+        BookService.borrow_book(books[1].id, alice.id).id,
+        BookService.borrow_book(books[2].id, bob.id, days=-1).id,
+        BookService.borrow_book(books[0].id, bob.id).id,
+    ]
+    for loan_id in loans[:3]:
+        BookService.return_book(loan_id)
+
+    def listings():
+        statuses = [(None, "all"), (alice.id, "all"), (None, "returned")]
+        statuses += [(bob.id, "returned"), (None, "active")]
+        cursor = BookService.get_loans_by_cursor(BookService.loan_filter(), limit=2)
+        return (
+            [_loans(user_id, status) for user_id, status in statuses],
+            BookService.get_loans(BookService.loan_filter(), per_page=3)["total"],
+            cursor["loans"],
+            BookService.get_loans_version(BookService.loan_filter(alice.id)),
+        )
+
+    before = listings()
+    assert BookService.archive_loans(timedelta(days=1)) == 0
+    assert BookService.archive_loans(timedelta(), batch_size=2) == 3
+    assert BookService.archive_loans(timedelta()) == 0
+    assert listings() == before
+
+    # Archived loans are no longer current
+    assert BookService.get_loan_by_id(loans[0]) is None
+    BookService.return_book(loans[3])
+    assert [loan["id"] for loan in _loans(bob.id)] == [loans[2], loans[3]]
+
+    result = backend_app.test_cli_runner().invoke(
+        args=["archive-loans", "--older-than", "0"]
+    )
+    assert result.exit_code == 0
+    assert "Archived 1 loans returned over 0 days ago" in result.output
+    assert len(_loans(status="returned")) == 4
+
+
+def test_fulltext_search(backend_app):
+    tale = _book("1", title="A Tale of Two Cities", author="Charles Dickens")
+    two = _book("2", title="The Two Towers", author="J.R.R. Tolkien")
+    _book("3", title="Emma", author="Jane Austen", description="A tale of matchmaking")
+    fellowship = _book("4", title="Fellowship", author="J.R.R. Tolkien")
+
+    listing = BookService.get_all_books(search="tale", mode="fulltext")
+    assert [book["title"] for book in listing["books"]] == [
+        "A Tale of Two Cities",
+        "Emma",
+    ]
+    assert listing["mode"] == "fulltext"
+
+    listing = BookService.get_all_books(search="TOLKIEN towers", mode="fulltext")
+    assert [book["id"] for book in listing["books"]] == [two.id]
+
+    # Substring mode still matches parts of words; full-text only whole words
+    assert BookService.get_all_books(search="tow")["total"] == 1
+    assert BookService.get_all_books(search="tow", mode="fulltext")["total"] == 0
+    assert BookService.get_all_books(search="?!", mode="fulltext")["total"] == 0
+
+    BookService.update_book(tale.id, {"title": "Great Expectations"})
+    BookService.delete_book(fellowship.id)
+    assert BookService.get_all_books(search="two", mode="fulltext")["total"] == 1
+    listing = BookService.get_all_books(search="tolkien", mode="fulltext")
+    assert [book["id"] for book in listing["books"]] == [two.id]
+    listing = BookService.get_all_books(search="expectations", mode="fulltext")
+    assert [book["id"] for book in listing["books"]] == [tale.id]
+
+    with pytest.raises(ValidationError):
+        BookService.get_all_books(search="tale", mode="regex")
+
+
+def test_suggestions_follow_book_writes(backend_app):
+    dune = _book("1", title="Dune")
+    assert BookService.suggest_books("du") == [
+        {"id": dune.id, "title": "Dune", "author": "Frank Herbert"}
+    ]
+
+    emma = _book("2", title="Emma", author="Jane Austen")
+    BookService.update_book(dune.id, {"title": "Children of Dune"})
+    assert [s["title"] for s in BookService.suggest_books("du")] == ["Children of Dune"]
+    assert BookService.suggest_books("herb")[0]["id"] == dune.id
+
+    BookService.delete_book(emma.id)
+    assert BookService.suggest_books("emma") == []
+
+
+def test_fuzzy_search(backend_app):
+    hobbit = _book("1", title="The Hobbit", author="J.R.R. Tolkien")
+    farm = _book("2", title="Animal Farm", author="George Orwell")
+    _book("3", title="Emma", author="Jane Austen")
+
+    listing = BookService.get_all_books(search="Tolkein", mode="fuzzy")
+    assert [book["id"] for book in listing["books"]] == [hobbit.id]
+    assert listing["total"] == 1 and listing["mode"] == "fuzzy"
+    assert BookService.get_all_books(search="Tolkein")["total"] == 0
+
+    listing = BookService.get_all_books(search="orwel animl", mode="fuzzy", per_page=1)
+    assert [book["id"] for book in listing["books"]] == [farm.id]
+
+    BookService.update_book(farm.id, {"title": "Homage to Catalonia"})
+    listing = BookService.get_all_books(search="catalnia", mode="fuzzy")
+    assert [book["id"] for book in listing["books"]] == [farm.id]
+    BookService.delete_book(hobbit.id)
+    assert BookService.get_all_books(search="tolkien", mode="fuzzy")["total"] == 0
+
+
+def test_cursor_pagination(backend_app):
+    books = [_book(str(number), title=f"Book {number}") for number in range(5)]
+
+    first = BookService.get_books_by_cursor(limit=2)
+    assert [book["id"] for book in first["books"]] == [books[0].id, books[1].id]
+    BookService.delete_book(books[2].id)
+    second = BookService.get_books_by_cursor(first["next_cursor"], limit=2)
+    assert [book["id"] for book in second["books"]] == [books[3].id, books[4].id]
+    assert second["next_cursor"] is None
+    assert BookService.get_books_by_cursor(search="book 4")["books"][0]["id"] == (
+        books[4].id
+    )
+
+    users = [_user(f"user{number}@example.com") for number in range(3)]
+    page = UserService.get_users_by_cursor(limit=2)
+    assert page["next_cursor"] is not None
+    page = UserService.get_users_by_cursor(page["next_cursor"], limit=2)
+    assert [user["id"] for user in page["users"]] == [users[2].id]
+
+    loans = [
+        BookService.borrow_book(books[number].id, users[0].id) for number in (0, 1)
+    ]
+    filters = BookService.loan_filter(users[0].id)
+    page = BookService.get_loans_by_cursor(filters, limit=1)
+    assert [loan["id"] for loan in page["loans"]] == [loans[0].id]
+    page = BookService.get_loans_by_cursor(filters, cursor=page["next_cursor"])
+    assert [loan["id"] for loan in page["loans"]] == [loans[1].id]
+    overdue = BookService.loan_filter(status="overdue")
+    page = BookService.get_loans_by_cursor(overdue, listing="overdue_loans")
+    assert page["overdue_loans"] == []
+
+    with pytest.raises(ValidationError):
+        BookService.get_books_by_cursor("not a cursor")
+    with pytest.raises(ValidationError):
+        UserService.get_users_by_cursor(first["next_cursor"])
+    with pytest.raises(ValidationError):
+        BookService.get_books_by_cursor(search="dune", mode="fulltext")
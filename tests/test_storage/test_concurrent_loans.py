@@ -0,0 +1,123 @@
+import threading
+
+import pytest
+
+from src import create_app
+from src.config import TestingConfig
+from src.exceptions import ConflictError
+from src.extensions import db
+from src.services.book_service import BookService
+from src.services.user_service import UserService
+from src.storage.backend import get_backend
+
+
+@pytest.fixture(params=["sqlalchemy", "memory"])
+def shared_app(request, tmp_path, monkeypatch):
+    """An app whose request threads share one database, on either backend."""
+    uri = f"sqlite:///{tmp_path / 'library.db'}"
+    monkeypatch.setattr(TestingConfig, "SQLALCHEMY_DATABASE_URI", uri)
+    monkeypatch.setattr(TestingConfig, "STORAGE_BACKEND", request.param)
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+def _concurrently(app, calls):
+    """
+    Runs each call in its own thread and app context, all released at once;
+    returns the results, or the ConflictError raised, in order.
+    """
+    results = [None] * len(calls)
+    start = threading.Barrier(len(calls))
+
+    def run(index, call):
+        with app.app_context():
+            start.wait()
+            try:
+                results[index] = call()
+            except ConflictError as err:
+                results[index] = err
+            finally:
+                db.session.remove()
+
+    threads = [
+        threading.Thread(target=run, args=(index, call))
+        for index, call in enumerate(calls)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _library(app, copies, readers):
+    """Creates a book with ``copies`` copies and ``readers`` users; returns IDs."""
+    with app.app_context():
+        book = BookService.create_book(
+            {"title": "Dune", "author": "Frank Herbert", "total_copies": copies}
+        )
+        users = [
+            UserService.create_user(
+                {"name": f"Reader {i}", "email": f"r{i}@example.com", "password": "x"}
+            )
+            for i in range(readers)
+        ]
+        return book.id, [user.id for user in users]
+
+
+def _copies(app, book_id):
+    """
+    Returns the available copies and the unreturned loans of a book, after
+    checking that the active loan counters match the loans.
+    """
+    with app.app_context():
+        assert BookService.check_active_loans() == []
+        book = get_backend().get_book(book_id)
+        return book.available_copies, book.active_loans
+
+
+def test_concurrent_borrows_never_lend_more_copies_than_the_book_has(shared_app):
+    book_id, user_ids = _library(shared_app, copies=5, readers=20)
+
+    results = _concurrently(
+        shared_app,
+        [lambda u=u: BookService.borrow_book(book_id, u).id for u in user_ids],
+    )
+
+    loans = [result for result in results if isinstance(result, int)]
+    assert len(loans) == 5
+    assert all(
+        str(result) == "Book is not available for borrowing"
+        for result in results
+        if not isinstance(result, int)
+    )
+    assert _copies(shared_app, book_id) == (0, 5)
+
+    # Returning each loan twice at once puts each copy back once
+    results = _concurrently(
+        shared_app, [lambda i=i: BookService.return_book(i).id for i in loans * 2]
+    )
+    assert sorted(result for result in results if isinstance(result, int)) == sorted(
+        loans
+    )
+    assert _copies(shared_app, book_id) == (5, 0)
+
+
+def test_concurrent_borrows_by_one_user_record_one_loan(shared_app):
+    book_id, (user_id,) = _library(shared_app, copies=10, readers=1)
+
+    results = _concurrently(
+        shared_app, [lambda: BookService.borrow_book(book_id, user_id).id] * 8
+    )
+
+    assert sum(isinstance(result, int) for result in results) == 1
+    assert all(
+        str(result) == "User already has this book borrowed"
+        for result in results
+        if not isinstance(result, int)
+    )
+    assert _copies(shared_app, book_id) == (9, 1)
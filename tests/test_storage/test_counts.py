@@ -0,0 +1,42 @@
+from src.storage.counts import CountCache
+
+
+def test_counts_are_cached_until_invalidated():
+    counts = CountCache()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return len(loads)
+
+    assert counts.get("books", None, load) == 1
+    assert counts.get("books", None, load) == 1
+    assert counts.get("books", ("dune", "substring"), load) == 2
+    counts.invalidate("users")
+    assert counts.get("books", None, load) == 1
+
+    counts.invalidate("books")
+    assert counts.get("books", None, load) == 3
+
+
+def test_counts_expire_and_evict():
+    counts = CountCache(max_age=-1)
+    assert counts.get("books", None, lambda: 1) == 1
+    assert counts.get("books", None, lambda: 2) == 2
+
+    counts = CountCache(max_entries=2)
+    for key in range(3):
+        counts.get("books", key, lambda: key)
+    assert counts.get("books", 0, lambda: 10) == 10
+    assert counts.get("books", 2, lambda: 10) == 2
+
+
+def test_counts_loaded_during_invalidation_are_not_kept():
+    counts = CountCache()
+
+    def load():
+        counts.invalidate("books")
+        return 1
+
+    assert counts.get("books", None, load) == 1
+    assert counts.get("books", None, lambda: 2) == 2
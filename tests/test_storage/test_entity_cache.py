@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from src.extensions import db
+from src.models import Book, User
+from src.services.book_service import BookService
+from src.services.user_service import UserService
+from src.storage.entity_cache import EntityCache
+from src.storage.response_cache import MemoryCacheStore
+
+
+@pytest.fixture
+def cache(app):
+    cache = EntityCache(max_entries=2, l2=MemoryCacheStore())
+    app.extensions["entity_cache"] = cache
+    with app.app_context():
+        db.create_all()
+        yield cache
+        db.session.remove()
+        db.drop_all()
+
+
+def test_reads_go_through_both_levels(cache):
+    book = BookService.create_book({"title": "Dune", "author": "Frank Herbert"})
+
+    assert BookService.get_book_by_id(book.id) is book
+    cached = BookService.get_book_by_id(book.id)
+    assert cached is not book and cached.to_dict() == book.to_dict()
+    assert cache.stats()["misses"] == 1 and cache.stats()["l1_hits"] == 1
+
+    l1_only = EntityCache(l2=cache.l2)
+    l2_copy = l1_only.get(Book, book.id, lambda: None)
+    assert l2_copy.to_dict() == book.to_dict()
+    assert l1_only.stats()["l2_hits"] == 1
+    assert BookService.get_book_by_id(12345) is None
+
+
+def test_password_hashes_are_not_cached(cache):
+    user = UserService.create_user(
+        {"name": "Alice", "email": "alice@example.com", "password": "secret123"}
+    )
+    UserService.get_user_by_id(user.id)
+
+    (payload,) = [
+        value for key, (value, _) in cache.l2._values.items() if ":users:" in key
+    ]
+    assert b"password_hash" not in payload
+    assert json.loads(payload)["email"] == "alice@example.com"
+    cached = UserService.get_user_by_id(user.id)
+    assert cached.password_hash is None and cached.name == "Alice"
+
+
+def test_writes_evict_cached_entities(cache):
+    book = BookService.create_book({"title": "Dune", "author": "Frank Herbert"})
+    user = UserService.create_user(
+        {"name": "Alice", "email": "alice@example.com", "password": "secret123"}
+    )
+    BookService.get_book_by_id(book.id)
+    UserService.get_user_by_id(user.id)
+
+    BookService.update_book(book.id, {"title": "Dune Messiah"})
+    assert BookService.get_book_by_id(book.id).title == "Dune Messiah"
+    loan = BookService.borrow_book(book.id, user.id)
+    assert BookService.get_book_by_id(book.id).available_copies == 0
+    assert UserService.get_user_by_id(user.id).active_loans == 1
+    BookService.return_book(loan.id)
+    assert UserService.get_user_by_id(user.id).active_loans == 0
+    UserService.update_user(user.id, {"name": "Alicia"})
+    assert UserService.get_user_by_id(user.id).name == "Alicia"
+    UserService.delete_user(user.id)
+    assert not UserService.get_user_by_id(user.id).is_active
+    assert cache.stats()["invalidations"] == 7
+
+
+def test_least_recently_used_entities_are_evicted(cache):
+    users = [
+        UserService.create_user(
+            {"name": "User", "email": f"user{i}@example.com", "password": "secret123"}
+        )
+        for i in range(3)
+    ]
+    cache.l2 = None
+    for user in users:
+        UserService.get_user_by_id(user.id)
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["size"] == 2
+    cache.get(User, users[0].id, lambda: users[0])
+    assert cache.stats()["misses"] == 4
@@ -0,0 +1,41 @@
+import pytest
+
+from src.storage.fuzzy import TrigramIndex, trigrams
+
+
+def test_trigrams_are_padded_like_pg_trgm():
+    assert trigrams("cat") == {"  c", " ca", "cat", "at "}
+
+
+def test_search_tolerates_misspellings():
+    index = TrigramIndex()
+    index.add(1, "The Hobbit", "J.R.R. Tolkien")
+    index.add(2, "Nineteen Eighty-Four", "George Orwell")
+    index.add(3, "Animal Farm", "George Orwell")
+    index.add(4, "Emma", "Jane Austen")
+
+    assert [book_id for book_id, _ in index.search("Tolkein")] == [1]
+    assert [book_id for book_id, _ in index.search("orwel")] == [2, 3]
+    assert [book_id for book_id, _ in index.search("animl orwel")] == [3, 2]
+    assert index.search("zzzz") == []
+    assert index.search("") == []
+
+    score = dict(index.search("Tolkein"))[1]
+    assert score == pytest.approx(4 / 12)
+    assert index.search("hobbit")[0] == (1, 1.0)
+
+
+def test_updates_and_removals():
+    index = TrigramIndex()
+    index.add(1, "Emma", "Jane Austen")
+    index.add(2, "Persuasion", "Jane Austen")
+
+    index.add(1, "Mansfield Park", "Jane Austen")
+    assert index.search("emma") == []
+    assert [book_id for book_id, _ in index.search("mansfeld")] == [1]
+
+    index.remove(1)
+    index.remove(1)
+    assert [book_id for book_id, _ in index.search("austin")] == [2]
+    index.remove(2)
+    assert index.search("austen") == []
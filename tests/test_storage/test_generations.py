@@ -0,0 +1,67 @@
+import pytest
+
+from src import create_app
+from src.config import TestingConfig
+from src.extensions import db
+from src.services.book_service import BookService
+from src.storage.generations import CatalogGenerations
+
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    """Two apps sharing one database, like two gunicorn workers."""
+    uri = f"sqlite:///{tmp_path / 'library.db'}"
+    monkeypatch.setattr(TestingConfig, "SQLALCHEMY_DATABASE_URI", uri)
+    apps = [create_app("testing") for _ in range(2)]
+    with apps[0].app_context():
+        db.create_all()
+    yield apps
+    with apps[0].app_context():
+        db.drop_all()
+
+
+def test_listeners_run_when_a_generation_moves():
+    generations = CatalogGenerations()
+    invalidated = []
+    generations.listen("books", lambda: invalidated.append("books"))
+
+    assert generations.update({"books": 0, "users": 0}) == []
+    assert generations.update({"books": 1, "users": 0}) == ["books"]
+    assert invalidated == ["books"]
+
+    generations.note_write("books", 2)
+    assert generations.update({"books": 2, "users": 0}) == []
+    generations.note_write("books", 4)
+    assert generations.update({"books": 4, "users": 0}) == ["books"]
+
+
+def test_writes_of_other_workers_invalidate_local_caches(workers):
+    first, second = workers
+    with first.app_context():
+        book_id = BookService.create_book({"title": "Dune", "author": "F. Herbert"}).id
+    with first.app_context():
+        assert BookService.get_book_by_id(book_id).title == "Dune"
+        assert BookService.get_all_books(search="dune")["total"] == 1
+        assert first.test_client().get("/api/v1/books").headers["X-Cache"] == "MISS"
+
+    with second.app_context():
+        BookService.update_book(book_id, {"title": "Dune Messiah"})
+        BookService.create_book({"title": "Children of Dune", "author": "F. Herbert"})
+
+    with first.app_context():
+        assert BookService.get_book_by_id(book_id).title == "Dune Messiah"
+        assert BookService.get_all_books(search="dune")["total"] == 2
+        assert first.test_client().get("/api/v1/books").headers["X-Cache"] == "MISS"
+        stats = first.extensions["entity_cache"].stats()
+        assert stats["misses"] == 2 and stats["l1_hits"] == 0
+
+
+def test_own_writes_keep_local_caches(workers):
+    first = workers[0]
+    with first.app_context():
+        book_id = BookService.create_book({"title": "Dune", "author": "F. Herbert"}).id
+        BookService.update_book(book_id, {"year": 1965})
+        BookService.get_book_by_id(book_id)
+    with first.app_context():
+        assert BookService.get_book_by_id(book_id).year == 1965
+        assert first.extensions["entity_cache"].stats()["l1_hits"] == 1
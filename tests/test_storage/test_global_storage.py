@@ -1,10 +1,13 @@
-from typing import Any
+import threading
+import time
+from typing import Any, Callable, List
 
 import pytest
 
 from src.storage.global_storage import (
     add_book_to_library,
     add_user_to_library,
+    delete_book,
     read_all_books,
     read_all_users,
     read_book,
@@ -119,3 +122,80 @@ def test_read_book(client: Any) -> None:
     # Check that the correct book is retrieved
     book = read_book(1)
     assert book.title == "The Hitchhiker's Guide to the Galaxy"
+
+
+def test_ids_are_not_reused_after_delete(client: Any) -> None:
+    book_dict = {"title": "Dune", "author": "Frank Herbert", "year": 1965}
+    add_book_to_library(dict(book_dict))
+    add_book_to_library(dict(book_dict))
+    assert delete_book(0)
+    add_book_to_library(dict(book_dict))
+
+    assert [book["id"] for book in read_all_books()] == [1, 2]
+
+
+def test_concurrent_writers_lose_no_records(client: Any) -> None:
+    threads_count = 8
+    books_per_thread = 250
+    barrier = threading.Barrier(threads_count + 1, timeout=10)
+    deleted: List[int] = []
+    errors: List[BaseException] = []
+
+    def recording(target: Callable[..., None]) -> Callable[..., None]:
+        """Runs a thread's target, keeping what it raises for the test."""
+
+        def run(*args: Any) -> None:
+            try:
+                target(*args)
+            except BaseException as err:
+                errors.append(err)
+
+        return run
+
+    def writer(thread_id: int) -> None:
+        barrier.wait()
+        for i in range(books_per_thread):
+            add_book_to_library(
+                {"title": f"Book {thread_id}-{i}", "author": "Author", "year": 2000}
+            )
+            add_user_to_library(
+                {
+                    "name": f"User {thread_id}-{i}",
+                    "email": f"user{thread_id}-{i}@example.com",
+                    "password": "secret",
+                }
+            )
+
+    def deleter() -> None:
+        barrier.wait()
+        deadline = time.monotonic() + 10
+        for book_id in range(0, threads_count * books_per_thread, 10):
+            while read_book(book_id) is None:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Book {book_id} was never added")
+                time.sleep(0)
+            if not delete_book(book_id):
+                raise AssertionError(f"Book {book_id} could not be deleted")
+            deleted.append(book_id)
+
+    threads = [
+        threading.Thread(target=recording(writer), args=(i,), daemon=True)
+        for i in range(threads_count)
+    ]
+    threads.append(threading.Thread(target=recording(deleter), daemon=True))
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join(timeout=30)
+    assert not any(thread.is_alive() for thread in threads)
+    assert errors == []
+
+    books = read_all_books()
+    users = read_all_users()
+    book_ids = [book["id"] for book in books]
+    user_ids = [user["id"] for user in users]
+    assert len(set(book_ids)) == len(book_ids)
+    assert len(set(user_ids)) == len(user_ids) == threads_count * books_per_thread
+    assert sorted(book_ids + deleted) == list(range(threads_count * books_per_thread))
+    assert all(user_exists(f"User {t}-0") for t in range(threads_count))
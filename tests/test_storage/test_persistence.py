@@ -0,0 +1,188 @@
+import gc
+import os
+import sys
+import threading
+from typing import Any, Callable, Iterator, List
+
+import pytest
+
+from src.models.book import Book
+from src.models.library import Library
+from src.models.user import LibraryUser
+from src.storage import global_storage
+from src.storage.persistence import (
+    CorruptWalError,
+    DirectoryLockedError,
+    StoragePersistence,
+)
+
+Storage = Callable[..., StoragePersistence]
+
+
+@pytest.fixture
+def directory(tmp_path: Any) -> str:
+    return str(tmp_path / "storage")
+
+
+@pytest.fixture
+def storage(directory: str) -> Iterator[Storage]:
+    """Creates persistences of the directory, closing them all afterwards."""
+    created: List[StoragePersistence] = []
+
+    def create(subdirectory: str = "", **options: Any) -> StoragePersistence:
+        path = os.path.join(directory, subdirectory)
+        persistence = StoragePersistence(path, **options)
+        created.append(persistence)
+        return persistence
+
+    yield create
+    for persistence in created:
+        persistence.close()
+
+
+def fill(library: Library) -> None:
+    library.create_book(Book(0, "Dune", "Frank Herbert", 1965))
+    library.create_book(Book(1, "Emma", "Jane Austen", 1815))
+    library.create_book(Book(2, "Persuasion", "Jane Austen", 1817))
+    library.create_user(LibraryUser(0, "Alice", "alice@example.com", "secret"))
+    library.delete_book(1)
+
+
+def test_reopen_replays_wal(storage: Storage) -> None:
+    persistence = storage()
+    fill(persistence.open())
+    persistence.close()
+
+    library = storage().open()
+    assert library.book_rows() == [
+        (0, "Dune", "Frank Herbert", 1965),
+        (2, "Persuasion", "Jane Austen", 1817),
+    ]
+    assert library.find_user_by_email("alice@example.com").name == "Alice"
+    assert library.allocate_book_id() == 3
+
+
+def test_snapshot_compacts_wal(storage: Storage, directory: str) -> None:
+    persistence = storage()
+    library = persistence.open()
+    fill(library)
+    persistence.snapshot()
+    library.create_book(Book(5, "Ulysses", "James Joyce", 1922))
+    library.delete_book(5)
+    persistence.close()
+
+    assert sorted(os.listdir(directory)) == ["LOCK", "snapshot-1.bin", "wal-1.log"]
+    frozen = gc.get_freeze_count()
+    restored = storage().open()
+    assert gc.get_freeze_count() == frozen
+    assert restored.book_rows() == library.book_rows()
+    assert restored.user_rows() == library.user_rows()
+    assert restored.allocate_book_id() == 6
+    assert restored.get_book(2).author is sys.intern("Jane Austen")
+
+
+def test_automatic_snapshot(storage: Storage, directory: str) -> None:
+    persistence = storage(snapshot_every=10)
+    library = persistence.open()
+    for book_id in range(25):
+        library.create_book(Book(book_id, f"Book {book_id}", "Author", 2000))
+    persistence.close()
+
+    assert any(name.startswith("snapshot-") for name in os.listdir(directory))
+    assert storage().open().book_count == 25
+
+
+def test_torn_wal_tail_is_dropped(storage: Storage, directory: str) -> None:
+    persistence = storage()
+    fill(persistence.open())
+    persistence.close()
+    with open(os.path.join(directory, "wal-0.log"), "a") as wal:
+        wal.write('["create_book", 9, "Torn')
+
+    library = storage().open()
+    assert [book.id for book in library.books] == [0, 2]
+
+
+def test_corrupt_wal_line_before_the_end_is_an_error(
+    storage: Storage, directory: str
+) -> None:
+    persistence = storage()
+    fill(persistence.open())
+    persistence.close()
+    path = os.path.join(directory, "wal-0.log")
+    with open(path) as wal:
+        lines = wal.readlines()
+    lines[1] = '["create_book", 1, "Corrupt\n'
+    with open(path, "w") as wal:
+        wal.writelines(lines)
+
+    with pytest.raises(CorruptWalError):
+        storage().open()
+    with open(path) as wal:
+        assert wal.readlines() == lines
+
+
+def test_concurrent_writes_are_all_durable(storage: Storage) -> None:
+    persistence = storage()
+    library = persistence.open()
+
+    def writer() -> None:
+        for _ in range(100):
+            book_id = library.allocate_book_id()
+            library.create_book(Book(book_id, "Title", "Author", 2000))
+
+    threads = [threading.Thread(target=writer) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    persistence.close()
+
+    assert storage().open().book_count == 400
+
+
+def test_directory_is_locked(storage: Storage) -> None:
+    persistence = storage()
+    persistence.open()
+    with pytest.raises(DirectoryLockedError):
+        storage().open()
+
+
+def test_global_storage_persistence(directory: str) -> None:
+    global_storage.enable_persistence(directory)
+    try:
+        global_storage.reset_global_storage()
+        global_storage.add_book_to_library(
+            {"title": "Dune", "author": "Frank Herbert", "year": 1965}
+        )
+        global_storage.enable_persistence(directory)
+        assert global_storage.read_book(0).title == "Dune"
+
+        global_storage.reset_global_storage()
+        global_storage.enable_persistence(directory)
+        assert global_storage.read_all_books() == []
+    finally:
+        global_storage.disable_persistence()
+        global_storage.reset_global_storage()
+
+
+def test_global_storage_takes_a_free_worker_slot(
+    storage: Storage, directory: str
+) -> None:
+    # Other workers own the directory and its first slot
+    storage().open()
+    storage("worker-1").open()
+    try:
+        global_storage.enable_persistence(directory)
+        global_storage.add_book_to_library(
+            {"title": "Dune", "author": "Frank Herbert", "year": 1965}
+        )
+        assert os.path.exists(os.path.join(directory, "worker-2", "LOCK"))
+
+        # A restarted worker takes over the free slot and its data
+        global_storage.disable_persistence()
+        global_storage.enable_persistence(directory)
+        assert global_storage.read_book(0).title == "Dune"
+    finally:
+        global_storage.disable_persistence()
+        global_storage.reset_global_storage()
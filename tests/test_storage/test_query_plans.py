@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from src.extensions import db
+from src.models import Book, BookLoan, User
+from src.services.book_service import BookService
+
+USERS = 20
+LOANS = 2000
+OPEN_LOANS = 40
+
+
+@pytest.fixture
+def library(app):
+    """
+    A library whose loans are mostly returned, as they pile up over time,
+    with statistics for the query planner as a migrated database has.
+    """
+    now = datetime.utcnow()
+    stamps = {"created_at": now, "updated_at": now}
+    with app.app_context():
+        db.create_all()
+        db.session.execute(
+            db.insert(User),
+            [
+                {
+                    "name": f"Reader {i}",
+                    "email": f"r{i}@example.com",
+                    "password_hash": "x",
+                    **stamps,
+                }
+                for i in range(USERS)
+            ],
+        )
+        db.session.execute(
+            db.insert(Book),
+            [
+                {"title": f"Book {i}", "author": "Author", **stamps}
+                for i in range(USERS)
+            ],
+        )
+        db.session.execute(
+            db.insert(BookLoan),
+            [
+                {
+                    "user_id": i % USERS + 1,
+                    "book_id": i // USERS % USERS + 1,
+                    "borrowed_at": now,
+                    "due_date": now + timedelta(days=i % 30 - 15),
+                    "is_returned": i < LOANS - OPEN_LOANS,
+                    **stamps,
+                }
+                for i in range(LOANS)
+            ],
+        )
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _loan_plans(call):
+    """
+    Runs a service call and returns the SQLite query plan of each statement
+    it runs on the loans, as the lines of the plan about the loans table.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "book_loans" in statement and not statement.startswith("EXPLAIN"):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        call()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    connection = db.session.connection()
+    plans = []
+    for statement, parameters in statements:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        plans.append([row[-1] for row in rows if "book_loans" in row[-1]])
+    return [plan for plan in plans if plan]
+
+
+def _return_a_loan():
+    loan = BookService.borrow_book(1, 2)
+    BookService.return_book(loan.id)
+
+
+USER = "ix_book_loans_user_id_is_returned"
+ARCHIVED_USER = "ix_book_loans_history_user_id"
+OPEN_DUE_DATE = "ix_book_loans_open_due_date"
+PRIMARY_KEY = "INTEGER PRIMARY KEY"
+
+
+@pytest.mark.parametrize(
+    "call, indexes",
+    [
+        (
+            lambda: BookService.get_loans(BookService.loan_filter(1)),
+            [USER, ARCHIVED_USER],
+        ),
+        (lambda: BookService.get_loans(BookService.loan_filter(1, "active")), [USER]),
+        (
+            lambda: BookService.get_loans(BookService.loan_filter(1, "returned")),
+            [USER, ARCHIVED_USER],
+        ),
+        (
+            lambda: BookService.get_loans_version(BookService.loan_filter(1)),
+            [USER, ARCHIVED_USER],
+        ),
+        (
+            lambda: BookService.get_loans(BookService.loan_filter(None, "active")),
+            [OPEN_DUE_DATE],
+        ),
+        (
+            lambda: BookService.get_loans(BookService.loan_filter(None, "overdue")),
+            [OPEN_DUE_DATE],
+        ),
+        (
+            lambda: BookService.get_loans_by_cursor(
+                BookService.loan_filter(None, "overdue"), "", 20
+            ),
+            [OPEN_DUE_DATE],
+        ),
+        (
+            lambda: BookService.get_loans_version(
+                BookService.loan_filter(None, "overdue")
+            ),
+            [OPEN_DUE_DATE],
+        ),
+        (BookService.check_active_loans, [OPEN_DUE_DATE]),
+        (_return_a_loan, [PRIMARY_KEY]),
+    ],
+    ids=[
+        "user loans",
+        "user active loans",
+        "user returned loans",
+        "user loans version",
+        "active loans",
+        "overdue loans",
+        "overdue loans cursor",
+        "overdue loans version",
+        "active loan counters",
+        "borrow and return",
+    ],
+)
+def test_loan_queries_use_their_indexes(library, call, indexes):
+    plans = _loan_plans(call)
+
+    assert plans
+    for plan in plans:
+        assert any(index in line for line in plan for index in indexes), plan
+    assert all(any(index in " ".join(plan) for plan in plans) for index in indexes)
@@ -0,0 +1,125 @@
+import time
+
+import pytest
+
+from src.extensions import db
+from src.services.book_service import BookService
+from src.storage.response_cache import (
+    MemoryCacheStore,
+    RedisCacheStore,
+    ResponseCache,
+    init_response_cache,
+)
+
+
+class LocalRedis:
+    """Stand-in for the subset of the Redis client the cache store uses."""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        value, expires_at = self.values.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.values[key]
+            return None
+        return value
+
+    def set(self, key, value, px=None, nx=False):
+        if nx and self.get(key) is not None:
+            return None
+        expires_at = None if px is None else time.monotonic() + px / 1000
+        self.values[key] = (value, expires_at)
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+    def incr(self, key):
+        value = int(self.get(key) or 0) + 1
+        self.values[key] = (str(value).encode(), None)
+        return value
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cached_app(request, app):
+    init_response_cache(app)
+    cache = app.extensions["response_cache"]
+    if request.param == "redis":
+        cache.store = RedisCacheStore(LocalRedis())
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryCacheStore(max_bytes=10)
+    store.set("a", b"1234", 60)
+    store.set("b", b"1234", 60)
+    assert store.get("a") == b"1234"
+    store.set("c", b"1234", 60)
+
+    assert store.get("b") is None
+    assert store.get("a") == b"1234" and store.get("c") == b"1234"
+    assert store.size == 8
+
+    store.set("d", b"12345678901", 60)
+    assert store.get("d") is None
+    store.set("e", b"1", -1)
+    assert store.get("e") is None
+
+
+def test_responses_are_cached_until_a_write(cached_app):
+    client = cached_app.test_client()
+    book = BookService.create_book({"title": "Dune", "author": "Frank Herbert"})
+
+    response = client.get("/api/v1/books?per_page=5&page=1")
+    assert response.headers["X-Cache"] == "MISS"
+    response = client.get("/api/v1/books?page=1&per_page=5")
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.get_json()["total"] == 1
+    assert client.get(f"/api/v1/books/{book.id}").headers["X-Cache"] == "MISS"
+    assert client.get("/api/v1/books/12345").headers["X-Cache"] == "MISS"
+    assert client.get("/api/v1/books/12345").headers["X-Cache"] == "MISS"
+
+    BookService.create_book({"title": "Emma", "author": "Jane Austen"})
+    response = client.get("/api/v1/books?page=1&per_page=5")
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.get_json()["total"] == 2
+    assert client.get(f"/api/v1/books/{book.id}").headers["X-Cache"] == "MISS"
+
+
+def test_stale_responses_are_served_while_revalidating(cached_app):
+    cache = cached_app.extensions["response_cache"]
+    cache = cached_app.extensions["response_cache"] = ResponseCache(
+        cache.store, ttl=0, stale=60
+    )
+    client = cached_app.test_client()
+    BookService.create_book({"title": "Dune", "author": "Frank Herbert"})
+
+    assert client.get("/api/v1/books").headers["X-Cache"] == "MISS"
+    time.sleep(0.01)
+    db.session.execute(db.text("UPDATE books SET title = 'Dune Messiah'"))
+    with cached_app.test_request_context("/api/v1/books"):
+        lock = f"lock:{cache._key('books')}"
+
+    # Another request is replacing the stale response
+    assert cache.store.add(lock, b"1", 60)
+    response = client.get("/api/v1/books")
+    assert response.headers["X-Cache"] == "STALE"
+    assert response.get_json()["books"][0]["title"] == "Dune"
+
+    # The first request to find it stale replaces it
+    cache.store.delete(lock)
+    response = client.get("/api/v1/books")
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.get_json()["books"][0]["title"] == "Dune Messiah"
+    assert cache.store.add(lock, b"1", 60)
+    cache.store.delete(lock)
+
+    cache.ttl = 60
+    response = client.get("/api/v1/books")
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.get_json()["books"][0]["title"] == "Dune Messiah"
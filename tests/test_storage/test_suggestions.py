@@ -0,0 +1,83 @@
+import threading
+
+from src.storage.suggestions import BookSuggestions
+
+
+def _titles(suggestions):
+    return [suggestion["title"] for suggestion in suggestions]
+
+
+def test_suggest_prefers_whole_title_and_author_matches():
+    suggestions = BookSuggestions()
+    suggestions.build(
+        [
+            (1, "The Two Towers", "J.R.R. Tolkien"),
+            (2, "Two Years Before the Mast", "Richard Henry Dana"),
+            (3, "Tomorrow and Tomorrow", "Gabrielle Zevin"),
+            (4, "Émile", "Jean-Jacques Rousseau"),
+        ]
+    )
+
+    assert _titles(suggestions.suggest("two")) == [
+        "Two Years Before the Mast",
+        "The Two Towers",
+    ]
+    assert _titles(suggestions.suggest("TO")) == [
+        "Tomorrow and Tomorrow",
+        "The Two Towers",
+    ]
+    assert _titles(suggestions.suggest("the two t")) == ["The Two Towers"]
+    assert _titles(suggestions.suggest("emi")) == ["Émile"]
+    assert suggestions.suggest("two", limit=1) == [
+        {"id": 2, "title": "Two Years Before the Mast", "author": "Richard Henry Dana"}
+    ]
+    assert suggestions.suggest("  ") == []
+    assert suggestions.suggest("xyz") == []
+
+
+def test_suggest_returns_each_book_once():
+    suggestions = BookSuggestions()
+    suggestions.build((i, f"Dune {i}", "Dune Author") for i in range(30))
+
+    result = suggestions.suggest("dune", limit=25)
+
+    assert len(result) == 25
+    assert len({suggestion["id"] for suggestion in result}) == 25
+
+
+def test_incremental_updates():
+    suggestions = BookSuggestions()
+    suggestions.build([(1, "Emma", "Jane Austen")])
+
+    suggestions.add(2, "Persuasion", "Jane Austen")
+    suggestions.add(1, "Mansfield Park", "Jane Austen")
+    assert _titles(suggestions.suggest("austen")) == ["Mansfield Park", "Persuasion"]
+    assert suggestions.suggest("emma") == []
+
+    suggestions.remove(2)
+    suggestions.remove(99)
+    assert _titles(suggestions.suggest("jane")) == ["Mansfield Park"]
+
+
+def test_background_refresh_keeps_concurrent_writes():
+    suggestions = BookSuggestions(max_age=-1)
+    suggestions.build([(1, "Emma", "Jane Austen")])
+    assert suggestions.is_stale
+
+    loading, release = threading.Event(), threading.Event()
+
+    def load():
+        loading.set()
+        release.wait()
+        return [(1, "Emma", "Jane Austen"), (3, "Sanditon", "Jane Austen")]
+
+    suggestions.refresh_in_background(load)
+    loading.wait()
+    suggestions.add(2, "Persuasion", "Jane Austen")
+    assert _titles(suggestions.suggest("persuasion")) == ["Persuasion"]
+    release.set()
+
+    for thread in threading.enumerate():
+        if thread.name == "book-suggestions":
+            thread.join()
+    assert _titles(suggestions.suggest("jane")) == ["Emma", "Persuasion", "Sanditon"]